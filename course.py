@@ -0,0 +1,230 @@
+"""!
+@file course.py
+This file contains a class that learn the course on a first run and plan the speed along it for the later runs.
+
+@author agent
+@date   2026-Oct-19
+"""
+
+from array import array
+from math import sqrt
+from motion import wrap
+import struct
+
+## Format of the course file header: magic, number of bins, bin spacing [m]
+COURSE_FORMAT = '<4sHf'
+
+## Magic bytes at the start of the course file
+COURSE_MAGIC = b'CRSE'
+
+## Heading change [rad] of one count in the turn array
+TURN_LSB = 0.0001
+
+
+class CourseProfile:
+    """!
+    A class that record the course by traveled distance on a first run and give back a planned speed for every point of it.
+    """
+    """
+    The course is cut into bins of SPACING [m] of odometry distance. While learning, every bin stores the
+    heading change over it, as a 16 bit count of TURN_LSB [rad], and the line sensor case seen when it was
+    entered, so a 10 m course is 3 bytes a bin and 1.5 kB on flash.
+
+    finish() turns the heading changes into a speed plan: the curvature [rad/m] of each bin, averaged with
+    its neighbours, gives the fastest speed that keeps the sideways acceleration under A_LAT, capped to
+    V_MAX. A backward pass then makes sure the speed never has to drop faster than A_DEC before a curve, so
+    ROMI slows down ahead of the curves it already knows and speeds up on the straights.
+
+    Attributes:
+        turn (array): Heading change of each bin in TURN_LSB counts.
+        cases (bytearray): Line sensor case of each bin.
+        speed (array): Planned speed [m/s] of each bin, from finish().
+        count (int): Number of bins recorded.
+        valid (bool): True once the speed plan is made from a recorded or loaded course.
+
+    Methods:
+        __init__(self, file, spacing, size, a_lat, a_dec, v_max, v_min): Initializes the CourseProfile instance.
+        begin(self): Forget the course and start learning it.
+        record(self, distance, heading, case): Record one tick of the learning run.
+        finish(self): Make the speed plan from the recorded course.
+        speed_at(self, distance): Planned speed at a traveled distance.
+        save(self): Write the course to flash.
+        load(self): Read the course from flash and make the speed plan.
+    """
+
+    def __init__(self, file='course.bin', spacing=0.02, size=512, a_lat=0.3, a_dec=0.5, v_max=0.4, v_min=0.1):
+        """!
+        Initializes the CourseProfile instance.
+
+        @param file (str): Name of the course file on flash.
+        @param spacing (float): Traveled distance [m] of one bin.
+        @param size (int): Most bins kept, the course is learned up to size * spacing [m].
+        @param a_lat (float): Largest sideways acceleration [m/s^2] in the curves.
+        @param a_dec (float): Largest slow down [m/s^2] ahead of the curves.
+        @param v_max (float): Fastest planned speed [m/s], on the straights.
+        @param v_min (float): Slowest planned speed [m/s], in the tightest curves.
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to learn the course on one run and use its speed plan on the next'''
+
+              course = CourseProfile()
+
+              # Learning run, once per tick while following the line
+              course.record(odo.distance, IMU_YAW.get(), case)
+              # At the end of the course
+              course.finish()
+              course.save()
+
+              # Later run
+              if course.load():
+                  v = course.speed_at(odo.distance)
+          @endcode
+        """
+
+        ## Name of the course file on flash
+        self.FILE = file
+
+        ## Traveled distance of one bin
+        self.SPACING = spacing
+
+        ## Largest sideways acceleration in the curves
+        self.A_LAT = a_lat
+
+        ## Largest slow down ahead of the curves
+        self.A_DEC = a_dec
+
+        ## Fastest planned speed
+        self.V_MAX = v_max
+
+        ## Slowest planned speed
+        self.V_MIN = v_min
+
+        ## Heading change of each bin in TURN_LSB counts
+        self.turn = array('h', [0] * size)
+
+        ## Line sensor case of each bin
+        self.cases = bytearray(size)
+
+        ## Planned speed of each bin
+        self.speed = array('f', [0] * size)
+
+        self.begin()
+
+    def begin(self):
+        """!
+        Forget the course, the next tick given to record() starts learning it again.
+        """
+
+        ## Number of bins recorded
+        self.count = 0
+
+        ## True once the speed plan is made
+        self.valid = False
+
+        # Heading at the start of the current bin
+        self.heading = None
+
+    def record(self, distance, heading, case):
+        """!
+        Record one tick of the learning run. It is cheap to call every tick, a bin is only written when the
+        traveled distance moves into it.
+
+        @param distance (float): Traveled distance [m] from the odometry.
+        @param heading (float): Heading [rad] from the IMU.
+        @param case (int): Line sensor case of this tick.
+        """
+        i = int(distance / self.SPACING)
+        if i >= len(self.turn):
+            i = len(self.turn) - 1
+        if self.heading is None:
+            self.heading = heading
+        while self.count <= i:
+            # A tick that jumps bins puts the whole heading change in the first one
+            change = int(wrap(heading - self.heading) / TURN_LSB)
+            if change > 32767:
+                change = 32767
+            elif change < -32768:
+                change = -32768
+            self.turn[self.count] = change
+            self.cases[self.count] = case
+            self.heading = heading
+            self.count += 1
+
+    def finish(self):
+        """!
+        Make the speed plan from the recorded course.
+
+        @return (bool): True if there is a course to plan.
+        """
+        n = self.count
+        speed = self.speed
+        turn = self.turn
+        for i in range(n):
+            first = i - 1 if i > 0 else 0
+            last = i + 1 if i < n - 1 else n - 1
+            total = 0
+            for j in range(first, last + 1):
+                total += turn[j]
+            k = abs(total) * TURN_LSB / ((last - first + 1) * self.SPACING)
+            v = self.V_MAX
+            if k > 0:
+                v = min(v, sqrt(self.A_LAT / k))
+            speed[i] = max(v, self.V_MIN)
+
+        # Backward pass, so the speed at each bin can slow down to the speed of the next within A_DEC
+        for i in range(n - 2, -1, -1):
+            reach = sqrt(speed[i + 1]**2 + 2*self.A_DEC*self.SPACING)
+            if speed[i] > reach:
+                speed[i] = reach
+
+        self.valid = n > 0
+        return self.valid
+
+    def speed_at(self, distance):
+        """!
+        Planned speed at a traveled distance.
+
+        @param distance (float): Traveled distance [m] from the odometry.
+
+        @return (float): planned speed [m/s], or None past the end of the course or without a plan.
+        """
+        i = int(distance / self.SPACING)
+        if not self.valid or i >= self.count:
+            return None
+        return self.speed[i]
+
+    def save(self):
+        """!
+        Write the heading change and case of every recorded bin to the course file.
+        """
+        with open(self.FILE, 'wb') as file:
+            file.write(struct.pack(COURSE_FORMAT, COURSE_MAGIC, self.count, self.SPACING))
+            file.write(memoryview(self.turn)[:self.count])
+            file.write(memoryview(self.cases)[:self.count])
+
+    def load(self):
+        """!
+        Read the course from the course file and make the speed plan.
+
+        @return (bool): True if the file was there and good.
+        """
+        try:
+            with open(self.FILE, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return False
+        head = struct.calcsize(COURSE_FORMAT)
+        if len(data) < head:
+            return False
+        magic, n, spacing = struct.unpack(COURSE_FORMAT, data[:head])
+        if magic != COURSE_MAGIC or abs(spacing - self.SPACING) > 1e-6 or n > len(self.turn) or len(data) != head + 3*n:
+            return False
+        turn = array('h', data[head:head + 2*n])
+        for i in range(n):
+            self.turn[i] = turn[i]
+            self.cases[i] = data[head + 2*n + i]
+        self.count = n
+        return self.finish()
@@ -0,0 +1,267 @@
+"""!
+@file fsm.py
+This file contains a small table driven finite state machine engine that all the ROMI tasks run on.
+
+@author agent
+@date   2026-Oct-19
+"""
+
+from array import array
+from utime import ticks_us, ticks_ms, ticks_diff
+
+## List of all the state machines, in the order they were created, for show_all()
+fsm_list = []
+
+
+def show_all():
+    """!
+    Print the per-state counters of every state machine that has been created.
+    """
+    for machine in fsm_list:
+        print(machine)
+
+
+class FSM:
+    """!
+    A finite state machine whose states are handler functions in a table indexed by the state number.
+    """
+    """
+    Each state is registered with a name, a handler and optional entry and exit actions. Every step()
+    first checks the guarded transitions of the current state, in the order they were added, and takes
+    the first one whose condition is true. Then the handler of the (maybe new) current state runs and
+    returns the next state, or None to stay. Dispatch is a list index whatever the number of states.
+
+    Changing state runs the exit action of the old state and the entry action of the new one, and is
+    written to a ring buffer transition log. For every state, the ticks it ran, the times it was
+    entered and the time [us] spent in it are counted, so print(fsm) shows where the time goes.
+
+    Attributes:
+        name (str): Name of the state machine, for printing.
+        current (int): Current state.
+        names (list): Name of each state.
+        ticks (array): Number of steps each state's handler ran.
+        entries (array): Number of times each state was entered.
+        time_us (array): Time [us] spent in each state, not counting the current visit.
+
+    Methods:
+        __init__(self, name, size, log_size): Initializes the FSM instance.
+        state(self, index, name, handler, entry, exit): Register one state.
+        guard(self, src, condition, dst): Add a guarded transition.
+        step(self): Run one step of the current state.
+        goto(self, dst): Change state.
+        time_in(self, index): Time spent in a state, counting the current visit.
+        dump_log(self): Print the transition log.
+        reset_stats(self): Clear the counters and the transition log.
+    """
+
+    def __init__(self, name, size, log_size=32):
+        """!
+        Initializes the FSM instance, in state 0 with no state registered yet.
+
+        @param name (str): Name of the state machine, for printing.
+        @param size (int): Number of states, numbered from 0.
+        @param log_size (int): Number of transitions kept in the log.
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to blink an LED with a 2 state machine'''
+
+              led = Pin(Pin.cpu.A5, mode=Pin.OUT_PP)
+              fsm = FSM('BLINK', 2)
+              fsm.state(0, 'OFF', lambda: 1, entry=led.low)
+              fsm.state(1, 'ON',  lambda: 0, entry=led.high)
+              fsm.start(0)
+              for i in range(10):
+                  fsm.step()
+                  sleep_ms(500)
+              print(fsm)
+              fsm.dump_log()
+          @endcode
+        """
+
+        ## Name of the state machine
+        self.name = name
+
+        ## Name of each state
+        self.names = [None] * size
+
+        ## Number of steps each state's handler ran
+        self.ticks = array('L', [0] * size)
+
+        ## Number of times each state was entered
+        self.entries = array('L', [0] * size)
+
+        ## Time spent in each state, not counting the current visit
+        self.time_us = array('L', [0] * size)
+
+        ## Current state
+        self.current = 0
+
+        # Handler, entry and exit actions and guarded transitions of each state
+        self.handlers = [None] * size
+        self.on_entry = [None] * size
+        self.on_exit = [None] * size
+        self.guards = [()] * size
+
+        # Time stamp of entering the current state
+        self.since = ticks_us()
+
+        # Transition log ring buffer: from state, to state and time stamp [ms]
+        self.log_from = bytearray(log_size)
+        self.log_to = bytearray(log_size)
+        self.log_ms = array('L', [0] * log_size)
+        self.log_count = 0
+        self.log_next = 0
+
+        fsm_list.append(self)
+
+    def state(self, index, name, handler, entry=None, exit=None):
+        """!
+        Register one state.
+
+        @param index (int): State number, from 0 to size - 1.
+        @param name (str): Name of the state, for printing.
+        @param handler (function): Called with no arguments on every step() in this state, returns the next state or None to stay.
+        @param entry (function): Called with no arguments when the state is entered, or None.
+        @param exit (function): Called with no arguments when the state is left, or None.
+        """
+        self.names[index] = name
+        self.handlers[index] = handler
+        self.on_entry[index] = entry
+        self.on_exit[index] = exit
+
+    def guard(self, src, condition, dst):
+        """!
+        Add a guarded transition, checked at the start of every step() in state src before its handler.
+
+        @param src (int): State the transition leaves from.
+        @param condition (function): Called with no arguments, the transition is taken when it returns True.
+        @param dst (int): State the transition goes to.
+        """
+        self.guards[src] = self.guards[src] + ((condition, dst),)
+
+    def start(self, index):
+        """!
+        Enter the first state, running its entry action, without an exit action or a log entry.
+
+        @param index (int): State to start in.
+        """
+        self.current = index
+        self.since = ticks_us()
+        self.entries[index] += 1
+        if self.on_entry[index] is not None:
+            self.on_entry[index]()
+
+    def step(self):
+        """!
+        Take the first guarded transition of the current state whose condition is true, then run the
+        handler of the current state and go to the state it returns.
+
+        @return (int): the current state after the step.
+        """
+        s = self.current
+        for condition, dst in self.guards[s]:
+            if condition():
+                self.goto(dst)
+                s = dst
+                break
+        handler = self.handlers[s]
+        if handler is None:
+            print(f"{self.name}: INVALID STATE {s}")
+            return s
+        self.ticks[s] += 1
+        nxt = handler()
+        if nxt is not None and nxt != s:
+            self.goto(nxt)
+        return self.current
+
+    def goto(self, dst):
+        """!
+        Change state, running the exit action of the old state and the entry action of the new one.
+
+        @param dst (int): State to go to.
+        """
+        src = self.current
+        if dst == src:
+            return
+        if self.on_exit[src] is not None:
+            self.on_exit[src]()
+        now = ticks_us()
+        self.time_us[src] += ticks_diff(now, self.since)
+        self.since = now
+
+        i = self.log_next
+        self.log_from[i] = src
+        self.log_to[i] = dst
+        self.log_ms[i] = ticks_ms()
+        i += 1
+        if i >= len(self.log_to):
+            i = 0
+        self.log_next = i
+        if self.log_count < len(self.log_to):
+            self.log_count += 1
+
+        self.current = dst
+        self.entries[dst] += 1
+        if self.on_entry[dst] is not None:
+            self.on_entry[dst]()
+
+    def time_in(self, index):
+        """!
+        Time spent in a state, counting the current visit if it is the current state.
+
+        @param index (int): State number.
+
+        @return (int): time [us].
+        """
+        if index == self.current:
+            return self.time_us[index] + ticks_diff(ticks_us(), self.since)
+        return self.time_us[index]
+
+    def dump_log(self):
+        """!
+        Print the transition log, oldest first.
+        """
+        size = len(self.log_to)
+        i = self.log_next - self.log_count
+        if i < 0:
+            i += size
+        for n in range(self.log_count):
+            print(f"{self.log_ms[i]:10d} ms  {self._name(self.log_from[i])} -> {self._name(self.log_to[i])}")
+            i += 1
+            if i >= size:
+                i = 0
+
+    def reset_stats(self):
+        """!
+        Clear the per-state counters and the transition log, the current visit is counted from now.
+        """
+        for i in range(len(self.ticks)):
+            self.ticks[i] = 0
+            self.entries[i] = 0
+            self.time_us[i] = 0
+        self.log_count = 0
+        self.log_next = 0
+        self.since = ticks_us()
+
+    def _name(self, index):
+        """!
+        Name of a state, or its number if it has no name.
+        """
+        name = self.names[index]
+        return name if name is not None else str(index)
+
+    def __repr__(self):
+        """!
+        Make a table of the per-state counters.
+
+        @return (str): one line per registered state with its ticks, entries and time [ms].
+        """
+        lines = [f"{self.name}: in {self._name(self.current)}",
+                 f"  {'STATE':<10s}{'TICKS':>10s}{'ENTRIES':>10s}{'TIME ms':>12s}"]
+        for i in range(len(self.names)):
+            if self.handlers[i] is not None:
+                lines.append(f"  {self._name(i):<10s}{self.ticks[i]:10d}{self.entries[i]:10d}{self.time_in(i)/1000:12.1f}")
+        return '\n'.join(lines)
@@ -0,0 +1,152 @@
+"""!
+@file latency.py
+This file contains a histogram of the age of sensor data at the time it reaches the motors.
+
+@author agent
+@date   2026-Oct-19
+"""
+
+from array import array
+
+## Largest sum [us] kept for the mean, under the small int range of MicroPython even with one more latency added
+TOTAL_MAX = 1 << 28
+
+## List of all the latency histograms, in the order they were created, for show_all()
+histogram_list = []
+
+
+def show_all():
+    """!
+    Print every latency histogram that has been created.
+    """
+    for histogram in histogram_list:
+        print(histogram)
+
+
+def reset_all():
+    """!
+    Clear every latency histogram that has been created.
+    """
+    for histogram in histogram_list:
+        histogram.reset()
+
+
+class LatencyHistogram:
+    """!
+    A histogram of the latency [us] from a sensor sample to the motor command it ends up in.
+    """
+    """
+    Each latency goes in the bin of its power of two, bin 0 for under 2 us, bin i for 2**i to
+    2**(i + 1) - 1 us, and the last bin for anything longer. Finding the bin is a bit count, so record()
+    is cheap enough for every tick and does not allocate memory. The count, the sum and the longest
+    latency are also kept, so print(histogram) shows the mean and the worst case next to the bins. At
+    1 kHz the sum would leave the small int range within minutes, so once it passes TOTAL_MAX the sum
+    and the number of latencies in it are both halved, which keeps the mean.
+
+    Attributes:
+        name (str): Name of the path from the sensor to the motors, for printing.
+        bins (array): Number of latencies in each bin.
+        count (int): Number of latencies recorded.
+        total (int): Sum [us] of the latencies in the mean.
+        n (int): Number of latencies in total.
+        worst (int): Longest latency [us] recorded.
+
+    Methods:
+        __init__(self, name, size): Initializes the LatencyHistogram instance.
+        record(self, us): Add one latency.
+        reset(self): Clear the histogram.
+    """
+
+    def __init__(self, name, size=16):
+        """!
+        Initializes the LatencyHistogram instance, empty.
+
+        @param name (str): Name of the path from the sensor to the motors, for printing.
+        @param size (int): Number of bins, the last one holds every latency of 2**(size - 1) us and longer.
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to measure how old the IMU yaw is when the motors are set'''
+
+              imu_latency = LatencyHistogram('IMU -> duty')
+              while True:
+                  yaw = IMU_YAW.get()
+                  mot.set_duty(PID.update(yaw, 0))
+                  imu_latency.record(IMU_YAW.age_us())
+                  sleep_ms(1)
+
+              # From the REPL
+              show_all()
+          @endcode
+        """
+
+        ## Name of the path from the sensor to the motors
+        self.name = name
+
+        ## Number of latencies in each bin
+        self.bins = array('L', [0] * size)
+
+        self.reset()
+        histogram_list.append(self)
+
+    def record(self, us):
+        """!
+        Add one latency.
+
+        @param us (int): Latency [us], negative values count as 0.
+        """
+        if us < 0:
+            us = 0
+        self.count += 1
+        self.total += us
+        self.n += 1
+        if self.total > TOTAL_MAX:
+            self.total >>= 1
+            self.n >>= 1
+        if us > self.worst:
+            self.worst = us
+        i = 0
+        us >>= 1
+        last = len(self.bins) - 1
+        while us and i < last:
+            us >>= 1
+            i += 1
+        self.bins[i] += 1
+
+    def reset(self):
+        """!
+        Clear the bins and the counters.
+        """
+        for i in range(len(self.bins)):
+            self.bins[i] = 0
+
+        ## Number of latencies recorded
+        self.count = 0
+
+        ## Sum of the latencies in the mean
+        self.total = 0
+
+        ## Number of latencies in total
+        self.n = 0
+
+        ## Longest latency recorded
+        self.worst = 0
+
+    def __repr__(self):
+        """!
+        Make a table of the histogram.
+
+        @return (str): a line with the count, mean and worst latency, then one line per bin that is not empty.
+        """
+        mean = self.total / self.n if self.n else 0
+        lines = [f"{self.name}: {self.count} samples, mean {mean:.0f} us, worst {self.worst} us"]
+        last = len(self.bins) - 1
+        for i in range(len(self.bins)):
+            if self.bins[i]:
+                low = 1 << i if i else 0
+                high = f"{(1 << (i + 1)) - 1:>7d}" if i < last else '    ...'
+                share = 100 * self.bins[i] / self.count
+                lines.append(f"  {low:>7d} - {high} us {self.bins[i]:>10d} {share:6.1f}%")
+        return '\n'.join(lines)
@@ -0,0 +1,846 @@
+"""!
+@file line_sensor.py
+This file contains classes to process the line sensors readings of ROMI.
+
+@author agent
+@date   2026-Oct-19
+"""
+
+from pyb import Pin, ADC, Timer
+from array import array
+from utime import ticks_us, ticks_ms, ticks_diff
+from math import pi
+from motion import wrap
+import struct
+
+## Frame index of the far left OSOYOO channel (PC0)
+CH_L2  = 0
+## Frame index of the close left OSOYOO channel (PA7)
+CH_L1  = 1
+## Frame index of the middle OSOYOO channel (PA6)
+CH_M   = 2
+## Frame index of the close right OSOYOO channel (PA5)
+CH_R1  = 3
+## Frame index of the far right OSOYOO channel (PC1)
+CH_R2  = 4
+## Frame index of the far middle TCRT5000 channel (PA4)
+CH_H   = 5
+
+## ADC pins of the frame channels, in frame order
+LINE_PINS = (Pin.cpu.C0, Pin.cpu.A7, Pin.cpu.A6, Pin.cpu.A5, Pin.cpu.C1, Pin.cpu.A4)
+
+class LineEstimator:
+    """!
+    A class that estimate a continuous line position from the 5 OSOYOO line sensors readings.
+    """
+    """
+    The 5 OSOYOO channels read low over the black line and high over the white background, so each
+    channel is weighted by how much darker than the background it is. The line position is the weighted
+    centroid of the channel positions, in sensor pitches from the middle sensor, positive to the left
+    so that it has the same sign as the yaw rate that turn ROMI back onto the line.
+
+        CHANNEL      L2     L1     M     R1     R2
+        POSITION     +2     +1     0     -1     -2
+
+    Attributes:
+        WHITE (int): Background reading, channels at or above it have no weight.
+        MIN_WEIGHT (int): Least total weight for the line to count as seen.
+        MIN_NORM_WEIGHT (int): Least total weight of normalized readings for the line to count as seen.
+        position (float): Line position [sensor pitch] from the latest update.
+        weight (int): Total weight from the latest update.
+        seen (bool): True if the line was seen in the latest update.
+
+    Methods:
+        __init__(self, white, min_weight, min_norm_weight): Initializes the LineEstimator instance.
+        update(self, L2, L1, M, R1, R2): Work out the line position from 5 raw readings.
+        update_normalized(self, norm): Work out the line position from 5 normalized readings.
+    """
+
+    def __init__(self, white=3500, min_weight=1500, min_norm_weight=450):
+        """!
+        Initializes the LineEstimator instance.
+
+        @param white (int): Background ADC reading, channels at or above it have no weight.
+        @param min_weight (int): Least total weight for the line to count as seen.
+        @param min_norm_weight (int): Least total weight of normalized readings for the line to count as seen.
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to print the line position under ROMI'''
+
+              line = LineEstimator()
+              if line.update(line_L2.read(), line_L1.read(), line_M.read(), line_R1.read(), line_R2.read()):
+                  print(f"Line position: {line.position} [sensor pitch]")
+              else:
+                  print("Line lost")
+          @endcode
+        """
+
+        ## Background reading, channels at or above it have no weight
+        self.WHITE = white
+
+        ## Least total weight for the line to count as seen
+        self.MIN_WEIGHT = min_weight
+
+        ## Least total weight of normalized readings for the line to count as seen
+        self.MIN_NORM_WEIGHT = min_norm_weight
+
+        ## Line position from the latest update, positive to the left
+        self.position = 0
+
+        ## Total weight from the latest update
+        self.weight = 0
+
+        ## True if the line was seen in the latest update
+        self.seen = False
+
+    def update(self, L2, L1, M, R1, R2):
+        """!
+        Work out the line position as the weighted centroid of the 5 raw readings.
+        If the line is not seen, the position is left at its last value.
+
+        @param L2 (int): far left line sensor reading
+        @param L1 (int): close left line sensor reading
+        @param M (int): middle line sensor reading
+        @param R1 (int): close right line sensor reading
+        @param R2 (int): far right line sensor reading
+
+        @return (bool): True if the line was seen
+        """
+        white = self.WHITE
+        wL2 = white - L2 if L2 < white else 0
+        wL1 = white - L1 if L1 < white else 0
+        wM  = white - M  if M  < white else 0
+        wR1 = white - R1 if R1 < white else 0
+        wR2 = white - R2 if R2 < white else 0
+
+        return self._centroid(wL2, wL1, wM, wR1, wR2, self.MIN_WEIGHT)
+
+    def update_normalized(self, norm):
+        """!
+        Work out the line position as the weighted centroid of 5 normalized readings from
+        LineCalibration.normalize(), where each reading already is the weight of its channel.
+
+        @param norm (array): normalized readings indexed by the CH_ constants, 0 over the background to NORM_FULL over the line
+
+        @return (bool): True if the line was seen
+        """
+        return self._centroid(norm[CH_L2], norm[CH_L1], norm[CH_M], norm[CH_R1], norm[CH_R2], self.MIN_NORM_WEIGHT)
+
+    def _centroid(self, wL2, wL1, wM, wR1, wR2, min_weight):
+        """!
+        Weighted centroid of the 5 channel positions, shared by update() and update_normalized().
+        """
+        weight = wL2 + wL1 + wM + wR1 + wR2
+        self.weight = weight
+        self.seen = weight >= min_weight
+        if self.seen:
+            self.position = (2*(wL2 - wR2) + wL1 - wR1) / weight
+        return self.seen
+
+
+class LineSensorArray:
+    """!
+    A class that sample all the line sensor channels together into one frame per tick.
+    """
+    """
+    Instead of one ADC.read() per channel, all channels are converted back to back on every tick of a
+    timer by ADC.read_timed_multi() into preallocated buffers, a few samples each, and averaged into a
+    frame with one reading per channel (indexed by the CH_ constants). So every channel of a frame is
+    sampled within a few microseconds of the others.
+
+    The frame can be acquired in the foreground with read(), which blocks for SAMPLES timer ticks, or
+    in the background with start(), where a timer interrupt samples one round of channels per tick and
+    publishes each averaged frame to a double-buffered FrameShare.
+
+    Attributes:
+        adcs (tuple): ADC object of each channel.
+        bufs (tuple): Sample buffer of each channel for ADC.read_timed_multi().
+        frame (array): Latest frame from read(), one averaged reading per channel.
+        t (int): Time stamp [us] of the latest frame from read().
+        SAMPLES (int): Number of samples averaged into each reading.
+        FRAME (frame share): Double-buffered frame share that start() publishes to, or None.
+
+    Methods:
+        __init__(self, FRAME, samples, pins, timer): Initializes the LineSensorArray instance.
+        read(self): Acquire one frame in the foreground and return it.
+        start(self, timer): Acquire frames in the background from a timer interrupt.
+        latest(self): Return the latest frame from either mode.
+    """
+
+    def __init__(self, FRAME=None, samples=4, pins=LINE_PINS, timer=None):
+        """!
+        Initializes the LineSensorArray instance.
+
+        @param FRAME (frame share): FrameShare of unsigned 16 bit readings, one per pin, for background mode, or None.
+        @param samples (int): Number of samples averaged into each reading.
+        @param pins (tuple): ADC pin of each channel, in frame order.
+        @param timer (Timer): Timer that paces ADC.read_timed_multi() in read(), by default timer 6 at 20 [kHz].
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to read and print all the line sensor channels once'''
+
+              sensors = LineSensorArray()
+              frame = sensors.read()
+              print(f"L2: {frame[CH_L2]} M: {frame[CH_M]} R2: {frame[CH_R2]} H: {frame[CH_H]}")
+          @endcode
+        """
+
+        ## ADC object of each channel
+        self.adcs = tuple(ADC(Pin(pin)) for pin in pins)
+
+        ## Sample buffer of each channel
+        self.bufs = tuple(array('H', [0] * samples) for pin in pins)
+
+        ## Latest frame from read()
+        self.frame = array('H', [0] * len(pins))
+
+        ## Time stamp of the latest frame from read()
+        self.t = ticks_us()
+
+        ## Number of samples averaged into each reading
+        self.SAMPLES = samples
+
+        ## Frame share that start() publishes to
+        self.FRAME = FRAME
+
+        ## Timer that paces ADC.read_timed_multi()
+        self.timer = timer if timer is not None else Timer(6, freq=20000)
+
+        # Running sums and round count of background mode
+        self.sums = array('L', [0] * len(pins))
+        self.count = 0
+
+    def read(self):
+        """!
+        Acquire one frame in the foreground, all channels sampled together SAMPLES times and averaged.
+
+        @return (array): the frame, one reading per channel indexed by the CH_ constants.
+        """
+        self.t = ticks_us()
+        ADC.read_timed_multi(self.adcs, self.bufs, self.timer)
+        frame = self.frame
+        samples = self.SAMPLES
+        i = 0
+        for buf in self.bufs:
+            frame[i] = sum(buf) // samples
+            i += 1
+        return frame
+
+    def start(self, timer):
+        """!
+        Acquire frames in the background, one round of channels per timer interrupt and one published
+        frame every SAMPLES interrupts. FRAME must have been given to the constructor.
+
+        @param timer (Timer): Timer already set to SAMPLES times the wanted frame rate.
+        """
+        self.count = 0
+        timer.callback(self._sample)
+
+    def _sample(self, timer):
+        """!
+        Timer interrupt of background mode. Add one round of readings to the sums, and after SAMPLES
+        rounds average them into the back frame and publish it. It does not allocate memory.
+
+        @param timer (Timer): The timer that interrupted.
+        """
+        sums = self.sums
+        i = 0
+        for adc in self.adcs:
+            sums[i] += adc.read()
+            i += 1
+        self.count += 1
+        if self.count >= self.SAMPLES:
+            back = self.FRAME.back()
+            samples = self.SAMPLES
+            for i in range(len(sums)):
+                back[i] = sums[i] // samples
+                sums[i] = 0
+            self.count = 0
+            self.FRAME.publish(in_ISR=True)
+
+    def latest(self):
+        """!
+        Return the latest frame, the front frame of FRAME in background mode or the frame from read().
+
+        @return (array or memoryview): the frame, one reading per channel indexed by the CH_ constants.
+        """
+        if self.FRAME is not None:
+            return self.FRAME.front()[0]
+        return self.frame
+
+
+## Number of line sensor channels that are calibrated, CH_L2 to CH_H
+CAL_CHANNELS = 6
+## Binary layout of the calibration file: magic, channel count, then the min and max reading of each channel
+CAL_FORMAT = '<4sB' + 'H' * (2 * CAL_CHANNELS)
+## First bytes of a valid calibration file
+CAL_MAGIC = b'LCAL'
+## Full scale of the normalized readings, 0 is background and NORM_FULL is right over the line
+NORM_FULL = 1000
+
+
+class LineCalibration:
+    """!
+    A class that calibrate the line sensor channels from a sweep over the line and the background.
+    """
+    """
+    While the calibrate mode input is held, ROMI is swept by hand over the line and the background and
+    every frame widens the min and max reading of each channel. When the sweep is finished, each
+    channel gets its own threshold at a fraction of the way between its min and max, so lighting or
+    surface changes only need a new sweep instead of code edits. The sweep goes into its own arrays and
+    only replaces lo, hi and the thresholds if it was good, a bad sweep leaves the calibration not valid.
+
+    The OSOYOO channels read low over the line while the TCRT5000 reads high, normalize() turns either
+    into 0 over the background up to NORM_FULL over the line. The min and max are kept in a compact
+    binary file on flash (CAL_FORMAT) that load() reads back in one go at boot.
+
+    Attributes:
+        lo (array): Lowest reading of each channel, from the last good sweep or calibration file.
+        hi (array): Highest reading of each channel, from the last good sweep or calibration file.
+        sweep_lo, sweep_hi (array): Lowest and highest reading of each channel during the sweep in progress.
+        thresholds (array): Line threshold of each channel, from finish() or load().
+        FRACTION (float): Where the threshold sits between min and max, from 0 to 1.
+        MIN_SPAN (int): Least difference between max and min for a channel to count as calibrated.
+        valid (bool): True once thresholds came from a good sweep or calibration file.
+        FILE (str): Name of the calibration file.
+
+    Methods:
+        __init__(self, file, fraction, min_span): Initializes the LineCalibration instance.
+        begin(self): Start a new sweep.
+        sample(self, frame): Widen the min and max of each channel from one frame.
+        finish(self): Keep the sweep and work out the thresholds if it was good.
+        normalize(self, frame, out): Scale the readings of one frame to 0 - NORM_FULL.
+        apply(self, thresholds): Copy the thresholds into another array.
+        save(self): Write the min and max of each channel to the calibration file.
+        load(self): Read the min and max of each channel from the calibration file.
+    """
+
+    def __init__(self, file='line_cal.bin', fraction=0.5, min_span=500):
+        """!
+        Initializes the LineCalibration instance.
+
+        @param file (str): Name of the calibration file on flash.
+        @param fraction (float): Where the threshold sits between min and max, from 0 to 1.
+        @param min_span (int): Least difference between max and min for a channel to count as calibrated.
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to calibrate the line sensors for 5 seconds and save it'''
+
+              sensors = LineSensorArray()
+              cal = LineCalibration()
+              cal.begin()
+              for i in range(500):
+                  cal.sample(sensors.read())
+                  sleep_ms(10)
+              if cal.finish():
+                  cal.save()
+                  print(f"Thresholds: {list(cal.thresholds)}")
+          @endcode
+        """
+
+        ## Name of the calibration file
+        self.FILE = file
+
+        ## Where the threshold sits between min and max
+        self.FRACTION = fraction
+
+        ## Least difference between max and min for a channel to count as calibrated
+        self.MIN_SPAN = min_span
+
+        ## Lowest reading of each channel
+        self.lo = array('H', [0] * CAL_CHANNELS)
+
+        ## Highest reading of each channel
+        self.hi = array('H', [0] * CAL_CHANNELS)
+
+        ## Lowest reading of each channel during the sweep in progress
+        self.sweep_lo = array('H', [0] * CAL_CHANNELS)
+
+        ## Highest reading of each channel during the sweep in progress
+        self.sweep_hi = array('H', [0] * CAL_CHANNELS)
+
+        ## Line threshold of each channel
+        self.thresholds = array('H', [0] * CAL_CHANNELS)
+
+        ## True once the thresholds are good
+        self.valid = False
+
+        self.begin()
+
+    def begin(self):
+        """!
+        Start a new sweep, the min and max of each channel in the sweep are reset.
+        """
+        for i in range(CAL_CHANNELS):
+            self.sweep_lo[i] = 0xFFFF
+            self.sweep_hi[i] = 0
+
+    def sample(self, frame):
+        """!
+        Widen the min and max reading of each channel in the sweep from one frame.
+
+        @param frame (array): Frame from LineSensorArray, indexed by the CH_ constants.
+        """
+        lo = self.sweep_lo
+        hi = self.sweep_hi
+        for i in range(CAL_CHANNELS):
+            v = frame[i]
+            if v < lo[i]:
+                lo[i] = v
+            if v > hi[i]:
+                hi[i] = v
+
+    def finish(self):
+        """!
+        Keep the sweep as the min and max of each channel and work out their thresholds. If any channel
+        did not see both the line and the background, the old min, max and thresholds are left alone and
+        the calibration is no longer valid.
+
+        @return (bool): True if the sweep was good and the thresholds were updated.
+        """
+        for i in range(CAL_CHANNELS):
+            if self.sweep_hi[i] < self.sweep_lo[i] + self.MIN_SPAN:
+                self.valid = False
+                return False
+        for i in range(CAL_CHANNELS):
+            self.lo[i] = self.sweep_lo[i]
+            self.hi[i] = self.sweep_hi[i]
+            self.thresholds[i] = int(self.lo[i] + (self.hi[i] - self.lo[i]) * self.FRACTION)
+        self.valid = True
+        return True
+
+    def normalize(self, frame, out):
+        """!
+        Scale the readings of one frame from 0 over the background to NORM_FULL over the line, clipped to
+        that range. The OSOYOO channels are inverted since they read low over the line. Nothing is allocated.
+
+        @param frame (array): Frame from LineSensorArray, indexed by the CH_ constants.
+        @param out (array): Array with at least CAL_CHANNELS entries for the normalized readings.
+        """
+        lo = self.lo
+        hi = self.hi
+        for i in range(CAL_CHANNELS):
+            v = frame[i]
+            if v <= lo[i]:
+                n = 0
+            elif v >= hi[i]:
+                n = NORM_FULL
+            else:
+                n = (v - lo[i]) * NORM_FULL // (hi[i] - lo[i])
+            out[i] = n if i == CH_H else NORM_FULL - n
+
+    def apply(self, thresholds):
+        """!
+        Copy the calibrated thresholds into another array, such as the thresholds of the decision logic.
+
+        @param thresholds (array): Array with at least CAL_CHANNELS entries, indexed by the CH_ constants.
+        """
+        for i in range(CAL_CHANNELS):
+            thresholds[i] = self.thresholds[i]
+
+    def save(self):
+        """!
+        Write the min and max reading of each channel to the calibration file.
+        """
+        with open(self.FILE, 'wb') as file:
+            file.write(struct.pack(CAL_FORMAT, CAL_MAGIC, CAL_CHANNELS, *(tuple(self.lo) + tuple(self.hi))))
+
+    def load(self):
+        """!
+        Read the min and max reading of each channel from the calibration file and work out the thresholds.
+
+        @return (bool): True if the file was there and good.
+        """
+        try:
+            with open(self.FILE, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return False
+        if len(data) != struct.calcsize(CAL_FORMAT):
+            return False
+        values = struct.unpack(CAL_FORMAT, data)
+        if values[0] != CAL_MAGIC or values[1] != CAL_CHANNELS:
+            return False
+        for i in range(CAL_CHANNELS):
+            self.sweep_lo[i] = values[2 + i]
+            self.sweep_hi[i] = values[2 + CAL_CHANNELS + i]
+        return self.finish()
+
+
+class LineConditioner:
+    """!
+    A class that condition the line sensor readings before the case decision so that noise cannot flip cases every tick.
+    """
+    """
+    Three stages, each one configurable and none of them allocating memory once constructed:
+
+        1. IIR filter     Each channel is low pass filtered, filt += (raw - filt) >> SHIFT, SHIFT = 0 turns it off.
+        2. Hysteresis     A channel only changes between on and off the line once its filtered reading is BANDS[ch]
+                          past the threshold, so a reading sitting on the threshold keeps its last side.
+        3. Dwell          A case is kept for at least DWELL_MS [ms] before another case may replace it.
+
+    How often each case is entered and how many case changes the dwell held off are counted, so the chatter
+    with and without conditioning can be compared.
+
+    Attributes:
+        filt (array): Filtered reading of each channel, indexed by the CH_ constants.
+        BANDS (array): Hysteresis band of each channel, indexed by the CH_ constants.
+        SHIFT (int): IIR filter strength, the new reading has a weight of 1/2**SHIFT.
+        DWELL_MS (int): Least time [ms] a case is kept.
+        line_mask (int): Channels on the line after hysteresis, bit (1 << CH_) per channel.
+        case (int): Case from the latest dwell().
+        entries (array): Number of times each case was entered.
+        held (int): Number of case changes that the dwell held off.
+
+    Methods:
+        __init__(self, cases, shift, band, h_band, dwell_ms): Initializes the LineConditioner instance.
+        filter(self, frame): Filter one frame of raw readings.
+        mask(self, thresholds): Threshold the filtered readings with hysteresis into a sensor mask.
+        dwell(self, case): Keep the current case until it has lasted DWELL_MS.
+        reset_stats(self): Clear the case counters.
+    """
+
+    def __init__(self, cases, shift=1, band=150, h_band=50, dwell_ms=4):
+        """!
+        Initializes the LineConditioner instance.
+
+        @param cases (int): Number of case codes to count entries for.
+        @param shift (int): IIR filter strength, the new reading has a weight of 1/2**shift, 0 for no filter.
+        @param band (int): Hysteresis band of the OSOYOO channels.
+        @param h_band (int): Hysteresis band of the TCRT5000 channel.
+        @param dwell_ms (int): Least time [ms] a case is kept, 0 for no dwell.
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to print the conditioned case every tick and the chatter it saved'''
+
+              sensors = LineSensorArray()
+              cond = LineConditioner(len(CASE_NAMES))
+              while True:
+                  cond.filter(sensors.read())
+                  case = cond.dwell(CASE_TABLE[cond.mask(THRESHOLDS)])
+                  print(f"{CASE_NAMES[case]} held off: {cond.held}")
+                  sleep_ms(1)
+          @endcode
+        """
+
+        ## Filtered reading of each channel
+        self.filt = array('H', [0] * CAL_CHANNELS)
+
+        ## Hysteresis band of each channel
+        self.BANDS = array('H', [band] * CAL_CHANNELS)
+        self.BANDS[CH_H] = h_band
+
+        ## IIR filter strength
+        self.SHIFT = shift
+
+        ## Least time a case is kept
+        self.DWELL_MS = dwell_ms
+
+        ## Channels on the line after hysteresis
+        self.line_mask = 0
+
+        ## Case from the latest dwell()
+        self.case = 0
+
+        ## Number of times each case was entered
+        self.entries = array('L', [0] * cases)
+
+        ## Number of case changes that the dwell held off
+        self.held = 0
+
+        self.case_ms = ticks_ms()
+        self.primed = False
+
+    def filter(self, frame):
+        """!
+        Filter one frame of raw readings into filt, the first frame is taken as it is.
+
+        @param frame (array): Frame from LineSensorArray, indexed by the CH_ constants.
+
+        @return (array): filt, the filtered reading of each channel.
+        """
+        filt = self.filt
+        if not self.primed:
+            for i in range(CAL_CHANNELS):
+                filt[i] = frame[i]
+            self.primed = True
+        else:
+            shift = self.SHIFT
+            for i in range(CAL_CHANNELS):
+                filt[i] += (frame[i] - filt[i]) >> shift
+        return filt
+
+    def mask(self, thresholds):
+        """!
+        Threshold the filtered readings with hysteresis into a sensor mask. The OSOYOO channels are on the
+        line below their threshold and the TCRT5000 above it.
+
+        @param thresholds (array): Threshold of each channel, indexed by the CH_ constants.
+
+        @return (int): sensor mask from 0 to 63, bit (1 << CH_) set for each channel on the line.
+        """
+        filt = self.filt
+        bands = self.BANDS
+        old = self.line_mask
+        mask = 0
+        for i in range(CH_H):
+            bit = 1 << i
+            if old & bit:
+                if filt[i] < thresholds[i] + bands[i]:
+                    mask |= bit
+            elif filt[i] < thresholds[i] - bands[i]:
+                mask |= bit
+        bit = 1 << CH_H
+        if old & bit:
+            if filt[CH_H] > thresholds[CH_H] - bands[CH_H]:
+                mask |= bit
+        elif filt[CH_H] > thresholds[CH_H] + bands[CH_H]:
+            mask |= bit
+        self.line_mask = mask
+        return mask
+
+    def dwell(self, case):
+        """!
+        Keep the current case until it has lasted DWELL_MS, then let the new case in and count its entry.
+
+        @param case (int): Case decided from this tick's mask.
+
+        @return (int): the case to run this tick.
+        """
+        if case != self.case:
+            now = ticks_ms()
+            if ticks_diff(now, self.case_ms) < self.DWELL_MS:
+                self.held += 1
+                return self.case
+            self.case = case
+            self.case_ms = now
+            self.entries[case] += 1
+        return case
+
+    def reset_stats(self):
+        """!
+        Clear the case entry counters and the held off count.
+        """
+        for i in range(len(self.entries)):
+            self.entries[i] = 0
+        self.held = 0
+
+
+class LineSearch:
+    """!
+    A class that look for the line again, on the side it was last seen, when ROMI loses it on a curve.
+    """
+    """
+    While the line is seen, seen() keeps the side it was last seen off center, +1 for the left channels,
+    -1 for the right ones, and when, a mask with the middle channel is centered. When the line is lost, lost() tells a curve from the end of the line:
+    if it was off center less than SIDE_MS [ms] ago, it ran off on that side and a search starts, if it
+    was centered, the line ended and the end-of-line explore for the target goes on as before.
+
+    The search first pivots SWEEP [rad] towards the last side, then swings back and forth in arcs, each
+    one GROW times wider than the one before and driven ARC_V [m/s] faster, so the arcs also move ahead.
+    After LEGS legs it gives up and the side is forgotten, so the next loss is an end-of-line explore.
+
+    The time from losing the line to finding it again is kept as statistics, print(search) shows them.
+
+    Attributes:
+        side (int): Side the line was last seen off center, +1 left, -1 right, 0 centered.
+        active (bool): True while searching.
+        found (int): Number of searches that found the line.
+        failed (int): Number of searches that gave up.
+        last_ms, max_ms, total_ms (int): Time [ms] of the latest, longest and all searches that found the line.
+
+    Methods:
+        __init__(self, sweep, y_search, arc_v, grow, legs, side_ms): Initializes the LineSearch instance.
+        seen(self, mask): Keep the side of a mask with the line in it.
+        lost(self): Check if the line was lost on a curve.
+        start(self, heading): Start a search.
+        update(self, heading): Speed and yaw rate of the search for this tick.
+        stop(self): End a search that found the line.
+        reset_stats(self): Clear the search statistics.
+    """
+
+    def __init__(self, sweep=1.2, y_search=2.0, arc_v=0.04, grow=1.5, legs=5, side_ms=300):
+        """!
+        Initializes the LineSearch instance.
+
+        @param sweep (float): Heading change [rad] of the first pivot towards the last side.
+        @param y_search (float): Yaw rate [rad/s] of the search.
+        @param arc_v (float): Speed [m/s] added on every leg after the first pivot.
+        @param grow (float): How much wider each leg swings than the one before.
+        @param legs (int): Number of legs before the search gives up.
+        @param side_ms (int): Longest time [ms] since the line was seen off center for a loss to be a curve.
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to search for the line when it is lost on a curve'''
+
+              search = LineSearch()
+              while True:
+                  mask = cond.mask(THRESHOLDS)
+                  if mask & 0b11111:
+                      if search.active:
+                          search.stop()
+                      search.seen(mask)
+                  elif search.active or (search.lost() and search.start(IMU_YAW.get())):
+                      out = search.update(IMU_YAW.get())
+                      if out is not None:
+                          v, y = out
+              print(search)
+          @endcode
+        """
+
+        ## Heading change of the first pivot
+        self.SWEEP = sweep
+
+        ## Yaw rate of the search
+        self.Y_SEARCH = y_search
+
+        ## Speed added on every leg
+        self.ARC_V = arc_v
+
+        ## How much wider each leg swings
+        self.GROW = grow
+
+        ## Number of legs before giving up
+        self.LEGS = legs
+
+        ## Longest time since the line was seen off center for a loss to be a curve
+        self.SIDE_MS = side_ms
+
+        ## Side the line was last seen off center
+        self.side = 0
+
+        ## True while searching
+        self.active = False
+
+        # Time stamp [ms] of the last mask off center, and of the start of the search
+        self.side_ms = ticks_ms()
+        self.start_ms = 0
+
+        # Current leg, its direction and the heading offset [rad] it swings to from the start heading
+        self.leg = 0
+        self.dir = 0
+        self.bound = 0
+        self.heading0 = 0
+
+        self.reset_stats()
+
+    def seen(self, mask):
+        """!
+        Keep the side of a mask with the line in it.
+
+        @param mask (int): Sensor mask from LineConditioner.mask().
+        """
+        left = mask & ((1 << CH_L2) | (1 << CH_L1))
+        right = mask & ((1 << CH_R1) | (1 << CH_R2))
+        if mask & (1 << CH_M):
+            self.side = 0
+        elif left and not right:
+            self.side = 1
+            self.side_ms = ticks_ms()
+        elif right and not left:
+            self.side = -1
+            self.side_ms = ticks_ms()
+
+    def lost(self):
+        """!
+        Check if the line was just lost on a curve rather than at its end.
+
+        @return (bool): True if the line was off center less than SIDE_MS ago.
+        """
+        return self.side != 0 and ticks_diff(ticks_ms(), self.side_ms) < self.SIDE_MS
+
+    def start(self, heading):
+        """!
+        Start a search with a pivot towards the side the line was last seen.
+
+        @param heading (float): Heading [rad] when the line was lost.
+
+        @return (bool): True, so it can be chained after lost().
+        """
+        self.active = True
+        self.start_ms = ticks_ms()
+        self.heading0 = heading
+        self.leg = 0
+        self.dir = self.side
+        self.bound = self.SWEEP
+        return True
+
+    def update(self, heading):
+        """!
+        Speed and yaw rate of the search for this tick, the leg changes once its heading offset is reached.
+
+        @param heading (float): Heading [rad] from the IMU.
+
+        @return (tuple): (v, y) linear speed [m/s] and yaw rate [rad/s], or None once the search gave up.
+        """
+        offset = self.dir * wrap(heading - self.heading0)
+        if offset >= self.bound:
+            self.leg += 1
+            if self.leg >= self.LEGS:
+                self.active = False
+                self.failed += 1
+                self.side = 0
+                return None
+            self.dir = -self.dir
+            self.bound = self.SWEEP * self.GROW**self.leg
+            # wrap() never reaches pi, keep the widest swing short of turning around
+            if self.bound > 0.9*pi:
+                self.bound = 0.9*pi
+        return self.ARC_V * self.leg, self.dir * self.Y_SEARCH
+
+    def stop(self):
+        """!
+        End a search that found the line and count its time.
+        """
+        if self.active:
+            self.active = False
+            self.found += 1
+            self.last_ms = ticks_diff(ticks_ms(), self.start_ms)
+            self.total_ms += self.last_ms
+            if self.last_ms > self.max_ms:
+                self.max_ms = self.last_ms
+
+    def reset_stats(self):
+        """!
+        Clear the search statistics.
+        """
+
+        ## Number of searches that found the line
+        self.found = 0
+
+        ## Number of searches that gave up
+        self.failed = 0
+
+        ## Time of the latest search that found the line
+        self.last_ms = 0
+
+        ## Time of the longest search that found the line
+        self.max_ms = 0
+
+        ## Time of all the searches that found the line
+        self.total_ms = 0
+
+    def __repr__(self):
+        """!
+        Make a line of the search statistics.
+
+        @return (str): number of searches found and failed, latest, mean and longest time [ms] to find the line.
+        """
+        mean = self.total_ms / self.found if self.found else 0
+        return (f"LineSearch: {self.found} found, {self.failed} failed, "
+                f"last {self.last_ms} ms, mean {mean:.1f} ms, max {self.max_ms} ms")
@@ -11,6 +11,7 @@ import task_MOT
 import task_SER
 import task_IMU
 import task_ULS
+import task_INP
 import task_share 
 import cotask
 
@@ -28,33 +29,50 @@ def main():
         
         TASK    PRIORITY    PERIOD(ms)                                 DESCRIPTION
         MOT        4          1         This task run as a main task that control ROMI base on feedback from different sensor in other task 
-        SER        1          2         This task run to control 2 servo, one is for ultrasonic sensor angle, and one for the blindfold   
+        SER        1          -         This task run to control 2 servo, one is for ultrasonic sensor angle, and one for the blindfold   
+                                        it has no period, it only runs when SER_DIR or CLOSE changes
         IMU        3          1         This task run to continuosly reading the corrected yaw angle from the IMU    
         ULS        2          2         This task run to continuosly reading the distance in the front of the ultrasonic sensor
+        INP        1          20        This task run to debounce the blue button and the calibrate mode switch, the button 
+                                        interrupt only schedules a callback and the switch is read once per period
         
     The MOT task and SER task share: SER_DIR    for the first servo that control the ultrasonic sensor
     The MOT task and SER task share: CLOSE      for the second motor that control a 3D printed blindfold
     The MOT task and ULS task share: ULS_DIS    for the sensor distance from the ultrasonic sensor to detect wall
     The MOT task and IMU task share: IMU_YAW    for ROMI updated yaw angle 
+    The MOT task and INP task share: CAL_MODE   for the debounced calibrate mode switch
+    The INP task toggles:            CLOSE      for the blindfold on every debounced press of the blue button
+    The MOT task publishes:          POSE       for ROMI x, y, yaw, traveled distance and time stamp as one consistent record
+    The MOT task follows:            WAYPOINTS  for the (x, y) waypoints of the way back home, queued by MOT or any other task
     """
     
     # Initialize shared variables for inter-task communication
     SER_DIR = task_share.Share('b', name = "Servo Direction")
-    IMU_YAW = task_share.Share('f', name = "Romi's Yaw")
-    ULS_DIS = task_share.Share('f', name = "Ultrasonic Distance")
+    IMU_YAW = task_share.Share('f', name = "Romi's Yaw", timestamp = True)
+    ULS_DIS = task_share.Share('f', name = "Ultrasonic Distance", timestamp = True)
     CLOSE   = task_share.Share('i', name = "Close Eye Servo")
+    POSE    = task_share.RecordShare('ffffL', ('x', 'y', 'yaw', 'distance', 't'), name = "Romi's Pose")
+    WAYPOINTS = task_share.StructQueue('ff', 66, name = "Waypoints")
+    CAL_MODE  = task_share.Share('b', name = "Calibrate Mode")
     
     # Initialize tasks with their respective shared variables
-    MOT_run   = task_MOT.MotorTask(SER_DIR, IMU_YAW, ULS_DIS, CLOSE)
+    MOT_run   = task_MOT.MotorTask(SER_DIR, IMU_YAW, ULS_DIS, CLOSE, POSE, WAYPOINTS, CAL_MODE)
     SER_run   = task_SER.ServoTask(SER_DIR, CLOSE)
     IMU_run   = task_IMU.IMUTask(IMU_YAW)
     ULS_run   = task_ULS.ULSTask(ULS_DIS)
+    INP_run   = task_INP.InputTask(CAL_MODE, CLOSE)
     
     # Create cotask.Task objects for each task
     ULS       = cotask.Task(ULS_run.run, name='ULS_TASK' , priority=1, period=5)
-    SER       = cotask.Task(SER_run.run, name='SER_TASK' , priority=2, period=5)
+    SER       = cotask.Task(SER_run.run, name='SER_TASK' , priority=2, period=None)
     MOT       = cotask.Task(MOT_run.run, name='MOT_TASK' , priority=4, period=1)
     IMU       = cotask.Task(IMU_run.run, name='IMU_TASK' , priority=3, period=1)
+    INP       = cotask.Task(INP_run.run, name='INP_TASK' , priority=1, period=20)
+    
+    # Run the servo task only when its shares change, plus once to init the servos
+    SER_DIR.subscribe(SER)
+    CLOSE.subscribe(SER)
+    SER.go()
     
     # Create a task list and add tasks to it
     task_list = cotask.TaskList()
@@ -62,6 +80,7 @@ def main():
     task_list.append(SER)
     task_list.append(ULS)
     task_list.append(IMU)
+    task_list.append(INP)
     
     # Main loop to run tasks
     while True:     
@@ -0,0 +1,823 @@
+"""!
+@file motion.py
+This file contains classes and functions that shape ROMI motion commands before the wheel speeds.
+
+@author agent
+@date   2026-Oct-19
+"""
+
+from utime import ticks_diff
+from math import sin, cos, pi, sqrt
+from array import array
+from task_share import OK
+
+
+class MotionProfiler:
+    """!
+    A class that ramp the linear speed and yaw rate commands with acceleration and jerk limits.
+    """
+    """
+    Each case asks for a step change of linear speed v and yaw rate y, for example from straight fast to
+    really hard turn. Fed straight to the wheel PIDs, the step makes the wheels slip. The profiler
+    moves its output towards the target at no more than the acceleration limit, and with a jerk limit
+    the acceleration itself ramps as well, so the ramp is an S-curve instead of a trapezoid.
+
+    Near the target the acceleration is limited to sqrt(2*jerk*error) so the ramp rounds off onto the
+    target instead of overshooting it. The time step of every update is measured from the time stamps
+    given, so the limits hold whatever the task period and however many ticks were skipped.
+
+        A_MAX, J_MAX           linear acceleration [m/s^2] and jerk [m/s^3] limits
+        ALPHA_MAX, JA_MAX      yaw acceleration [rad/s^2] and jerk [rad/s^3] limits
+        J_MAX or JA_MAX = 0    no jerk limit, trapezoidal ramp
+
+    Attributes:
+        v (float): Profiled linear speed [m/s].
+        y (float): Profiled yaw rate [rad/s].
+        a (float): Linear acceleration [m/s^2] of the latest update.
+        alpha (float): Yaw acceleration [rad/s^2] of the latest update.
+        dt (float): Time step [s] of the latest update.
+        DT_MAX (float): Longest time step [s] used, a longer gap between updates is clipped to it.
+
+    Methods:
+        __init__(self, a_max, j_max, alpha_max, ja_max): Initializes the MotionProfiler instance.
+        update(self, v, y, t): Ramp the outputs towards the target speed and yaw rate.
+        reset(self, v, y): Set the outputs without ramping.
+    """
+
+    def __init__(self, a_max=1.0, j_max=10.0, alpha_max=20.0, ja_max=200.0):
+        """!
+        Initializes the MotionProfiler instance.
+
+        @param a_max (float): Linear acceleration limit [m/s^2].
+        @param j_max (float): Linear jerk limit [m/s^3], 0 for a trapezoidal ramp.
+        @param alpha_max (float): Yaw acceleration limit [rad/s^2].
+        @param ja_max (float): Yaw jerk limit [rad/s^3], 0 for a trapezoidal ramp.
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to ramp the wheel speeds of each case every tick'''
+
+              profile = MotionProfiler()
+              while True:
+                  case = check_sensor(L2, L1, M, R1, R2, H)
+                  profile.update(CASE_V[case], CASE_Y[case], ticks_us())
+                  wR, wL = DC_speed_cal(profile.y, profile.v)
+                  sleep_ms(1)
+          @endcode
+        """
+
+        ## Linear acceleration limit
+        self.A_MAX = a_max
+
+        ## Linear jerk limit
+        self.J_MAX = j_max
+
+        ## Yaw acceleration limit
+        self.ALPHA_MAX = alpha_max
+
+        ## Yaw jerk limit
+        self.JA_MAX = ja_max
+
+        ## Longest time step used
+        self.DT_MAX = 0.05
+
+        ## Time step of the latest update
+        self.dt = 0
+
+        self.t = None
+        self.reset()
+
+    def reset(self, v=0, y=0):
+        """!
+        Set the outputs without ramping, with no acceleration.
+
+        @param v (float): Linear speed [m/s].
+        @param y (float): Yaw rate [rad/s].
+        """
+
+        ## Profiled linear speed
+        self.v = v
+
+        ## Profiled yaw rate
+        self.y = y
+
+        ## Linear acceleration of the latest update
+        self.a = 0
+
+        ## Yaw acceleration of the latest update
+        self.alpha = 0
+
+    def update(self, v, y, t):
+        """!
+        Ramp the outputs one time step towards the target speed and yaw rate.
+
+        @param v (float): Target linear speed [m/s].
+        @param y (float): Target yaw rate [rad/s].
+        @param t (int): Time stamp [us] from ticks_us().
+        """
+        if self.t is None:
+            self.t = t
+            return
+        dt = ticks_diff(t, self.t) / 1000000
+        self.t = t
+        if dt <= 0:
+            return
+        if dt > self.DT_MAX:
+            dt = self.DT_MAX
+        self.dt = dt
+        self.v, self.a = ramp(self.v, self.a, v, self.A_MAX, self.J_MAX, dt)
+        self.y, self.alpha = ramp(self.y, self.alpha, y, self.ALPHA_MAX, self.JA_MAX, dt)
+
+
+def ramp(x, a, target, a_max, j_max, dt):
+    """!
+    Move one value one time step towards its target with acceleration and jerk limits.
+
+    @param x (float): Value now.
+    @param a (float): Rate of change of the value now.
+    @param target (float): Target value.
+    @param a_max (float): Rate of change limit.
+    @param j_max (float): Limit of the change of the rate of change, 0 for none.
+    @param dt (float): Time step [s].
+
+    @return x (float): Value after the time step.
+    @return a (float): Rate of change during the time step.
+    """
+    err = target - x
+    if err == 0 and a == 0:
+        return x, 0
+
+    # Fastest rate that can still round off onto the target, then the jerk limit on reaching it
+    if j_max:
+        a_des = (2*j_max*abs(err)) ** 0.5
+        if a_des > a_max:
+            a_des = a_max
+        if err < 0:
+            a_des = -a_des
+        da = j_max*dt
+        if a_des > a + da:
+            a += da
+        elif a_des < a - da:
+            a -= da
+        else:
+            a = a_des
+    else:
+        a = a_max if err > 0 else -a_max
+
+    step = a*dt
+    if (err > 0 and step >= err) or (err < 0 and step <= err):
+        return target, 0
+    return x + step, a
+
+
+def wrap(angle):
+    """!
+    Wrap an angle into -pi to pi.
+
+    @param angle (float): angle [rad].
+
+    @return (float): the same angle [rad] between -pi and pi.
+    """
+    while angle > pi:
+        angle -= 2*pi
+    while angle < -pi:
+        angle += 2*pi
+    return angle
+
+
+class PurePursuit:
+    """!
+    A class that drive ROMI through a queue of (x, y) waypoints with a pure pursuit lookahead law.
+    """
+    """
+    ROMI steers towards a goal point LOOKAHEAD [m] ahead along the segment from the last waypoint to the
+    current one, on the arc through the goal point that is tangent to its heading:
+
+        curvature = 2 * (goal point to the left of ROMI) / (distance to the goal point)**2
+        yaw rate  = linear speed * curvature
+
+    A waypoint is done with as soon as it is within LOOKAHEAD and there is another one queued, so ROMI
+    cuts smoothly across corners instead of stopping at each of them. On the last segment the goal point
+    is the last waypoint itself, the speed drops in proportion to its distance within SLOW_RADIUS, and
+    the run is done within REACH of it. If the goal point is behind ROMI, or the arc is too tight for
+    Y_MAX, the speed is lowered so that ROMI turns on the spot rather than sweeping a wide circle.
+
+    The waypoints come from a StructQueue of 'ff' records, so another task may queue them as well.
+
+    Attributes:
+        WAYPOINTS (StructQueue): Queue of (x, y) waypoints [m] still to go to.
+        LOOKAHEAD (float): Distance [m] to the goal point.
+        V_CRUISE (float): Linear speed [m/s] away from the last waypoint.
+        SLOW_RADIUS (float): Distance [m] to the last waypoint within which ROMI slows down.
+        REACH (float): Distance [m] to the last waypoint that counts as there.
+        Y_MAX (float): Largest yaw rate [rad/s].
+        active (bool): True between start() and reaching the last waypoint.
+        done (bool): True once the last waypoint was reached.
+
+    Methods:
+        __init__(self, WAYPOINTS, lookahead, v_cruise, slow_radius, reach, y_max): Initializes the PurePursuit instance.
+        start(self): Start from wherever ROMI is to the queued waypoints.
+        stop(self): Stop following the waypoints and clear them.
+        update(self, x, y, heading): Work out the linear speed and yaw rate for this tick.
+    """
+
+    def __init__(self, WAYPOINTS, lookahead=0.1, v_cruise=0.25, slow_radius=0.15, reach=0.02, y_max=2.5):
+        """!
+        Initializes the PurePursuit instance.
+
+        @param WAYPOINTS (StructQueue): Queue of 'ff' records, the (x, y) waypoints [m] in order.
+        @param lookahead (float): Distance [m] to the goal point.
+        @param v_cruise (float): Linear speed [m/s] away from the last waypoint.
+        @param slow_radius (float): Distance [m] to the last waypoint within which ROMI slows down.
+        @param reach (float): Distance [m] to the last waypoint that counts as there.
+        @param y_max (float): Largest yaw rate [rad/s].
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to drive ROMI diagonally back to the origin'''
+
+              WAYPOINTS = task_share.StructQueue('ff', 8)
+              pursuit = PurePursuit(WAYPOINTS)
+              WAYPOINTS.put(0, 0)
+              pursuit.start()
+              while not pursuit.done:
+                  v, y = pursuit.update(odo.x, odo.y, odo.heading)
+                  wR, wL = DC_speed_cal(y, v)
+                  sleep_ms(1)
+          @endcode
+        """
+
+        ## Queue of waypoints still to go to
+        self.WAYPOINTS = WAYPOINTS
+
+        ## Distance to the goal point
+        self.LOOKAHEAD = lookahead
+
+        ## Linear speed away from the last waypoint
+        self.V_CRUISE = v_cruise
+
+        ## Distance to the last waypoint within which ROMI slows down
+        self.SLOW_RADIUS = slow_radius
+
+        ## Distance to the last waypoint that counts as there
+        self.REACH = reach
+
+        ## Largest yaw rate
+        self.Y_MAX = y_max
+
+        ## True while following the waypoints
+        self.active = False
+
+        ## True once the last waypoint was reached
+        self.done = False
+
+        # Segment being followed, from (ax, ay) to the waypoint (bx, by)
+        self.ax = 0
+        self.ay = 0
+        self.bx = 0
+        self.by = 0
+        self.has_b = False
+        self.record = [0, 0]
+
+    def start(self):
+        """!
+        Start from wherever ROMI is at the next update to the waypoints queued.
+        """
+        self.active = True
+        self.done = False
+        self.has_b = False
+
+    def stop(self):
+        """!
+        Stop following the waypoints and clear the queue.
+        """
+        self.active = False
+        self.has_b = False
+        self.WAYPOINTS.clear()
+
+    def _next(self):
+        """!
+        Take the next waypoint from the queue as the end of the segment, the old end becomes its start.
+
+        @return (bool): True if there was one.
+        """
+        if self.WAYPOINTS.get_into(self.record) != OK:
+            return False
+        if self.has_b:
+            self.ax = self.bx
+            self.ay = self.by
+        self.bx = self.record[0]
+        self.by = self.record[1]
+        self.has_b = True
+        return True
+
+    def update(self, x, y, heading):
+        """!
+        Work out the linear speed and yaw rate that follow the waypoints for this tick.
+
+        @param x (float): X global coordinate [m] of ROMI.
+        @param y (float): Y global coordinate [m] of ROMI.
+        @param heading (float): Heading [rad] of ROMI.
+
+        @return v (float): linear speed [m/s].
+        @return y (float): yaw rate [rad/s].
+        """
+        if not self.active:
+            return 0, 0
+        if not self.has_b:
+            self.ax = x
+            self.ay = y
+            if not self._next():
+                self.active = False
+                self.done = True
+                return 0, 0
+
+        # Move on to the next segment once its end is within reach of the lookahead circle
+        L = self.LOOKAHEAD
+        while (self.bx - x)**2 + (self.by - y)**2 < L*L and self.WAYPOINTS.any():
+            self._next()
+        last = not self.WAYPOINTS.any()
+
+        dbx = self.bx - x
+        dby = self.by - y
+        d_end = (dbx*dbx + dby*dby) ** 0.5
+        if last and d_end < self.REACH:
+            self.active = False
+            self.done = True
+            return 0, 0
+
+        # Goal point: where the lookahead circle leaves the segment, or the segment end if it is inside
+        if d_end <= L:
+            gx = self.bx
+            gy = self.by
+        else:
+            sx = self.bx - self.ax
+            sy = self.by - self.ay
+            s2 = sx*sx + sy*sy
+            t = ((x - self.ax)*sx + (y - self.ay)*sy) / s2 if s2 else 1
+            if t < 0:
+                t = 0
+            px = self.ax + t*sx - x
+            py = self.ay + t*sy - y
+            e2 = px*px + py*py
+            if e2 < L*L and s2:
+                t += ((L*L - e2) / s2) ** 0.5
+                if t > 1:
+                    t = 1
+            gx = self.ax + t*sx
+            gy = self.ay + t*sy
+
+        # Goal point in ROMI frame, ahead and to the left
+        dx = gx - x
+        dy = gy - y
+        c = cos(heading)
+        s = sin(heading)
+        ahead = c*dx + s*dy
+        left = c*dy - s*dx
+        g2 = dx*dx + dy*dy
+        if g2 == 0:
+            return 0, 0
+
+        v = self.V_CRUISE
+        if last and d_end < self.SLOW_RADIUS:
+            v *= d_end / self.SLOW_RADIUS
+        if ahead <= 0:
+            # Goal point behind, turn on the spot towards it
+            return 0, (self.Y_MAX if left >= 0 else -self.Y_MAX)
+        curvature = 2*left / g2
+        yaw_rate = v*curvature
+        if yaw_rate > self.Y_MAX or yaw_rate < -self.Y_MAX:
+            yaw_rate = self.Y_MAX if yaw_rate > 0 else -self.Y_MAX
+            v = yaw_rate / curvature
+        return v, yaw_rate
+
+
+class HeadingController:
+    """!
+    A class that turn ROMI to a heading, or hold it while driving, with a wrap-aware PD law on the heading.
+    """
+    """
+    The error is the shortest angle from the heading to the target, so a target of 0.05 [rad] from a
+    heading of 6.2 [rad] is a small left turn rather than a full turn the other way. The yaw rate is
+
+        yaw rate = KP * error - KD * (measured yaw rate)
+
+    with the derivative on the measured heading rather than the error, so a new target gives no kick,
+    clipped to Y_MAX and changed by at most ALPHA_MAX [rad/s^2] per second so it slows smoothly into the
+    target. The turn counts as settled once the error is within TOLERANCE and the measured yaw rate
+    within RATE_TOLERANCE for SETTLE_US, and stays settled until the error grows past twice TOLERANCE.
+
+    Attributes:
+        target (float): Heading [rad] to turn to or hold.
+        error (float): Shortest angle [rad] from the heading to the target, positive to the left.
+        rate (float): Measured yaw rate [rad/s].
+        y (float): Yaw rate command [rad/s].
+        settled (bool): True once the turn has settled.
+
+    Methods:
+        __init__(self, kp, kd, y_max, alpha_max, tolerance, rate_tolerance, settle_ms): Initializes the HeadingController instance.
+        set_target(self, target): Turn to or hold a new heading.
+        update(self, heading, t): Work out the yaw rate command for this tick.
+    """
+
+    def __init__(self, kp=4.0, kd=0.15, y_max=2.5, alpha_max=30.0, tolerance=0.03, rate_tolerance=0.3, settle_ms=60):
+        """!
+        Initializes the HeadingController instance.
+
+        @param kp (float): Yaw rate [rad/s] per radian of heading error.
+        @param kd (float): Yaw rate [rad/s] taken off per [rad/s] of measured yaw rate.
+        @param y_max (float): Largest yaw rate command [rad/s].
+        @param alpha_max (float): Largest change of the yaw rate command [rad/s^2].
+        @param tolerance (float): Heading error [rad] within which the turn may count as settled.
+        @param rate_tolerance (float): Measured yaw rate [rad/s] within which the turn may count as settled.
+        @param settle_ms (int): Time [ms] both have to stay within tolerance for the turn to count as settled.
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to turn ROMI 90 degrees left on the spot'''
+
+              heading = HeadingController()
+              heading.set_target(wrap(IMU_YAW.get() + pi/2))
+              while not heading.settled:
+                  wR, wL = DC_speed_cal(heading.update(IMU_YAW.get(), ticks_us()), 0)
+                  sleep_ms(1)
+          @endcode
+        """
+
+        ## Yaw rate per radian of heading error
+        self.KP = kp
+
+        ## Yaw rate taken off per rad/s of measured yaw rate
+        self.KD = kd
+
+        ## Largest yaw rate command
+        self.Y_MAX = y_max
+
+        ## Largest change of the yaw rate command
+        self.ALPHA_MAX = alpha_max
+
+        ## Heading error within which the turn may count as settled
+        self.TOLERANCE = tolerance
+
+        ## Measured yaw rate within which the turn may count as settled
+        self.RATE_TOLERANCE = rate_tolerance
+
+        ## Time [us] both have to stay within tolerance
+        self.SETTLE_US = settle_ms * 1000
+
+        ## Heading to turn to or hold
+        self.target = None
+
+        ## Shortest angle from the heading to the target
+        self.error = 0
+
+        ## Measured yaw rate
+        self.rate = 0
+
+        ## Yaw rate command
+        self.y = 0
+
+        ## True once the turn has settled
+        self.settled = False
+
+        self.heading = None
+        self.t = 0
+        self.within_us = 0
+
+    def set_target(self, target):
+        """!
+        Turn to or hold a new heading. Setting the same target again changes nothing, so it can be called
+        every time a state is entered.
+
+        @param target (float): Heading [rad], any multiple of 2*pi away from it is the same.
+        """
+        if target != self.target:
+            self.target = target
+            self.settled = False
+            self.within_us = 0
+
+    def update(self, heading, t):
+        """!
+        Work out the yaw rate command for this tick.
+
+        @param heading (float): Heading [rad] now.
+        @param t (int): Time stamp [us] from ticks_us().
+
+        @return (float): yaw rate command [rad/s], positive to the left.
+        """
+        self.error = wrap(self.target - heading)
+        if self.heading is None:
+            self.heading = heading
+            self.t = t
+            return self.y
+        dt_us = ticks_diff(t, self.t)
+        if dt_us <= 0:
+            return self.y
+        dt = dt_us / 1000000
+        self.rate = wrap(heading - self.heading) / dt
+        self.heading = heading
+        self.t = t
+
+        y = self.KP*self.error - self.KD*self.rate
+        if y > self.Y_MAX:
+            y = self.Y_MAX
+        elif y < -self.Y_MAX:
+            y = -self.Y_MAX
+        dy = self.ALPHA_MAX*dt
+        if y > self.y + dy:
+            y = self.y + dy
+        elif y < self.y - dy:
+            y = self.y - dy
+        self.y = y
+
+        err = abs(self.error)
+        if self.settled:
+            if err > 2*self.TOLERANCE:
+                self.settled = False
+                self.within_us = 0
+        elif err < self.TOLERANCE and abs(self.rate) < self.RATE_TOLERANCE:
+            self.within_us += dt_us
+            if self.within_us >= self.SETTLE_US:
+                self.settled = True
+        else:
+            self.within_us = 0
+        return y
+
+
+class WallFollower:
+    """!
+    A class that drive ROMI along a wall on its right at a set distance, from the ultrasonic sensor pointed sideways.
+    """
+    """
+    The slant range is first turned into the square distance to the wall with the heading of ROMI
+    relative to the wall, otherwise turning towards the wall makes the slant range grow and ROMI turns
+    even more. The distance error and the range rate, the change of the distance between two new ultrasonic
+    readings, go through a PD law to the yaw rate:
+
+        yaw rate = -(KP * (distance - DISTANCE) + KD * range rate)
+
+    so ROMI turns right towards the wall when it is too far or moving away, and left when it is too
+    close or closing in. The error is clipped to MAX_ERROR so that when the wall ends, at a corner of
+    the obstacle, ROMI keeps turning right around it at a bounded rate instead of spinning on the spot.
+
+    Attributes:
+        DISTANCE (float): Distance [cm] to keep from the wall.
+        V (float): Linear speed [m/s] along the wall.
+        error (float): Distance error [cm] of the latest update.
+        rate (float): Range rate [cm/s] of the latest new reading.
+
+    Methods:
+        __init__(self, distance, kp, kd, v, y_max, max_error): Initializes the WallFollower instance.
+        reset(self): Forget the last reading before following a new wall.
+        update(self, distance, t, new, angle): Work out the linear speed and yaw rate for this tick.
+    """
+
+    def __init__(self, distance=20, kp=0.08, kd=0.12, v=0.15, y_max=1.5, max_error=15):
+        """!
+        Initializes the WallFollower instance.
+
+        @param distance (float): Distance [cm] to keep from the wall.
+        @param kp (float): Yaw rate [rad/s] per [cm] of distance error.
+        @param kd (float): Yaw rate [rad/s] per [cm/s] of range rate.
+        @param v (float): Linear speed [m/s] along the wall.
+        @param y_max (float): Largest yaw rate [rad/s].
+        @param max_error (float): Largest distance error [cm] used, for when the wall ends.
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to follow a wall on the right of ROMI at 20 cm'''
+
+              SER_DIR.put(1)
+              wall = WallFollower()
+              seq = ULS_DIS.seq()
+              while True:
+                  new = ULS_DIS.changed_since(seq)
+                  seq = ULS_DIS.seq()
+                  v, y = wall.update(ULS_DIS.get(), ticks_us(), new, wrap(IMU_YAW.get() - wall_yaw))
+                  wR, wL = DC_speed_cal(y, v)
+                  sleep_ms(1)
+          @endcode
+        """
+
+        ## Distance to keep from the wall
+        self.DISTANCE = distance
+
+        ## Yaw rate per cm of distance error
+        self.KP = kp
+
+        ## Yaw rate per cm/s of range rate
+        self.KD = kd
+
+        ## Linear speed along the wall
+        self.V = v
+
+        ## Largest yaw rate
+        self.Y_MAX = y_max
+
+        ## Largest distance error used
+        self.MAX_ERROR = max_error
+
+        self.reset()
+
+    def reset(self):
+        """!
+        Forget the last reading, so the range rate starts again from the next new reading.
+        """
+
+        ## Distance error of the latest update
+        self.error = 0
+
+        ## Range rate of the latest new reading
+        self.rate = 0
+
+        self.last = None
+        self.t = 0
+
+    def update(self, distance, t, new, angle=0):
+        """!
+        Work out the linear speed and yaw rate that keep ROMI at DISTANCE from the wall.
+
+        @param distance (float): Ultrasonic distance [cm] to the wall on the right.
+        @param t (int): Time stamp [us] from ticks_us().
+        @param new (bool): True if distance is a new reading since the last update, the range rate is only updated on new readings.
+        @param angle (float): Heading [rad] of ROMI relative to the wall, the slant range is turned into the square distance with it.
+
+        @return v (float): linear speed [m/s].
+        @return y (float): yaw rate [rad/s].
+        """
+        # Past the corner of the obstacle the angle to the old wall keeps growing, do not trust it that far
+        if angle > pi/4:
+            angle = pi/4
+        elif angle < -pi/4:
+            angle = -pi/4
+        distance *= cos(angle)
+        if new:
+            if self.last is not None:
+                dt = ticks_diff(t, self.t)
+                if dt > 0:
+                    self.rate = (distance - self.last) * 1000000 / dt
+            self.last = distance
+            self.t = t
+
+        error = distance - self.DISTANCE
+        if error > self.MAX_ERROR:
+            error = self.MAX_ERROR
+        elif error < -self.MAX_ERROR:
+            error = -self.MAX_ERROR
+        self.error = error
+
+        y = -(self.KP*error + self.KD*self.rate)
+        if y > self.Y_MAX:
+            y = self.Y_MAX
+        elif y < -self.Y_MAX:
+            y = -self.Y_MAX
+        return self.V, y
+
+
+class SpeedGovernor:
+    """!
+    A class that cap the linear speed from the distance to an obstacle ahead and how fast it is closing in.
+    """
+    """
+    Every new ultrasonic reading goes into a short history, and the closing rate [cm/s] is the drop of the
+    distance from the oldest to the newest reading over their time. limit() then caps the speed twice:
+
+        1. Range      v <= sqrt(2 * A_BRAKE * (distance - STOP)), the fastest speed that can still brake
+                      to a stop at STOP [cm] with A_BRAKE [m/s^2], so far away the cap does nothing.
+        2. Closing    If the time to collision (distance - STOP) / closing rate is under TTC [s], the speed
+                      is scaled down by time to collision / TTC.
+
+    The cap never goes under V_MIN, so ROMI still creeps up to STOP, where the obstacle maneuver takes over.
+
+    Attributes:
+        STOP (float): Distance [cm] the obstacle maneuver starts at.
+        distance (float): Newest distance [cm].
+        closing (float): Closing rate [cm/s], positive when the obstacle gets closer.
+        ttc (float): Time to collision [s] of the latest limit(), or None if the obstacle is not closing in.
+        limited (int): Number of limit() calls that lowered the speed.
+
+    Methods:
+        __init__(self, stop, a_brake, ttc, v_min, window): Initializes the SpeedGovernor instance.
+        reset(self): Forget the distance history.
+        update(self, distance, t, new): Add a new ultrasonic reading to the history.
+        limit(self, v): Cap a linear speed.
+    """
+
+    def __init__(self, stop=15, a_brake=0.3, ttc=0.8, v_min=0.08, window=4):
+        """!
+        Initializes the SpeedGovernor instance.
+
+        @param stop (float): Distance [cm] the obstacle maneuver starts at.
+        @param a_brake (float): Slow down [m/s^2] the range cap is worked out with.
+        @param ttc (float): Time to collision [s] under which the speed is scaled down.
+        @param v_min (float): Lowest cap [m/s].
+        @param window (int): Number of readings the closing rate is worked out over.
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to slow down ROMI ahead of an obstacle'''
+
+              governor = SpeedGovernor()
+              seq = ULS_DIS.seq()
+              while True:
+                  new = ULS_DIS.changed_since(seq)
+                  seq = ULS_DIS.seq()
+                  governor.update(ULS_DIS.get(), ticks_us(), new)
+                  v = governor.limit(0.3)
+                  sleep_ms(1)
+          @endcode
+        """
+
+        ## Distance the obstacle maneuver starts at
+        self.STOP = stop
+
+        ## Slow down the range cap is worked out with
+        self.A_BRAKE = a_brake
+
+        ## Time to collision under which the speed is scaled down
+        self.TTC = ttc
+
+        ## Lowest cap
+        self.V_MIN = v_min
+
+        # Ring buffer of the newest readings [cm] and their time stamps [us]
+        self.ds = array('f', [0] * window)
+        self.ts = array('L', [0] * window)
+
+        ## Number of limit() calls that lowered the speed
+        self.limited = 0
+
+        self.reset()
+
+    def reset(self):
+        """!
+        Forget the distance history, the closing rate starts again from the next new readings.
+        """
+
+        ## Newest distance
+        self.distance = 0
+
+        ## Closing rate
+        self.closing = 0
+
+        ## Time to collision of the latest limit()
+        self.ttc = None
+
+        self.count = 0
+        self.next = 0
+
+    def update(self, distance, t, new):
+        """!
+        Add a new ultrasonic reading to the history and work out the closing rate.
+
+        @param distance (float): Ultrasonic distance [cm] ahead.
+        @param t (int): Time stamp [us] from ticks_us().
+        @param new (bool): True if distance is a new reading since the last update.
+        """
+        self.distance = distance
+        if not new:
+            return
+        size = len(self.ds)
+        i = self.next
+        self.ds[i] = distance
+        self.ts[i] = t
+        self.next = i + 1 if i + 1 < size else 0
+        if self.count < size:
+            self.count += 1
+        if self.count > 1:
+            oldest = self.next if self.count == size else 0
+            dt = ticks_diff(t, self.ts[oldest])
+            if dt > 0:
+                self.closing = (self.ds[oldest] - distance) * 1000000 / dt
+
+    def limit(self, v):
+        """!
+        Cap a linear speed from the newest distance and the closing rate.
+
+        @param v (float): Linear speed [m/s] asked for.
+
+        @return (float): linear speed [m/s] to drive.
+        """
+        gap = self.distance - self.STOP
+        cap = sqrt(2 * self.A_BRAKE * gap / 100) if gap > 0 else 0
+        self.ttc = None
+        if self.closing > 0 and gap > 0:
+            self.ttc = gap / self.closing
+            if self.ttc < self.TTC:
+                cap = min(cap, v * self.ttc / self.TTC)
+        if cap < self.V_MIN:
+            cap = self.V_MIN
+        if v > cap:
+            self.limited += 1
+            return cap
+        return v
@@ -0,0 +1,187 @@
+"""!
+@file odometry.py
+This file contains a class that keep track of ROMI global pose from both wheel encoders and the IMU heading.
+
+@author agent
+@date   2026-Oct-19
+"""
+
+from math import cos, sin, pi
+from array import array
+
+class Odometry:
+    """!
+    A dead-reckoning engine that integrates ROMI pose once per tick from both encoders' deltas and the IMU heading.
+    """
+    """
+    Attributes:
+        POSE (record share): Optional record share that the pose (x, y, yaw, distance, t) is published to after every update.
+        x (float): X global coordinate [m].
+        y (float): Y global coordinate [m].
+        heading (float): Heading [rad] from the IMU used for the latest update.
+        distance (float): Total traveled distance [m], forward or backward.
+        step (float): Traveled distance [m] during the latest update.
+        t (int): Time stamp [us] of the latest update.
+        M_PER_TICK (float): Wheel travel [m] for one encoder count.
+        hist_x, hist_y, hist_h, hist_d (array): Ring buffer of pose history (x, y, heading, distance).
+        hist_count (int): Number of valid entries in the pose history.
+        SPACING (float): Traveled distance [m] between two pose history entries.
+
+    Methods:
+        __init__(self, POSE, history, spacing): Initializes the Odometry instance.
+        reset(self, heading): Reset the pose to the origin and clear the history.
+        update(self, dL, dR, heading, t): Integrate one tick of encoder counts with midpoint heading.
+        history_index(self, i): Return the array index of the i-th oldest pose history entry.
+    """
+
+    def __init__(self, POSE=None, history=200, spacing=0.02):
+        """!
+        Initializes the Odometry instance.
+
+        @param POSE (record share): Record share with fields (x, y, yaw, distance, t) to publish the pose, or None.
+        @param history (int): Number of pose history entries to keep.
+        @param spacing (float): Traveled distance [m] between two pose history entries.
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to track ROMI pose from both encoders and the IMU yaw every tick'''
+
+              odo = Odometry()
+
+              # Once per tick, after updating both encoders
+              enc_L.update()
+              enc_R.update()
+              odo.update(enc_L.get_delta(), enc_R.get_delta(), IMU_YAW.get(), ticks_us())
+              print(f"X: {odo.x} [m] Y: {odo.y} [m] Distance: {odo.distance} [m]")
+          @endcode
+        """
+
+        ## Record share that the pose is published to
+        self.POSE = POSE
+
+        ## Wheel travel for one encoder count, 70 [mm] wheel and 1440 counts per revolution
+        self.M_PER_TICK = (pi*0.070)/1440
+
+        ## Half wheel travel for one encoder count, used to average both wheels
+        self.HALF_M_PER_TICK = self.M_PER_TICK/2
+
+        ## Traveled distance [m] between two pose history entries
+        self.SPACING = spacing
+
+        ## X coordinate history
+        self.hist_x = array('f', [0] * history)
+
+        ## Y coordinate history
+        self.hist_y = array('f', [0] * history)
+
+        ## Heading history
+        self.hist_h = array('f', [0] * history)
+
+        ## Traveled distance history
+        self.hist_d = array('f', [0] * history)
+
+        self.reset()
+
+    def reset(self, heading=0):
+        """!
+        Reset the pose to the origin and clear the pose history.
+
+        @param heading (float): Heading [rad] to start from.
+        """
+
+        ## X-Coordinate
+        self.x = 0
+
+        ## Y-Coordinate
+        self.y = 0
+
+        ## Heading used for the latest update
+        self.heading = heading
+
+        ## Total traveled distance
+        self.distance = 0
+
+        ## Traveled distance during the latest update
+        self.step = 0
+
+        ## Time stamp of the latest update
+        self.t = 0
+
+        ## Number of valid pose history entries
+        self.hist_count = 0
+
+        ## Index of the next pose history entry to write
+        self.hist_next = 0
+
+        ## cos() of the midpoint heading, reused while the heading does not change
+        self.cos_mid = cos(heading)
+
+        ## sin() of the midpoint heading, reused while the heading does not change
+        self.sin_mid = sin(heading)
+
+        self.last_mid = heading
+        self.last_hist_d = -self.SPACING
+
+    def update(self, dL, dR, heading, t):
+        """!
+        Integrate one tick of motion. The heading halfway between the last and this update is used for the
+        direction of travel, which is more accurate on curves than using either end.
+
+        @param dL (int): Left encoder counts since the last update.
+        @param dR (int): Right encoder counts since the last update.
+        @param heading (float): IMU heading [rad] now.
+        @param t (int): Time stamp [us] of this update.
+        """
+        dD = (dL + dR) * self.HALF_M_PER_TICK
+        dh = heading - self.heading
+        if dh > pi:
+            dh -= 2*pi
+        elif dh < -pi:
+            dh += 2*pi
+        mid = self.heading + dh/2
+        self.heading = heading
+        self.t = t
+
+        if dD != 0:
+            if mid != self.last_mid:
+                self.cos_mid = cos(mid)
+                self.sin_mid = sin(mid)
+                self.last_mid = mid
+            self.x += dD * self.cos_mid
+            self.y += dD * self.sin_mid
+            self.step = abs(dD)
+            self.distance += self.step
+
+            if self.distance - self.last_hist_d >= self.SPACING:
+                self.last_hist_d = self.distance
+                i = self.hist_next
+                self.hist_x[i] = self.x
+                self.hist_y[i] = self.y
+                self.hist_h[i] = heading
+                self.hist_d[i] = self.distance
+                i += 1
+                if i >= len(self.hist_x):
+                    i = 0
+                self.hist_next = i
+                if self.hist_count < len(self.hist_x):
+                    self.hist_count += 1
+        else:
+            self.step = 0
+
+        if self.POSE is not None:
+            self.POSE.put(self.x, self.y, heading, self.distance, t)
+
+    def history_index(self, i):
+        """!
+        Find where the i-th oldest pose history entry is in the hist_ arrays.
+
+        @param i (int): 0 for the oldest entry up to hist_count - 1 for the newest.
+
+        @return (int): index into hist_x, hist_y, hist_h and hist_d.
+        """
+        i += self.hist_next - self.hist_count
+        if i < 0:
+            i += len(self.hist_x)
+        return i
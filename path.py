@@ -0,0 +1,269 @@
+"""!
+@file path.py
+This file contains a class that record the path ROMI drives so that it can drive it back.
+
+@author agent
+@date   2026-Oct-19
+"""
+
+from array import array
+
+
+class Breadcrumbs:
+    """!
+    A class that record ROMI path as a bounded list of vertices, simplified while it is recorded.
+    """
+    """
+    Poses are given as ROMI drives, at most one every SPACING [m]. The points since the last vertex are
+    kept in a small window, and as long as every one of them is within TOLERANCE [m] of the straight
+    line from the last vertex to the newest point, the segment just grows, and a full window drops every
+    other point. Once a point strays further, the point before the newest becomes a vertex. This is the
+    opening window form of Douglas-Peucker, so a straight leg of any length costs 2 vertices.
+
+    If the vertex arrays fill up, TOLERANCE is doubled and the vertices are thinned in place with it,
+    again and again until a slot is free, so the memory used never grows whatever the length of the run.
+
+    retrace() gives the vertices back in reverse order, from ROMI back to the start, optionally
+    simplified again with a looser tolerance as a shortcut of the path driven.
+
+    Attributes:
+        xs, ys (array): X and Y coordinate [m] of each vertex.
+        count (int): Number of vertices.
+        TOLERANCE (float): Furthest [m] a recorded point may be from the simplified path.
+        SPACING (float): Least distance [m] between two recorded points.
+        rx, ry (array): X and Y coordinate [m] of each waypoint from retrace().
+
+    Methods:
+        __init__(self, size, tolerance, spacing, window): Initializes the Breadcrumbs instance.
+        reset(self): Forget the path.
+        add(self, x, y): Record one pose.
+        retrace(self, shortcut): Work out the path back to the start in rx and ry.
+    """
+
+    def __init__(self, size=64, tolerance=0.02, spacing=0.01, window=16):
+        """!
+        Initializes the Breadcrumbs instance.
+
+        @param size (int): Most vertices kept.
+        @param tolerance (float): Furthest [m] a recorded point may be from the simplified path, doubled when the vertices fill up.
+        @param spacing (float): Least distance [m] between two recorded points.
+        @param window (int): Most points kept between two vertices.
+        """
+
+        """!
+        Example:
+          @code
+              '''! This code sample is used to record ROMI path and print the way back'''
+
+              crumbs = Breadcrumbs()
+
+              # Once per tick while going out
+              crumbs.add(odo.x, odo.y)
+
+              # Once, at the far end
+              for i in range(crumbs.retrace()):
+                  print(f"Waypoint {i}: ({crumbs.rx[i]}, {crumbs.ry[i]}) [m]")
+          @endcode
+        """
+
+        ## X coordinate of each vertex
+        self.xs = array('f', [0] * size)
+
+        ## Y coordinate of each vertex
+        self.ys = array('f', [0] * size)
+
+        ## X coordinate of each waypoint from retrace(), one more than the vertices for the floating end
+        self.rx = array('f', [0] * (size + 1))
+
+        ## Y coordinate of each waypoint from retrace()
+        self.ry = array('f', [0] * (size + 1))
+
+        ## Tolerance given to the constructor, TOLERANCE goes back to it on reset()
+        self.TOLERANCE0 = tolerance
+
+        ## Least distance between two recorded points
+        self.SPACING = spacing
+
+        # Points since the last vertex
+        self.wx = array('f', [0] * window)
+        self.wy = array('f', [0] * window)
+
+        self.reset()
+
+    def reset(self):
+        """!
+        Forget the path, the next pose given to add() is the start.
+        """
+
+        ## Number of vertices
+        self.count = 0
+
+        ## Furthest a recorded point may be from the simplified path
+        self.TOLERANCE = self.TOLERANCE0
+
+        # Number of points since the last vertex
+        self.wn = 0
+
+    def add(self, x, y):
+        """!
+        Record one pose. Poses closer than SPACING to the last recorded point are ignored, so it is cheap
+        to call every tick.
+
+        @param x (float): X global coordinate [m].
+        @param y (float): Y global coordinate [m].
+        """
+        if self.count == 0:
+            self._vertex(x, y)
+            return
+
+        wn = self.wn
+        if wn:
+            lx = self.wx[wn - 1]
+            ly = self.wy[wn - 1]
+        else:
+            lx = self.xs[self.count - 1]
+            ly = self.ys[self.count - 1]
+        if (x - lx)**2 + (y - ly)**2 < self.SPACING**2:
+            return
+
+        if self._fits(x, y):
+            if wn >= len(self.wx):
+                # Window full on a long segment, keep every other point so it can keep growing
+                wn = self._halve()
+            self.wx[wn] = x
+            self.wy[wn] = y
+            self.wn = wn + 1
+        else:
+            self._vertex(lx, ly)
+            self.wx[0] = x
+            self.wy[0] = y
+            self.wn = 1
+
+    def _fits(self, x, y):
+        """!
+        Check if every point in the window is within TOLERANCE of the line from the last vertex to (x, y).
+        """
+        ax = self.xs[self.count - 1]
+        ay = self.ys[self.count - 1]
+        wx = self.wx
+        wy = self.wy
+        for i in range(self.wn):
+            if off_line(wx[i], wy[i], ax, ay, x, y, self.TOLERANCE):
+                return False
+        return True
+
+    def _halve(self):
+        """!
+        Drop every other point in the window, keeping the newest.
+
+        @return (int): number of points left in the window.
+        """
+        wx = self.wx
+        wy = self.wy
+        kept = (self.wn + 1) // 2
+        start = self.wn - 1 - 2*(kept - 1)
+        for j in range(kept):
+            wx[j] = wx[start + 2*j]
+            wy[j] = wy[start + 2*j]
+        self.wn = kept
+        return kept
+
+    def _vertex(self, x, y):
+        """!
+        Add a vertex, thinning the vertices first if they are full. A thin can keep every vertex, on a
+        curve that bends more than the doubled TOLERANCE everywhere, so it is repeated until one is dropped.
+        """
+        while self.count >= len(self.xs):
+            self._thin()
+        self.xs[self.count] = x
+        self.ys[self.count] = y
+        self.count += 1
+
+    def _thin(self):
+        """!
+        Double TOLERANCE and drop, in place, every vertex that is within it of the line between the
+        vertex kept before it and the vertex after it. The first and last vertices are always kept.
+        """
+        self.TOLERANCE *= 2
+        xs = self.xs
+        ys = self.ys
+        kept = 1
+        for i in range(1, self.count - 1):
+            if off_line(xs[i], ys[i], xs[kept - 1], ys[kept - 1], xs[i + 1], ys[i + 1], self.TOLERANCE):
+                xs[kept] = xs[i]
+                ys[kept] = ys[i]
+                kept += 1
+        xs[kept] = xs[self.count - 1]
+        ys[kept] = ys[self.count - 1]
+        self.count = kept + 1
+
+    def retrace(self, shortcut=0):
+        """!
+        Work out the path from the newest recorded point back to the start, in rx and ry.
+
+        @param shortcut (float): Tolerance [m] to simplify the path again with, the larger the more corners
+                                 are cut. 0 follows the recorded path.
+
+        @return (int): number of waypoints in rx and ry, waypoint 0 is where ROMI is and the last is the start.
+        """
+        n = 0
+        if self.wn:
+            self.rx[0] = self.wx[self.wn - 1]
+            self.ry[0] = self.wy[self.wn - 1]
+            n = 1
+        for i in range(self.count - 1, -1, -1):
+            self.rx[n] = self.xs[i]
+            self.ry[n] = self.ys[i]
+            n += 1
+
+        if shortcut > 0 and n > 2:
+            # Douglas-Peucker over the waypoints, run once at the far end so a few small lists are fine
+            keep = bytearray(n)
+            keep[0] = 1
+            keep[n - 1] = 1
+            stack = [(0, n - 1)]
+            while stack:
+                first, last = stack.pop()
+                worst = 0
+                worst_i = 0
+                for i in range(first + 1, last):
+                    d = line_dist2(self.rx[i], self.ry[i], self.rx[first], self.ry[first], self.rx[last], self.ry[last])
+                    if d > worst:
+                        worst = d
+                        worst_i = i
+                if worst > shortcut**2:
+                    keep[worst_i] = 1
+                    stack.append((first, worst_i))
+                    stack.append((worst_i, last))
+            kept = 0
+            for i in range(n):
+                if keep[i]:
+                    self.rx[kept] = self.rx[i]
+                    self.ry[kept] = self.ry[i]
+                    kept += 1
+            n = kept
+        return n
+
+
+def line_dist2(px, py, ax, ay, bx, by):
+    """!
+    Squared distance from point P to the line through A and B, or to A if A and B are the same point.
+
+    @return (float): squared distance [m^2].
+    """
+    dx = bx - ax
+    dy = by - ay
+    L2 = dx*dx + dy*dy
+    if L2 == 0:
+        return (px - ax)**2 + (py - ay)**2
+    cross = dx*(py - ay) - dy*(px - ax)
+    return cross*cross / L2
+
+
+def off_line(px, py, ax, ay, bx, by, tolerance):
+    """!
+    Check if point P is further than tolerance from the line through A and B.
+
+    @return (bool): True if P is off the line.
+    """
+    return line_dist2(px, py, ax, ay, bx, by) > tolerance*tolerance
@@ -10,6 +10,7 @@ from pyb import I2C
 from imu import BNO055Driver
 from time import sleep_ms
 from math import radians
+from fsm import FSM
 
 class IMUTask:
     """!
@@ -27,10 +28,13 @@ class IMUTask:
         S0_INIT (int): State value representing initialization state.
         S1_READ (int): State value representing reading yaw state.
         init_yaw (float): Initial yaw reading for calibration.
+        fsm (FSM): State machine with a handler for each state.
 
     Methods:
         __init__(self, IMU_YAW): Initializes the IMUTask instance.
         run(self): Runs the IMU task in a loop, handling initialization and reading of IMU data.
+        init(self): State 0 handler, init the IMU and its calibration.
+        read(self): State 1 handler, read the corrected yaw angle.
     """
 
     def __init__(self, IMU_YAW):
@@ -81,6 +85,12 @@ class IMUTask:
         
         ## Initial yaw angle when first turn on ROMI
         self.init_yaw = 0
+        
+        ## State machine with a handler for each state
+        self.fsm = FSM('IMU_TASK', 2)
+        self.fsm.state(self.S0_INIT, 'INIT', self.init)
+        self.fsm.state(self.S1_READ, 'READ', self.read)
+        self.fsm.start(self.S0_INIT)
 
     def run(self):
         
@@ -95,18 +105,28 @@ class IMUTask:
         """
         
         while True:
-            if self.state == self.S0_INIT:
-                i2c = I2C(1, I2C.CONTROLLER)
-                bno = BNO055Driver(i2c)
-                bno.set_mode('CONFIG')
-                sleep_ms(10)
-                bno.set_mode('NDOF')
-                coeff = bno.update_cal_coeffs()
-                self.init_yaw = bno.read_eulers()
-                self.state = self.S1_READ
-            elif self.state == self.S1_READ:
-                self.IMU_YAW.put(radians(bno.update_yaw(bno.read_eulers() - self.init_yaw)))
-                self.state = self.S1_READ
-            else:
-                print("IMU_TASK Invalid State!!!")
+            self.state = self.fsm.step()
             yield self.state
+
+    def init(self):
+        """!
+        State 0 handler: init the BNO055 driver, update the calibration coefficients and read the initial yaw angle.
+
+        @return (int): the next state, S1_READ.
+        """
+        i2c = I2C(1, I2C.CONTROLLER)
+        
+        ## BNO055 IMU driver
+        self.bno = BNO055Driver(i2c)
+        self.bno.set_mode('CONFIG')
+        sleep_ms(10)
+        self.bno.set_mode('NDOF')
+        coeff = self.bno.update_cal_coeffs()
+        self.init_yaw = self.bno.read_eulers()
+        return self.S1_READ
+
+    def read(self):
+        """!
+        State 1 handler: read the corrected yaw angle [rad] and update the IMU_YAW share.
+        """
+        self.IMU_YAW.put(radians(self.bno.update_yaw(self.bno.read_eulers() - self.init_yaw)))
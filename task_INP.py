@@ -0,0 +1,201 @@
+'''!
+@file                   task_INP.py
+@brief                  This file implement a task that debounce the blue button and the calibrate mode switch
+@author                 agent
+@date                   10/19/2026
+'''
+
+from pyb import Pin, ADC, ExtInt
+from utime import ticks_ms, ticks_diff
+from fsm import FSM
+import micropython
+
+class InputTask:
+    """!
+    A class for debouncing the user inputs in a state machine manner.
+    It publishes the calibrate mode and the blindfold toggle of the blue button to shares, once per change.
+    """
+
+    """
+    The blue button interrupt does no work itself, it only hands a callback to micropython.schedule(),
+    which time stamps the press outside of the interrupt. The task then accepts the press once the
+    button is still down DEBOUNCE_MS after it, and no sooner than LOCKOUT_MS after the last accepted
+    press, so a bouncing contact toggles the blindfold once.
+
+    The calibrate mode switch is sampled once per run of the task, at its low fixed period, and its
+    mode only changes after STABLE readings in a row agree.
+
+    Attributes:
+        CAL_MODE (share): A share that is 1 while the calibrate mode switch is held, 0 otherwise.
+        CLOSE (share): A share that the blue button toggles to open and close the blindfold.
+        state (int): The current state of the input task.
+        S0_INIT (int): State value representing initialization state.
+        S1_READ (int): State value representing read state.
+        fsm (FSM): State machine with a handler for each state.
+        presses (int): Number of accepted button presses.
+        bounces (int): Number of button interrupts that were not accepted as a press.
+
+    Methods:
+        __init__(self, CAL_MODE, CLOSE, debounce_ms, lockout_ms, stable): Initializes the InputTask instance.
+        run(self): Runs the input task in a loop, handling initialization and reading of the inputs.
+        init(self): State 0 handler, init the button interrupt and the calibrate mode switch.
+        read(self): State 1 handler, debounce the inputs and publish their changes.
+        button_isr(self, line): Interrupt of the blue button.
+        pressed(self, arg): Time stamp a button press, scheduled by the interrupt.
+    """
+
+    def __init__(self, CAL_MODE, CLOSE, debounce_ms=20, lockout_ms=200, stable=3):
+        """!
+        Initializes the InputTask instance.
+        @param CAL_MODE (share): A share for the calibrate mode, 1 while the switch is held.
+        @param CLOSE (share): A share for the blindfold, toggled by the blue button.
+        @param debounce_ms (int): Time [ms] the button must still be down after a press for it to count.
+        @param lockout_ms (int): Least time [ms] between two accepted presses.
+        @param stable (int): Number of calibrate mode switch readings in a row that must agree to change mode.
+
+        Example:
+          @code
+              '''! This code sample is used to print the calibrate mode and the blindfold every change'''
+
+              CAL_MODE = task_share.Share('b', name = "Calibrate Mode")
+              CLOSE    = task_share.Share('i', name = "Close Eye Servo")
+              inputs   = InputTask(CAL_MODE, CLOSE)
+              task     = inputs.run()
+              seq      = CAL_MODE.seq() + CLOSE.seq()
+              while True:
+                  next(task)
+                  if CAL_MODE.seq() + CLOSE.seq() != seq:
+                      seq = CAL_MODE.seq() + CLOSE.seq()
+                      print(f"Calibrate mode: {CAL_MODE.get()} Blindfold: {CLOSE.get()}")
+                  sleep_ms(20)
+
+          @endcode
+
+        """
+        ## Share that is 1 while the calibrate mode switch is held
+        self.CAL_MODE = CAL_MODE
+
+        ## Share that the blue button toggles to open and close the blindfold
+        self.CLOSE = CLOSE
+
+        ## Time the button must still be down after a press for it to count
+        self.DEBOUNCE_MS = debounce_ms
+
+        ## Least time between two accepted presses
+        self.LOCKOUT_MS = lockout_ms
+
+        ## Number of calibrate mode switch readings in a row that must agree to change mode
+        self.STABLE = stable
+
+        ## Number of accepted button presses
+        self.presses = 0
+
+        ## Number of button interrupts that were not accepted as a press
+        self.bounces = 0
+
+        # Scheduled press waiting to be debounced, its time stamp and the time stamp of the last accepted press
+        self.pending = False
+        self.press_ms = 0
+        self.accept_ms = 0
+
+        # Calibrate mode switch reading that disagrees with the mode, and how many times in a row
+        self.cal_mode = 0
+        self.cal_count = 0
+
+        # Bound method made once here, so the interrupt does not allocate one on every press
+        self.pressed_cb = self.pressed
+
+        ## This task state
+        self.state = 0
+
+        ## State 0: Init the button interrupt and the calibrate mode switch
+        self.S0_INIT = 0
+
+        ## State 1: continuously debounce the inputs
+        self.S1_READ = 1
+
+        ## State machine with a handler for each state
+        self.fsm = FSM('INP_TASK', 2)
+        self.fsm.state(self.S0_INIT, 'INIT', self.init)
+        self.fsm.state(self.S1_READ, 'READ', self.read)
+        self.fsm.start(self.S0_INIT)
+
+    def run(self):
+        """
+        Runs the input task in a loop. Manages the state of the task,
+        initializing the inputs and debouncing them.
+
+            STATE    NAME                             DESCRIPTIOM
+              0      INIT      This state init the blue button interrupt (PC13) and the calibrate mode switch ADC (PC3)
+              1      READ      This state accept a scheduled button press if the button is still down after DEBOUNCE_MS
+                               and toggle CLOSE, then read the calibrate mode switch once and update CAL_MODE
+                               after STABLE readings in a row agree
+
+        """
+        while True:
+            self.state = self.fsm.step()
+            yield self.state
+
+    def init(self):
+        """!
+        State 0 handler: init the blue button interrupt and the calibrate mode switch.
+
+        @return (int): the next state, S1_READ.
+        """
+        ## Blue button, low while pressed
+        self.button = Pin(Pin.cpu.C13, mode=Pin.IN)
+
+        ## Calibrate mode switch, reads under 10 while held
+        self.cal_adc = ADC(Pin(Pin.cpu.C3))
+
+        ## Blue button interrupt
+        self.button_int = ExtInt(Pin.cpu.C13, ExtInt.IRQ_FALLING, Pin.PULL_NONE, self.button_isr)
+        return self.S1_READ
+
+    def read(self):
+        """!
+        State 1 handler: debounce the blue button and the calibrate mode switch, and publish their changes.
+        """
+        now = ticks_ms()
+        if self.pending and ticks_diff(now, self.press_ms) >= self.DEBOUNCE_MS:
+            self.pending = False
+            if self.button.value() == 0 and (self.presses == 0 or ticks_diff(self.press_ms, self.accept_ms) >= self.LOCKOUT_MS):
+                self.accept_ms = self.press_ms
+                self.presses += 1
+                self.CLOSE.put(0 if self.CLOSE.get() == 1 else 1)
+            else:
+                self.bounces += 1
+
+        mode = 1 if self.cal_adc.read() < 10 else 0
+        if mode == self.cal_mode:
+            self.cal_count = 0
+        else:
+            self.cal_count += 1
+            if self.cal_count >= self.STABLE:
+                self.cal_mode = mode
+                self.cal_count = 0
+                self.CAL_MODE.put(mode)
+
+    def button_isr(self, line):
+        """!
+        Interrupt of the blue button. It only schedules pressed(), it does not allocate memory or touch any share.
+
+        @param line (int): The interrupt line.
+        """
+        try:
+            micropython.schedule(self.pressed_cb, 0)
+        except RuntimeError:
+            # Schedule queue full, a bounce of a press already queued
+            pass
+
+    def pressed(self, arg):
+        """!
+        Time stamp a button press, run by micropython.schedule() outside of the interrupt.
+
+        @param arg (int): Unused argument of micropython.schedule().
+        """
+        if self.pending:
+            self.bounces += 1
+        else:
+            self.pending = True
+            self.press_ms = ticks_ms()
@@ -6,11 +6,21 @@ This file implement a task that control ROMI motor base on input share from diff
 @author Quinn Stephens
 @date 2023-Dec-11 
 '''
-from pyb import Timer, Pin, ADC, ExtInt
+from pyb import Timer, Pin
 from encoder import Encoder
 from l6206 import L6206
 from closedLoopPID import PIDController as pid
-from math import cos, sin, pi, sqrt
+from odometry import Odometry
+from motion import PurePursuit, HeadingController, WallFollower, wrap
+from task_share import Share, StructQueue
+from path import Breadcrumbs
+from fsm import FSM
+from course import CourseProfile
+from latency import LatencyHistogram
+from line_sensor import LineEstimator, LineSensorArray, LineCalibration, LineConditioner, LineSearch, CH_L2, CH_L1, CH_M, CH_R1, CH_R2, CH_H, CAL_CHANNELS
+from math import pi
+from array import array
+from utime import ticks_us, ticks_diff
 
 class MotorTask:
     """!
@@ -35,6 +45,8 @@ class MotorTask:
             IMU_YAW (share): A share to get the yaw angle of the attached IMU from task_IMU.py
             ULS_DIS (share): A share to get the sensing distance from the ultrasonic sensor in task_ULS.py
             CLOSE   (share): A share to set blindfold condition from task_SER.py
+            POSE    (record share): A record share publishing ROMI's x, y, yaw, traveled distance and time stamp together to other tasks
+            CAL_MODE (share): A share that is 1 while the debounced calibrate mode switch is held, from task_INP.py
         
         States:
             state (int): The current state of this motor task.
@@ -47,22 +59,57 @@ class MotorTask:
             S3_WALL4 (int): ROMI turn left 90°, then set flag WALL = 1 and go back to S1_HUB
             S4_RETURNX (int): ROMI facing to X axis and run forward until reach X < 0.02 [m]
             S4_RETUNRY (int): ROMI facing to Y axis and run forward until reach Y < 0.02 [m]
+            S4_PURSUIT (int): ROMI follows the queued WAYPOINTS back to the starting point with the pure pursuit follower
             S5_HOME (int): ROMI get back to the HOME position and pivot to celebrate
+            S2_SEARCH (int): ROMI lost the line on a curve and searches for it on the side it was last seen
+            S3_FOLLOW (int): In BYPASS_FOLLOW mode, ROMI turns left 90° then follows the wall on its right until the line sensors pick up the line
         
         Others:
-            X (float): variable that continuosly store updated X coordinate of ROMI
-            Y (float): variable that continuosly store updated Y coordinate of ROMI
+            odo (Odometry): odometry engine that continuosly store updated X and Y coordinate, heading and traveled distance of ROMI
+            YAW (float): IMU yaw angle for this tick, read once from IMU_YAW
             EXP_DIST (float): traveled distance that ROMI can go in [explore mode] in S2_PATH state (for detecting TARGET and HOME position)
+            LINE_MODE (int): LINE_TABLE to follow the line with the discrete cases, LINE_PID to steer with the continuous line position
+            line (LineEstimator): weighted centroid line position estimator for LINE_PID mode
+            STEER_PID (PIDController): steering PID from line position to yaw rate for LINE_PID mode
+            cal (LineCalibration): per-channel line sensor calibration, swept while CAL_MODE is set
+            cond (LineConditioner): line sensor filter, hysteresis and case dwell ahead of the case decision
+            search (LineSearch): search for the line on the side it was last seen when it is lost on a curve, print(self.search) shows the time to find it
+            COURSE_MODE (int): COURSE_OFF, COURSE_LEARN to record the course on this run or COURSE_PLAY to drive the speed plan of a learned one
+            course (CourseProfile): course learned by traveled distance and its speed plan, on flash
+            governor (SpeedGovernor): speed cap from the obstacle distance and time to collision while following the line to the obstacle, None by default
+            profile (MotionProfiler): acceleration and jerk limited ramp of the speed and yaw rate sent to DC_speed_cal(), None by default
+            RETURN_MODE (int): RETURN_AXES, RETURN_PURSUIT or RETURN_RETRACE way back home
+            crumbs (Breadcrumbs): simplified path recorded on the way out for RETURN_RETRACE
+            WAYPOINTS (StructQueue): queue of (x, y) waypoints for the pure pursuit follower
+            pursuit (PurePursuit): pure pursuit waypoint follower for RETURN_PURSUIT and RETURN_RETRACE
+            fsm (FSM): state machine with a handler method for each state
+            LATENCY (bool): True to record how old each sensor sample is when the motor duty is set
+            lat_imu, lat_uls, lat_line, lat_enc (LatencyHistogram): age of the IMU yaw, ultrasonic distance, line sensor frame 
+                                                                    and encoder counts at set_duty(), latency.show_all() prints them
+            BYPASS_MODE (int): BYPASS_BOX or BYPASS_FOLLOW obstacle bypass
+            wall (WallFollower): PD wall follower on the ultrasonic distance for BYPASS_FOLLOW
+            heading (HeadingController): wrap-aware heading PD controller for the wall turns, return pivots and the straights after them
+            case (int): case the motors are driven with this tick, v_cmd and y_cmd are its speed and yaw rate for CASE_STEER
             WALL (int): Wall flag that turn to 1 if ROMI pass the wall obstacle
             TARGET (int): Target flag that turn to 1 if ROMI reach the target
             HOME (int): Home flag that turn to 1 if ROMI successfully return the home position 
             OLD_YAW (float): Variable that store the old angle before turning to avoid the wall
             WALL1_YAW (float): Variable that store the target angle to turn to avoid the first side of the wall
             WALL2_YAW (float): Variable that store the target angle to turn to avoid the second side of the wall
+            ULS_MAX_AGE, IMU_MAX_AGE (int): oldest ULS_DIS and IMU_YAW data [us] that ROMI is still allowed to drive on
 
     Methods:
-        __init__(self, ULS_DIS): Initializes the ULSTask instance.
+        __init__(self, SER_DIR, IMU_YAW, ULS_DIS, CLOSE, POSE, WAYPOINTS, CAL_MODE): Initializes the MotorTask instance.
         run(self): Runs the motor task in a loop, handling all sensors and actuators appropriately.
+        plan_return(self): queue the waypoints of the way back for RETURN_MODE and start the pure pursuit follower
+        init, hub, path, reacquire, wall1 - wall4, follow, returnx, returny, pursue, home (self): handler of each state, return the next state
+        steer(self, v, y): drive this tick with a speed and yaw rate of its own as CASE_STEER
+        turn_to(self, target, direction), start_follow(self), look_ahead(self, close, target): entry actions of the wall, 
+                                          wall follow and axis return states
+        cal_held(self): guard of leaving for the hub while calibrating
+        update_heading(self): refresh the yaw angle for this tick when IMU_YAW has changed
+        read_line(self), mask_line(self): read and filter the line sensors once in the ticks of the states that use them
+        sensors_fresh(self): check that both IMU_YAW and ULS_DIS were updated recently enough to drive on
         check_sensor(L2, L1, M, R1, R2, H): take the status of 6 line sensor then return the appropriate [case]
         update_speed(case): take the [case] variable then return the appropriate yaw rate speed [rad/s] and linear speed [m/s] 
         DC_speed_cal(y, v): take the yaw rate speed [rad/s] and linear speed [m/s] to process 
@@ -70,10 +117,16 @@ class MotorTask:
         check_return(X, Y, state): take the global location X and Y of ROMI as well as the current state, return the new state and HOME flag when X and Y < 0.02 [m] 
     """
     
-    def __init__(self,SER_DIR, IMU_YAW, ULS_DIS, CLOSE):
+    def __init__(self,SER_DIR, IMU_YAW, ULS_DIS, CLOSE, POSE=None, WAYPOINTS=None, CAL_MODE=None):
         ## Share that use to close or open the blindfold
         self.CLOSE     = CLOSE
         
+        ## Share that is 1 while the calibrate mode switch is held, never set without an input task
+        self.CAL_MODE  = CAL_MODE if CAL_MODE is not None else Share('b', name="Calibrate Mode")
+        
+        ## Record share that publish x [m], y [m] and yaw [rad] as one consistent snapshot
+        self.POSE      = POSE
+        
         ## Share that implement servo angle that connecto the ultrasonic sensor
         self.SER_DIR   = SER_DIR
         
@@ -83,14 +136,8 @@ class MotorTask:
         ## IMU yaw angle [rad] that is share with task_MOT
         self.IMU_YAW   = IMU_YAW
         
-        ## Simutaneous small linear distance to keep track of ROMI global coordinate locations
-        self.DIST_PATH = 0
-        
-        ## X-Coordinate
-        self.X         = 0
-        
-        ## Y-Coordinate
-        self.Y         = 0
+        ## Odometry engine that keep track of ROMI global coordinate locations and publish them to POSE
+        self.odo       = Odometry(POSE)
         
         ## Flag that is 1 if already pass the wall and 0 otherwise
         self.WALL      = 0
@@ -104,6 +151,101 @@ class MotorTask:
         ## Traveled distance that ROMI can go in [explore mode] S2_PATH only
         self.EXP_DIST = 0
         
+        ## Line following mode, LINE_TABLE for the discrete cases or LINE_PID for the continuous steering PID
+        self.LINE_MODE = LINE_TABLE
+        
+        ## Continuous line position estimator used in LINE_PID mode
+        self.line      = LineEstimator()
+        
+        ## Steering PID from line position [sensor pitch] to yaw rate [rad/s] used in LINE_PID mode
+        self.STEER_PID = pid(1.2, 0, 0.4)
+        
+        ## Line sensor calibration, loaded from flash at boot and redone while CAL_MODE is set
+        self.cal       = LineCalibration()
+        
+        ## Search for the line on the side it was last seen when it is lost on a curve
+        self.search    = LineSearch()
+        
+        ## Course learning mode, COURSE_OFF, COURSE_LEARN to record this run or COURSE_PLAY to use a learned course
+        self.COURSE_MODE = COURSE_OFF
+        
+        ## Course learned by traveled distance and its speed plan, loaded from flash at boot in COURSE_PLAY mode
+        self.course    = CourseProfile()
+        
+        ## Normalized line sensor readings for this tick, used in LINE_PID mode once calibrated
+        self.norm      = array('H', [0] * CAL_CHANNELS)
+        
+        ## True while a calibration sweep is going on
+        self.calibrating = False
+        
+        ## Line sensor filter, hysteresis and case dwell between the ADC frame and the case decision
+        self.cond      = LineConditioner(len(CASE_NAMES))
+        
+        ## True once the line sensors were read this tick, only the states that use them read them
+        self.line_read = False
+        
+        ## Longest gap [us] between two line sensor reads that the filter carries on over, it starts over after longer
+        self.LINE_GAP_US = 20000
+        
+        ## Acceleration and jerk limited ramp of the speed and yaw rate of each case, a MotionProfiler() to ramp them 
+        #  or None to step straight to them as before
+        self.profile   = None
+        
+        ## True to record how old each sensor sample is when the motor duty is set
+        self.LATENCY   = False
+        
+        ## Age of the IMU yaw when the motor duty is set, from the IMU_YAW time stamp
+        self.lat_imu   = LatencyHistogram('IMU_YAW -> duty')
+        
+        ## Age of the ultrasonic distance when the motor duty is set, from the ULS_DIS time stamp
+        self.lat_uls   = LatencyHistogram('ULS_DIS -> duty')
+        
+        ## Age of the line sensor frame when the motor duty is set, from the start of its ADC read
+        self.lat_line  = LatencyHistogram('Line ADC -> duty')
+        
+        ## Age of the encoder counts when the motor duty is set
+        self.lat_enc   = LatencyHistogram('Encoders -> duty')
+        
+        ## Speed cap from the ultrasonic distance and closing rate ahead of the obstacle, a SpeedGovernor() to brake ahead of it 
+        #  or None to follow the line at the case speeds as before
+        self.governor  = None
+        
+        ## Return home mode, RETURN_AXES for the X then Y legs, RETURN_PURSUIT straight home or RETURN_RETRACE along the recorded path
+        self.RETURN_MODE = RETURN_AXES
+        
+        ## Simplified path recorded on the way out, for RETURN_RETRACE
+        self.crumbs    = Breadcrumbs()
+        
+        ## Tolerance [m] that the recorded path is simplified again with on the way back, 0 to follow it as driven
+        self.SHORTCUT  = 0
+        
+        ## Queue of (x, y) waypoints [m] for the pure pursuit follower, one more than the breadcrumb waypoints
+        self.WAYPOINTS = WAYPOINTS if WAYPOINTS is not None else StructQueue('ff', len(self.crumbs.rx) + 1, name="Waypoints")
+        
+        ## Pure pursuit follower that drive ROMI through WAYPOINTS on the way back
+        self.pursuit   = PurePursuit(self.WAYPOINTS)
+        
+        ## Wrap-aware heading controller for the wall turns and return pivots, and to hold the heading on the straights after them
+        self.heading   = HeadingController()
+        
+        ## Obstacle bypass mode, BYPASS_BOX for the four leg box maneuver or BYPASS_FOLLOW to follow the wall around
+        self.BYPASS_MODE = BYPASS_BOX
+        
+        ## PD wall follower on the ultrasonic distance for BYPASS_FOLLOW
+        self.wall      = WallFollower()
+        
+        ## Least distance [m] to follow the wall before the line sensors may end the bypass
+        self.FOLLOW_MIN = 0.15
+        
+        ## True once the first turn of BYPASS_FOLLOW has settled and ROMI follows the wall
+        self.following = False
+        
+        ## Traveled distance [m] when ROMI started following the wall
+        self.follow_from = 0
+        
+        ## Sequence number of the last ULS_DIS value given to the wall follower or the speed governor
+        self.ULS_SEQ   = 0
+        
         ## The target angle to turn to avoid the first side of the wall
         self.WALL1_YAW = 0
         
@@ -113,6 +255,18 @@ class MotorTask:
         ## The old angle before turning to avoid the wall
         self.OLD_YAW   = 0 
         
+        ## Sequence number of the last IMU_YAW value read into YAW
+        self.YAW_SEQ   = 0
+        
+        ## IMU yaw angle [rad] for this tick, only read from IMU_YAW when it has a new value
+        self.YAW       = 0
+        
+        ## Oldest ultrasonic distance [us] that is still trusted for wall detection
+        self.ULS_MAX_AGE = 100000
+        
+        ## Oldest IMU yaw angle [us] that is still trusted for steering and odometry
+        self.IMU_MAX_AGE = 50000
+        
         ## The current state of this motor task.
         self.state     = 0
         
@@ -143,9 +297,47 @@ class MotorTask:
         ## ROMI facing to Y axis and run forward until reach Y < 0.02 [m]
         self.S4_RETURNY= 8
         
+        ## ROMI drives through WAYPOINTS back to the starting point
+        self.S4_PURSUIT= 10
+        
         ## ROMI get back to the HOME position and pivot to celebrate
         self.S5_HOME   = 9 
         
+        ## ROMI turns left 90° then follows the wall on its right until the line sensors pick up the line
+        self.S3_FOLLOW = 11
+        
+        ## ROMI lost the line on a curve and sweeps towards the side it was last seen to find it again
+        self.S2_SEARCH = 12
+        
+        ## Case that the motors are driven with this tick
+        self.case      = CASE_STOP
+        
+        ## Linear speed [m/s] and yaw rate [rad/s] when case is CASE_STEER
+        self.v_cmd     = 0
+        self.y_cmd     = 0
+        
+        ## False for the ticks that keep the last motor duty
+        self.drive     = True
+        
+        ## State machine with a handler for each state, the states after INIT leave for the hub while calibrating
+        self.fsm       = FSM('MOT_TASK', 13)
+        self.fsm.state(self.S0_INIT,    'INIT',    self.init)
+        self.fsm.state(self.S1_HUB,     'HUB',     self.hub)
+        self.fsm.state(self.S2_PATH,    'PATH',    self.path,    entry=lambda: self.SER_DIR.put(0))
+        self.fsm.state(self.S3_WALL1,   'WALL1',   self.wall1,   entry=lambda: self.turn_to(self.WALL1_YAW, 1))
+        self.fsm.state(self.S3_WALL2,   'WALL2',   self.wall2,   entry=lambda: self.turn_to(self.OLD_YAW, 1))
+        self.fsm.state(self.S3_WALL3,   'WALL3',   self.wall3,   entry=lambda: self.turn_to(self.WALL2_YAW, 1))
+        self.fsm.state(self.S3_WALL4,   'WALL4',   self.wall4,   entry=lambda: self.turn_to(self.OLD_YAW, -1))
+        self.fsm.state(self.S3_FOLLOW,  'FOLLOW',  self.follow,  entry=self.start_follow)
+        self.fsm.state(self.S2_SEARCH,  'SEARCH',  self.reacquire, entry=lambda: self.search.start(self.YAW))
+        self.fsm.state(self.S4_RETURNX, 'RETURNX', self.returnx, entry=lambda: self.look_ahead(0, pi))
+        self.fsm.state(self.S4_RETURNY, 'RETURNY', self.returny, entry=lambda: self.look_ahead(1, pi/2))
+        self.fsm.state(self.S4_PURSUIT, 'PURSUIT', self.pursue,  entry=lambda: self.SER_DIR.put(0))
+        self.fsm.state(self.S5_HOME,    'HOME',    self.home,    entry=lambda: self.CLOSE.put(1))
+        for state in (self.S2_SEARCH, self.S3_WALL1, self.S3_WALL2, self.S3_WALL3, self.S3_WALL4, self.S3_FOLLOW, self.S4_RETURNX, self.S4_RETURNY, self.S4_PURSUIT):
+            self.fsm.guard(state, self.cal_held, self.S1_HUB)
+        self.fsm.start(self.S0_INIT)
+        
     def run(self):
         """
         Run and manage ROMI's DC motor to run it through the course using the data from sensors to control the actuators
@@ -155,371 +347,742 @@ class MotorTask:
               
               1      HUB       This state act as a hub to decide which state to go base on condtion
                                The logic for this task is descibe as following:
-                                  - if [in the calibration mode] stop and set all flags to 0
+                                  - if [in the calibration mode] stop, set all flags to 0 and sweep the line sensors min/max
+                                  - when [calibration mode released] save the per-channel thresholds to flash if the sweep was good,
+                                    and reset the pose, traveled distance and breadcrumbs since ROMI was moved by hand
                                   - else if [HOME == 1 and TARGET == 1], state = S5_HOME
                                   - else if [no obstacle ditected and TARGET == 0], state = S2_PATH
-                                  - else if [obstacle dictected and TARGET == 0 and WALL == 0], state = S3_WALL1
+                                  - else if [obstacle dictected and TARGET == 0 and WALL == 0], state = S3_WALL1 (BYPASS_BOX)
+                                                                                                or S3_FOLLOW (BYPASS_FOLLOW)
                                   - else if [TARGET == 1 and HOME == 0]: run check_return --> state = S4_RETURNX if X < 0.02 [m]
                                                                                               state = S4_RETURNY if Y < 0.02 [m]
               2      PATH      This state control ROMI to follow the line with condition from the line sensor
                                The logic for this task is descibe as following:
                                    - read the line sensors status
+                                   - if the line was just lost while it was off center, state = S2_SEARCH
                                    - check the sensors status for [case] --> check_sensor()
-                                       if [case == "explore"] and EXP_DIST > 0.15, case = "stop"
+                                       if [case == CASE_EXPLORE] and EXP_DIST > 0.15, case = CASE_STOP
+                                   - in LINE_PID mode, if [case] is a turn or straight and the line is seen, the yaw rate comes from 
+                                     STEER_PID on the weighted centroid line position and the speed slow down as the line goes off center
+                                   - in COURSE_LEARN mode, record the heading and [case] by traveled distance, saved to flash at the target
+                                   - in COURSE_PLAY mode, on the straight and soft turn cases the speed comes from the learned course 
+                                     speed plan, so ROMI slows down ahead of the known curves and speeds up on the known straights
+                                   - if governor is set, until the obstacle is passed cap the speed with it from the ultrasonic distance and 
+                                     time to collision, so ROMI brakes smoothly down to the 15 [cm] where the wall maneuver starts
                                    - use [case] for finding the yaw rate and linear speed -->  update_speed()
                                    - use the yaw rate and linear speed to calculate both wheels angular speed --> DC_speed_cal()
                                    - update speed for ROMI's 2 DC motor and return S1_HUB 
                                    
+              2s     SEARCH     ROMI lost the line on a curve: pivot towards the side the line was last seen, then swing in 
+                               widening arcs until the line is seen again (back to S1_HUB) or the search gives up and PATH 
+                               explores for the end of the line. A line lost while centered is the end of the line, not a search.
+                               print(self.search) shows how many searches found the line and how long they took.
               3a     WALL1      This state turn ROMI left for 90° and turn the first servo right 90° then go straight until not see the wall
               3b     WALL2      This state turn ROMI right for 90° and keep the first servo the same angle then go straight until not seeing the wall
               3c     WALL3      This state turn ROMI right for 90° then go straigh until pickup line sensor signal
               3d     WALL4      This state tune ROMI left for 90° then set flag WALL = 1 and go back to S1_HUB
-              4x     RETURNX    This state turn ROMI to 180° from the original angle from stating point then:
+                               Each turn is done by the HeadingController on the shortest angle to the target heading, 
+                               the state moves on once the turn has settled and the straight after it holds that heading
+              3f     FOLLOW     In BYPASS_FOLLOW mode, instead of WALL1 to WALL3, ROMI turns left 90° with the servo to the right, 
+                               then follows the wall at WallFollower.DISTANCE with a PD law on the distance and range rate,
+                               until after FOLLOW_MIN [m] the line sensors pick up the line, then WALL4 turns it back onto the line.
+                               The FSM time spent in FOLLOW against WALL1 to WALL3 compares both bypass modes.
+              4x     RETURNX    This state turn ROMI to 180° from the original angle from stating point (HeadingController) then:
                                    - if [HOME == 0 and abs(X) < 0.02] 
                                        if X > 0 then go forward and X < 0 backup
-              4y     RETURNY    This state turn ROMI to 90° from the original angle from stating point then:
+              4y     RETURNY    This state turn ROMI to 90° from the original angle from stating point (HeadingController) then:
                                    - if [HOME == 0 and abs(Y) < 0.02] 
                                        if Y > 0 then go forward and Y < 0 backup
+              4p     PURSUIT    In RETURN_PURSUIT or RETURN_RETRACE mode, instead of RETURNX and RETURNY, ROMI follows the 
+                               WAYPOINTS queued by plan_return() with the pure pursuit follower, the speed and yaw rate from 
+                               PurePursuit.update() go to DC_speed_cal()
+                                   - RETURN_PURSUIT: one smooth diagonal path straight to the origin
+                                   - RETURN_RETRACE: back through the breadcrumb path recorded on the way out (simplified again by SHORTCUT)
+                                   - once the last waypoint is reached, set HOME = 1
               5      HOME       ROMI at home position, pivoting and put the "money mask" [2nd servo] on
+              
+            Every tick after INIT, whatever the state, both encoders and wheel speeds are updated once and the 
+            odometry engine integrates the pose from both encoders' deltas and the yaw angle. Only the states that use the 
+            line (HUB while calibrating, PATH, SEARCH, WALL3 and FOLLOW) sample one frame of all line sensor channels 
+            together and filter it, with read_line(). Then the states that pick a [case] drive both motors 
+            through the PID controllers, ramped by the MotionProfiler when profile is set so no case asks for a step change. S2_PATH decides 
+            its case from the filtered readings with hysteresis and keeps each case for a minimum dwell time, see LineConditioner.
+            
+            Each state is a handler method registered in fsm, so dispatch is a list index. The servo direction and 
+            blindfold of each state are set by its entry action, and the wall, return and pursuit states have a guarded 
+            transition back to the hub while CAL_MODE is set. print(self.fsm) shows the ticks, entries 
+            and time spent in each state and self.fsm.dump_log() the latest transitions.
+            
+            When LATENCY is set, every time the duty is set the age of the IMU yaw and ultrasonic distance (from their 
+            share time stamps), of the line sensor frame (from the start of its ADC read) and of the encoder counts is 
+            recorded in a histogram per path, latency.show_all() prints them from the REPL.
         """
         
+        fsm = self.fsm
         while True: 
-            if self.state == self.S0_INIT:  
-                button_int = ExtInt(Pin.cpu.C13, ExtInt.IRQ_FALLING, Pin.PULL_NONE, lambda p: self.CLOSE.put(0 if self.CLOSE.get() == 1 else 1))    
-                tim_R = Timer(4, freq=20000)
-                tim_L = Timer(4, freq=20000)
-                mot_R = L6206(tim_R, 2, Pin.cpu.A2, Pin.cpu.A10, Pin.cpu.B7)
-                mot_L = L6206(tim_L, 1, Pin.cpu.B3, Pin.cpu.B10, Pin.cpu.B6)
-                mot_R.enable()
-                mot_L.enable()
-                tim_Re = Timer(1, period=5000, prescaler=0)
-                tim_Le = Timer(2, period=5000, prescaler=0)
-                enc_L = Encoder (tim_Le, 1, 2, Pin.cpu.A0, Pin.cpu.A1)
-                enc_R = Encoder (tim_Re, 1, 2, Pin.cpu.A8, Pin.cpu.A9)
-                PID_R = pid(3, 0.5, 0.5)
-                PID_L = pid(3, 0.5, 0.5)
-                
-                PC0 = Pin(Pin.cpu.C0)
-                PC1 = Pin(Pin.cpu.C1)
-                PA5 = Pin(Pin.cpu.A5)
-                PA6 = Pin(Pin.cpu.A6)
-                PA7 = Pin(Pin.cpu.A7)
-                PC3 = Pin(Pin.cpu.C3)
-                PA4 = Pin(Pin.cpu.A4)
-
-                line_L1 = ADC(PA7)
-                line_R1 = ADC(PA5)
-                line_L2 = ADC(PC0)
-                line_R2 = ADC(PC1)
-                line_M  = ADC(PA6)
-                line_H  = ADC(PA4)
-                
-                cal_mode= ADC(PC3)
-
-  
-                
-                self.state = self.S1_HUB
-                
-            elif self.state == self.S1_HUB:
-                
-                if cal_mode.read()  < 10:
-                    case = "stop"
-                    wL, wR = update_speed(case)
-                    enc_R.update()
-                    wR_meas = enc_R.get_rad_s()
-                    pid_out_R = PID_R.update(wR,wR_meas)
-                    mot_R.set_duty(pid_out_R)
-                    enc_L.update()
-                    wL_meas = enc_L.get_rad_s()
-                    pid_out_L = PID_L.update(wL,wL_meas)
-                    mot_L.set_duty(pid_out_L)
-                    self.TARGET = 0
-                    self.HOME = 0 
-                    self.WALL = 0
-                    self.SER_DIR.put(0)
-                    self.state = self.S1_HUB
-                    
-                elif self.HOME == 1 and self.TARGET == 1:
-                    self.state = self.S5_HOME
-                    
+            if fsm.current == self.S0_INIT:
+                self.state = fsm.step()
+                yield self.state
+                continue
+            
+            # Once per tick for every state: both encoders, both wheel speeds, the heading and the pose
+            t_enc = ticks_us()
+            self.enc_R.update()
+            self.enc_L.update()
+            wR_meas = self.enc_R.get_rad_s()
+            wL_meas = self.enc_L.get_rad_s()
+            self.update_heading()
+            self.odo.update(self.enc_L.get_delta(), self.enc_R.get_delta(), self.YAW, ticks_us())
+            if self.TARGET == 0 and self.RETURN_MODE == RETURN_RETRACE:
+                self.crumbs.add(self.odo.x, self.odo.y)
+            self.line_read = False
             
-                elif self.ULS_DIS.get() > 15 and self.TARGET == 0 :
-                    self.state = self.S2_PATH
-                    
-                elif self.ULS_DIS.get() < 15 and self.TARGET == 0:
-                    self.OLD_YAW = self.IMU_YAW.get()
-                    self.WALL1_YAW = self.OLD_YAW + pi/2
-                    if self.WALL1_YAW > 2*pi:
-                        self.WALL1_YAW -= 2*pi
-                    if self.WALL == 1:
-                        self.state = self.S2_PATH 
+            # Only the states that set a new case drive the motors, the others keep the last duty
+            self.drive = True
+            
+            if not self.sensors_fresh():
+                # Never steer on stale data, hold ROMI still until the IMU and ultrasonic sensor catch up
+                self.case = CASE_STOP
+            else:
+                fsm.step()
+            self.state = fsm.current
+            
+            if self.drive:
+                case = self.case
+                if self.profile is not None:
+                    if case == CASE_STEER:
+                        self.profile.update(self.v_cmd, self.y_cmd, ticks_us())
                     else:
-                        self.state = self.S3_WALL1
-                    
-                elif self.TARGET == 1 and self.HOME == 0:
-                    self.state, self.HOME = check_return(self.X, self.Y, self.state)
-                    
+                        self.profile.update(CASE_V[case], CASE_Y[case], ticks_us())
+                    wR, wL = DC_speed_cal(self.profile.y, self.profile.v)
+                elif case == CASE_STEER:
+                    wR, wL = DC_speed_cal(self.y_cmd, self.v_cmd)
                 else:
-                    self.state = self.S1_HUB
-                
-            elif self.state == self.S2_PATH:
-                
-                dD = int((enc_R.get_delta() + enc_L.get_delta())/2)              
-                dx = (dD * (cos(self.IMU_YAW.get()))) * ((pi*0.070)/1440) 
-                dy = (dD * (sin(self.IMU_YAW.get()))) * ((pi*0.070)/1440) 
-                self.X += dx
-                self.Y += dy
-                L1 = line_L1.read()
-                R1 = line_R1.read()
-                M  = line_M.read()
-                L2 = line_L2.read()
-                R2 = line_R2.read()
-                H  = line_H.read()
-                
-                case = check_sensor(L2, L1, M, R1, R2, H)
+                    wL, wR = update_speed(case)
+                self.mot_R.set_duty(self.PID_R.update(wR, wR_meas))
+                self.mot_L.set_duty(self.PID_L.update(wL, wL_meas))
                 
-                if case == "explore":
-                    self.EXP_DIST += float(sqrt(dx**2 + dy**2))
-                    if self.EXP_DIST > 0.15:
-                        case = "stop"
-                        self.TARGET = 1
-                else:
-                    self.EXP_DIST = 0    
-                wL, wR = update_speed(case)
-                enc_R.update()
-                wR_meas = enc_R.get_rad_s()
-                pid_out_R = PID_R.update(wR,wR_meas)
-                mot_R.set_duty(pid_out_R)
-                enc_L.update()
-                wL_meas = enc_L.get_rad_s()
-                pid_out_L = PID_L.update(wL,wL_meas)
-                mot_L.set_duty(pid_out_L)
-                self.SER_DIR.put(0)
-                self.state = self.S1_HUB
+                if self.LATENCY:
+                    # How old each sample the duty was worked out from is, now that it reached the motors
+                    now = ticks_us()
+                    self.lat_imu.record(self.IMU_YAW.age_us())
+                    self.lat_uls.record(self.ULS_DIS.age_us())
+                    if self.line_read:
+                        self.lat_line.record(ticks_diff(now, self.sensors.t))
+                    self.lat_enc.record(ticks_diff(now, t_enc))
                 
-            elif self.state == self.S3_WALL1:
-                if cal_mode.read()  < 10:
-                    self.state = self.S1_HUB
-                dD = int((enc_R.get_delta() + enc_L.get_delta())/2)              
-                dx = (dD * (cos(self.IMU_YAW.get()))) * ((pi*0.070)/1440) 
-                dy = (dD * (sin(self.IMU_YAW.get()))) * ((pi*0.070)/1440) 
-                self.X += dx
-                self.Y += dy
-                self.SER_DIR.put(1)
-                if abs(self.WALL1_YAW - self.IMU_YAW.get()) > 0.1   :
-                    case = "wall1"                    
-                else:
-                    if self.ULS_DIS.get() < 30:
-                        case = "straight"
-                        self.state = self.S3_WALL1
-                    else:
-                        self.state = self.S3_WALL2
- 
-                wL, wR = update_speed(case)
-                enc_R.update()
-                wR_meas = enc_R.get_rad_s()
-                pid_out_R = PID_R.update(wR,wR_meas)
-                mot_R.set_duty(pid_out_R)     
-                enc_L.update()
-                wL_meas = enc_L.get_rad_s()
-                pid_out_L = PID_L.update(wL,wL_meas)
-                mot_L.set_duty(pid_out_L)
+            yield self.state
+    
+    def init(self):
+        """!
+        S0_INIT handler: init the DC motors, encoders, wheel PID controllers and line sensors.
+        
+        @return (int): the next state, S1_HUB.
+        """
+        tim_R = Timer(4, freq=20000)
+        tim_L = Timer(4, freq=20000)
+        
+        ## Right DC motor
+        self.mot_R = L6206(tim_R, 2, Pin.cpu.A2, Pin.cpu.A10, Pin.cpu.B7)
+        
+        ## Left DC motor
+        self.mot_L = L6206(tim_L, 1, Pin.cpu.B3, Pin.cpu.B10, Pin.cpu.B6)
+        self.mot_R.enable()
+        self.mot_L.enable()
+        tim_Re = Timer(1, period=5000, prescaler=0)
+        tim_Le = Timer(2, period=5000, prescaler=0)
+        
+        ## Left wheel encoder
+        self.enc_L = Encoder (tim_Le, 1, 2, Pin.cpu.A0, Pin.cpu.A1)
+        
+        ## Right wheel encoder
+        self.enc_R = Encoder (tim_Re, 1, 2, Pin.cpu.A8, Pin.cpu.A9)
+        
+        ## Right wheel speed PID controller
+        self.PID_R = pid(3, 0.5, 0.5)
+        
+        ## Left wheel speed PID controller
+        self.PID_L = pid(3, 0.5, 0.5)
+        
+        ## All line sensor channels, sampled together in the ticks of the states that use them
+        self.sensors = LineSensorArray(samples=1)
+        
+        # Per-channel thresholds from the last calibration sweep, if there is one on flash
+        if self.cal.load():
+            self.cal.apply(THRESHOLDS)
+        
+        # Speed plan of the course learned on an earlier run, if there is one on flash
+        if self.COURSE_MODE == COURSE_PLAY:
+            self.course.load()
+        elif self.COURSE_MODE == COURSE_LEARN:
+            self.course.begin()
+        
+        self.case = CASE_STOP
+        return self.S1_HUB
+    
+    def hub(self):
+        """!
+        S1_HUB handler: calibrate while CAL_MODE is set, otherwise pick the next state from the flags and sensors.
+        
+        @return (int): the next state.
+        """
+        self.drive = False
+        
+        if self.calibrating and not self.CAL_MODE.get():
+            # Calibrate mode released, keep the sweep only if every channel saw the line and the background
+            self.calibrating = False
+            if self.cal.finish():
+                self.cal.apply(THRESHOLDS)
+                self.cal.save()
+            # ROMI was moved by hand, so the run starts over from where it is put down: the pose and the traveled
+            # distance the return home and the course plan are indexed by, and the path recorded so far
+            self.odo.reset(self.YAW)
+            self.crumbs.reset()
+            if self.COURSE_MODE == COURSE_LEARN:
+                self.course.begin()
+        
+        if self.CAL_MODE.get():
+            # Calibrate mode, ROMI is swept over the line and background by hand
+            if not self.calibrating:
+                self.cal.begin()
+                self.calibrating = True
+            self.read_line()
+            self.cal.sample(self.frame)
+            self.case = CASE_STOP
+            self.drive = True
+            self.TARGET = 0
+            self.HOME = 0 
+            self.WALL = 0
+            self.pursuit.stop()
+            self.SER_DIR.put(0)
+            return self.S1_HUB
             
-            elif self.state == self.S3_WALL2:
-                if cal_mode.read()  < 10:
-                    self.state = self.S1_HUB
-                dD = int((enc_R.get_delta() + enc_L.get_delta())/2)              
-                dx = (dD * (cos(self.IMU_YAW.get()))) * ((pi*0.070)/1440) 
-                dy = (dD * (sin(self.IMU_YAW.get()))) * ((pi*0.070)/1440) 
-                self.X += dx
-                self.Y += dy
-                self.SER_DIR.put(1)
-                
-                if abs(self.OLD_YAW - self.IMU_YAW.get()) > 0.1   :
-                    case = "wall2"                    
-                else:
-                    if self.ULS_DIS.get() < 30:
-                        case = "straight"
-                        self.state = self.S3_WALL2
-                    else:
-                        self.OLD_YAW = self.IMU_YAW.get()
-                        self.WALL2_YAW = self.OLD_YAW - pi/2
-                        if self.WALL2_YAW < 0:
-                            self.WALL2_YAW += 2*pi
-                        self.state = self.S3_WALL3
- 
-                wL, wR = update_speed(case)
-                enc_R.update()
-                wR_meas = enc_R.get_rad_s()
-                pid_out_R = PID_R.update(wR,wR_meas)
-                mot_R.set_duty(pid_out_R)     
-                enc_L.update()
-                wL_meas = enc_L.get_rad_s()
-                pid_out_L = PID_L.update(wL,wL_meas)
-                mot_L.set_duty(pid_out_L)
-                
-            elif self.state == self.S3_WALL3:
-                if cal_mode.read()  < 10:
-                    self.state = self.S1_HUB
-                dD = int((enc_R.get_delta() + enc_L.get_delta())/2)              
-                dx = (dD * (cos(self.IMU_YAW.get()))) * ((pi*0.070)/1440) 
-                dy = (dD * (sin(self.IMU_YAW.get()))) * ((pi*0.070)/1440) 
-                self.X += dx
-                self.Y += dy
-                self.SER_DIR.put(1)
-                
-                if abs(self.WALL2_YAW - self.IMU_YAW.get()) > 0.1:
-                    case = "wall2" 
+        elif self.HOME == 1 and self.TARGET == 1:
+            return self.S5_HOME
+            
+        elif self.ULS_DIS.get() > 15 and self.TARGET == 0 :
+            return self.S2_PATH
+            
+        elif self.ULS_DIS.get() < 15 and self.TARGET == 0:
+            self.OLD_YAW = self.YAW
+            self.WALL1_YAW = self.OLD_YAW + pi/2
+            if self.WALL1_YAW > 2*pi:
+                self.WALL1_YAW -= 2*pi
+            if self.WALL == 1:
+                return self.S2_PATH 
+            elif self.BYPASS_MODE == BYPASS_FOLLOW:
+                return self.S3_FOLLOW
+            else:
+                return self.S3_WALL1
+            
+        elif self.TARGET == 1 and self.HOME == 0:
+            if self.RETURN_MODE != RETURN_AXES:
+                if not self.pursuit.active:
+                    self.plan_return()
+                return self.S4_PURSUIT
+            else:
+                state, self.HOME = check_return(self.odo.x, self.odo.y, self.S1_HUB)
+                return state
+            
+        return self.S1_HUB
+    
+    def path(self):
+        """!
+        S2_PATH handler: follow the line for one tick, then back to the hub.
+        
+        @return (int): the next state, S1_HUB.
+        """
+        filt = self.read_line()
+        mask = self.cond.mask(THRESHOLDS)
+        if CASE_TABLE[mask] != CASE_EXPLORE:
+            self.search.seen(mask)
+        elif self.EXP_DIST == 0 and self.search.lost():
+            # Stop for this tick, the search pivot starts from a standstill on the next
+            self.case = CASE_STOP
+            return self.S2_SEARCH
+        case = self.cond.dwell(CASE_TABLE[mask])
+        
+        if self.LINE_MODE == LINE_PID and case in STEER_CASES:
+            if self.cal.valid:
+                self.cal.normalize(filt, self.norm)
+                seen = self.line.update_normalized(self.norm)
+            else:
+                seen = self.line.update(filt[CH_L2], filt[CH_L1], filt[CH_M], filt[CH_R1], filt[CH_R2])
+            if seen:
+                self.y_cmd = self.STEER_PID.update(self.line.position, 0)
+                self.v_cmd = v_steer_max - (v_steer_max - v_steer_min)*min(1, abs(self.line.position)/2)
+                case = CASE_STEER
+        
+        if self.COURSE_MODE == COURSE_LEARN:
+            self.course.record(self.odo.distance, self.YAW, case)
+        elif self.COURSE_MODE == COURSE_PLAY and (case == CASE_STEER or case in COURSE_CASES):
+            v = self.course.speed_at(self.odo.distance)
+            if v is not None:
+                if case == CASE_STEER:
+                    # The planned speed takes the place of the top steering speed
+                    self.v_cmd *= v / v_steer_max
                 else:
-                    L1 = line_L1.read()
-                    R1 = line_R1.read()
-                    M  = line_M.read()
-                    L2 = line_L2.read()
-                    R2 = line_R2.read()
-                    H  = line_H.read()
-                    
+                    self.v_cmd = v if case in (CASE_STRAIGHT, CASE_STRAIGHT_FAST) else min(v, CASE_V[case])
+                    self.y_cmd = CASE_Y[case]
+                    case = CASE_STEER
+        
+        if case == CASE_EXPLORE:
+            self.EXP_DIST += self.odo.step
+            if self.EXP_DIST > 0.15:
+                case = CASE_STOP
+                self.TARGET = 1
+                if self.COURSE_MODE == COURSE_LEARN and self.course.finish():
+                    self.course.save()
+        else:
+            self.EXP_DIST = 0    
+        
+        if self.governor is not None and self.WALL == 0:
+            new = self.ULS_DIS.changed_since(self.ULS_SEQ)
+            if new:
+                self.ULS_SEQ = self.ULS_DIS.seq()
+            self.governor.update(self.ULS_DIS.get(), ticks_us(), new)
+            v = self.v_cmd if case == CASE_STEER else CASE_V[case]
+            limit = self.governor.limit(v)
+            if limit < v:
+                if case != CASE_STEER:
+                    self.y_cmd = CASE_Y[case]
+                    case = CASE_STEER
+                self.v_cmd = limit
+        self.case = case
+        return self.S1_HUB
+    
+    def reacquire(self):
+        """!
+        S2_SEARCH handler: sweep towards the side the line was last seen, then in widening arcs, until the 
+        line is seen again. If the search gives up, PATH goes on with the end-of-line explore.
+        
+        @return (int): the next state.
+        """
+        if CASE_TABLE[self.mask_line()] != CASE_EXPLORE:
+            self.search.stop()
+            return self.S1_HUB
+        out = self.search.update(self.YAW)
+        if out is None:
+            # Gave up, stop for this tick rather than keep turning with the last leg
+            self.case = CASE_STOP
+            return self.S1_HUB
+        self.steer(out[0], out[1])
+        return self.S2_SEARCH
+    
+    def wall1(self):
+        """!
+        S3_WALL1 handler: turn left 90° then go straight, holding the heading, until the wall is no longer seen.
+        
+        @return (int): the next state.
+        """
+        y = self.heading.update(self.YAW, ticks_us())
+        if not self.heading.settled:
+            self.steer(v_wall1, y)
+        elif self.ULS_DIS.get() < 30:
+            self.steer(v_straight, y)
+        else:
+            return self.S3_WALL2
+        return self.S3_WALL1
+    
+    def wall2(self):
+        """!
+        S3_WALL2 handler: turn back right 90° then go straight, holding the heading, until the wall is no longer seen.
+        
+        @return (int): the next state.
+        """
+        y = self.heading.update(self.YAW, ticks_us())
+        if not self.heading.settled:
+            self.steer(v_wall2, y)
+        elif self.ULS_DIS.get() < 30:
+            self.steer(v_straight, y)
+        else:
+            self.OLD_YAW = self.YAW
+            self.WALL2_YAW = self.OLD_YAW - pi/2
+            if self.WALL2_YAW < 0:
+                self.WALL2_YAW += 2*pi
+            return self.S3_WALL3
+        return self.S3_WALL2
+    
+    def wall3(self):
+        """!
+        S3_WALL3 handler: turn right 90° then go straight, holding the heading, until the line sensors pick up the line.
+        
+        @return (int): the next state.
+        """
+        y = self.heading.update(self.YAW, ticks_us())
+        if not self.heading.settled:
+            self.steer(v_wall2, y)
+        elif CASE_TABLE[self.mask_line()] != CASE_EXPLORE:
+            return self.S3_WALL4
+        else:
+            self.steer(v_straight, y)
+        return self.S3_WALL3
+    
+    def wall4(self):
+        """!
+        S3_WALL4 handler: turn left 90° back onto the line, then set WALL = 1 and go back to the hub.
+        
+        @return (int): the next state.
+        """
+        y = self.heading.update(self.YAW, ticks_us())
+        if not self.heading.settled:
+            self.steer(v_wall1, y)
+            return self.S3_WALL4
+        self.WALL = 1
+        return self.S1_HUB
+    
+    def follow(self):
+        """!
+        S3_FOLLOW handler: turn left 90°, then follow the wall on the right with the WallFollower until, 
+        after at least FOLLOW_MIN, the line sensors pick up the line and WALL4 turns ROMI back onto it.
+        
+        @return (int): the next state.
+        """
+        if not self.following:
+            y = self.heading.update(self.YAW, ticks_us())
+            if not self.heading.settled:
+                self.steer(v_wall1, y)
+                return self.S3_FOLLOW
+            self.following = True
+            self.follow_from = self.odo.distance
+            self.wall.reset()
+        
+        new = self.ULS_DIS.changed_since(self.ULS_SEQ)
+        if new:
+            self.ULS_SEQ = self.ULS_DIS.seq()
+        v, y = self.wall.update(self.ULS_DIS.get(), ticks_us(), new, wrap(self.YAW - self.WALL1_YAW))
+        self.steer(v, y)
+        
+        if self.odo.distance - self.follow_from > self.FOLLOW_MIN and CASE_TABLE[self.mask_line()] != CASE_EXPLORE:
+            return self.S3_WALL4
+        return self.S3_FOLLOW
+    
+    def start_follow(self):
+        """!
+        Entry action of S3_FOLLOW: ultrasonic sensor to the right and turn left 90° before following the wall.
+        """
+        self.turn_to(self.WALL1_YAW, 1)
+        self.following = False
+    
+    def returnx(self):
+        """!
+        S4_RETURNX handler: turn to face 180° then drive along the X axis back to X = 0, holding the heading.
+        
+        @return (int): the next state, S1_HUB.
+        """
+        y = self.heading.update(self.YAW, ticks_us())
+        if not self.heading.settled:
+            self.steer(0, y)
+        elif abs(self.odo.x) > 0.02:
+            self.steer(v_straight if self.odo.x > 0 else -v_straight, y)
+        else:
+            self.case = CASE_STOP
+        return self.S1_HUB
+    
+    def returny(self):
+        """!
+        S4_RETURNY handler: turn to face 90° then drive along the Y axis back to Y = 0, holding the heading.
+        
+        @return (int): the next state, S1_HUB.
+        """
+        y = self.heading.update(self.YAW, ticks_us())
+        if not self.heading.settled:
+            self.steer(0, y)
+        elif abs(self.odo.y) > 0.02:
+            self.steer(-v_straight if self.odo.y > 0 else v_straight, y)
+        else:
+            self.case = CASE_STOP
+        return self.S1_HUB
+    
+    def pursue(self):
+        """!
+        S4_PURSUIT handler: follow the queued WAYPOINTS for one tick, set HOME = 1 once the last one is reached.
+        
+        @return (int): the next state, S1_HUB.
+        """
+        self.v_cmd, self.y_cmd = self.pursuit.update(self.odo.x, self.odo.y, self.YAW)
+        if self.pursuit.done:
+            self.case = CASE_STOP
+            self.HOME = 1
+        else:
+            self.case = CASE_STEER
+        return self.S1_HUB
+    
+    def home(self):
+        """!
+        S5_HOME handler: celebrate at home with the blindfold closed.
+        
+        @return (int): the next state, S1_HUB.
+        """
+        if self.CAL_MODE.get():
+            self.HOME = 0
+        self.case = CASE_DONE
+        return self.S1_HUB
+    
+    def steer(self, v, y):
+        """!
+        Drive this tick with a linear speed and yaw rate of its own rather than those of a case.
+        
+        @param v (float): linear speed [m/s]
+        @param y (float): yaw rate [rad/s]
+        """
+        self.v_cmd = v
+        self.y_cmd = y
+        self.case = CASE_STEER
+    
+    def turn_to(self, target, direction):
+        """!
+        Entry action of the wall states: point the ultrasonic sensor and turn to, then hold, a heading.
+        
+        @param target (float): heading [rad] to turn to
+        @param direction (int): SER_DIR servo direction
+        """
+        self.SER_DIR.put(direction)
+        self.heading.set_target(target)
+    
+    def look_ahead(self, close, target):
+        """!
+        Entry action of the axis return states: ultrasonic sensor to the front, the blindfold set and turn to, then hold, a heading.
+        
+        @param close (int): 1 to close the blindfold, 0 to open it.
+        @param target (float): heading [rad] to turn to
+        """
+        self.SER_DIR.put(0)
+        self.CLOSE.put(close)
+        self.heading.set_target(target)
+    
+    def cal_held(self):
+        """!
+        Guard of the states that leave for the hub as soon as CAL_MODE is set.
+        
+        @return (bool): True if CAL_MODE is set.
+        """
+        return self.CAL_MODE.get() == 1
+    
+    def plan_return(self):
+        """!
+        Queue the waypoints of the way back for RETURN_MODE and start the pure pursuit follower from where ROMI is.
+        """
+        self.WAYPOINTS.clear()
+        if self.RETURN_MODE == RETURN_RETRACE:
+            for i in range(self.crumbs.retrace(self.SHORTCUT)):
+                self.WAYPOINTS.put(self.crumbs.rx[i], self.crumbs.ry[i])
+        else:
+            self.WAYPOINTS.put(0, 0)
+        self.pursuit.start()
+        
+    def update_heading(self):
+        """!
+        Refresh the yaw angle for this tick, only reading IMU_YAW when it has a new value since the last refresh
+        """
+        if self.IMU_YAW.changed_since(self.YAW_SEQ):
+            self.YAW_SEQ = self.IMU_YAW.seq()
+            self.YAW = self.IMU_YAW.get()
+    
+    def read_line(self):
+        """!
+        Read and filter the line sensors, at most once a tick and only in the states that need the line, since
+        the ADC read blocks for its samples. After a gap longer than LINE_GAP_US the filter starts over.
+        
+        @return (array): the filtered reading of each channel.
+        """
+        if not self.line_read:
+            if ticks_diff(ticks_us(), self.sensors.t) > self.LINE_GAP_US:
+                self.cond.primed = False
+            self.frame = self.sensors.read()
+            self.filt = self.cond.filter(self.frame)
+            self.line_read = True
+        return self.filt
+    
+    def mask_line(self):
+        """!
+        Read the line sensors for this tick and return their mask.
+        
+        @return (int): the 6 bit mask of the line sensors, see LineConditioner.mask().
+        """
+        self.read_line()
+        return self.cond.mask(THRESHOLDS)
+    
+    def sensors_fresh(self):
+        """!
+        Check that the IMU yaw angle and the ultrasonic distance are recent enough to drive on
+        
+        @return (bool): True if both IMU_YAW and ULS_DIS are fresh
+        """
+        return self.IMU_YAW.is_fresh(self.IMU_MAX_AGE) and self.ULS_DIS.is_fresh(self.ULS_MAX_AGE)
 
-                    case = check_sensor(L2, L1, M, R1, R2, H)
-                    if case != "explore":
-                        self.state = self.S3_WALL4
-                    else:
-                        self.state = self.S3_WALL3
-                
-                wL, wR = update_speed(case)
-                enc_R.update()
-                wR_meas = enc_R.get_rad_s()
-                pid_out_R = PID_R.update(wR,wR_meas)
-                mot_R.set_duty(pid_out_R)     
-                enc_L.update()
-                wL_meas = enc_L.get_rad_s()
-                pid_out_L = PID_L.update(wL,wL_meas)
-                mot_L.set_duty(pid_out_L)
-                 
-                        
-            elif self.state == self.S3_WALL4:
-                if cal_mode.read()  < 10:
-                    self.state = self.S1_HUB
-                dD = int((enc_R.get_delta() + enc_L.get_delta())/2)              
-                dx = (dD * (cos(self.IMU_YAW.get()))) * ((pi*0.070)/1440) 
-                dy = (dD * (sin(self.IMU_YAW.get()))) * ((pi*0.070)/1440) 
-                self.X += dx
-                self.Y += dy
-                self.SER_DIR.put(-1)
-                
-                if abs(self.OLD_YAW - self.IMU_YAW.get()) > 0.1   :
-                    case = "wall1" 
-                    self.state = self.S3_WALL4
-                else:
-                    self.WALL = 1
-                    self.state = self.S1_HUB
-                    
-                wL, wR = update_speed(case)
-                enc_R.update()
-                wR_meas = enc_R.get_rad_s()
-                pid_out_R = PID_R.update(wR,wR_meas)
-                mot_R.set_duty(pid_out_R)     
-                enc_L.update()
-                wL_meas = enc_L.get_rad_s()
-                pid_out_L = PID_L.update(wL,wL_meas)
-                mot_L.set_duty(pid_out_L)
-                
-            elif self.state == self.S4_RETURNX:
-                if cal_mode.read()  < 10:
-                    self.state = self.S1_HUB
-                dD = int((enc_R.get_delta() + enc_L.get_delta())/2)              
-                dx = (dD * (cos(self.IMU_YAW.get()))) * ((pi*0.070)/1440) 
-                dy = (dD * (sin(self.IMU_YAW.get()))) * ((pi*0.070)/1440) 
-                self.X += dx
-                self.Y += dy
-                self.SER_DIR.put(0)
-                self.CLOSE.put(0)    
-                
-                if (self.IMU_YAW.get() - pi) > 0.1:
-                    case = "pivot right"
-                elif (self.IMU_YAW.get() - pi) < -0.1:
-                    case = "pivot left"
-                    
-                elif abs(self.X) > 0.02:
-                    if self.X > 0:
-                        case = "straight"
-                    else:
-                        case = "backup"
-                else:
-                    case = "stop"
-                
-                    
-                wL, wR = update_speed(case)
-                enc_R.update()
-                wR_meas = enc_R.get_rad_s()
-                pid_out_R = PID_R.update(wR,wR_meas)
-                mot_R.set_duty(pid_out_R)     
-                enc_L.update()
-                wL_meas = enc_L.get_rad_s()
-                pid_out_L = PID_L.update(wL,wL_meas)
-                mot_L.set_duty(pid_out_L)
-                self.state = self.S1_HUB
-                
-            elif self.state == self.S4_RETURNY:
-                if cal_mode.read()  < 10:
-                    self.state = self.S1_HUB
-                dD = int((enc_R.get_delta() + enc_L.get_delta())/2)              
-                dx = (dD * (cos(self.IMU_YAW.get()))) * ((pi*0.070)/1440) 
-                dy = (dD * (sin(self.IMU_YAW.get()))) * ((pi*0.070)/1440) 
-                self.X += dx
-                self.Y += dy
-                self.SER_DIR.put(0)
-                self.CLOSE.put(1)    
-                if (self.IMU_YAW.get() - pi/2) > 0.1:
-                    case = "pivot right"
-                elif (self.IMU_YAW.get() - pi/2) < -0.1:
-                    case = "pivot left"
-                    
-                elif abs(self.Y) > 0.02:
-                    if self.Y > 0:
-                        case = "backup"
-                    else:
-                        case = "straight"
-                else:
-                    case = "stop"
-                    
-                    
-                wL, wR = update_speed(case)
-                enc_R.update()
-                wR_meas = enc_R.get_rad_s()
-                pid_out_R = PID_R.update(wR,wR_meas)
-                mot_R.set_duty(pid_out_R)     
-                enc_L.update()
-                wL_meas = enc_L.get_rad_s()
-                pid_out_L = PID_L.update(wL,wL_meas)
-                mot_L.set_duty(pid_out_L)
-                self.state = self.S1_HUB
-                
-            elif self.state == self.S5_HOME:
-                if cal_mode.read()  < 10:
-                    self.HOME = 0
-                
-                case = "done"
-                self.CLOSE.put(1)
+            
+## Case code: stop both wheels
+CASE_STOP          = 0
+## Case code: reading the cross pattern
+CASE_CROSS         = 1
+## Case code: 90° turn left
+CASE_90_LEFT       = 2
+## Case code: 90° turn right
+CASE_90_RIGHT      = 3
+## Case code: really hard turn left
+CASE_RHARD_LEFT    = 4
+## Case code: really hard turn right
+CASE_RHARD_RIGHT   = 5
+## Case code: hard turn left
+CASE_HARD_LEFT     = 6
+## Case code: hard turn right
+CASE_HARD_RIGHT    = 7
+## Case code: soft turn left
+CASE_SOLF_LEFT     = 8
+## Case code: soft turn right
+CASE_SOLF_RIGHT    = 9
+## Case code: going forward fast, both middle sensors on the line
+CASE_STRAIGHT_FAST = 10
+## Case code: going forward
+CASE_STRAIGHT      = 11
+## Case code: going backward
+CASE_BACKUP        = 12
+## Case code: exploring mode, no sensor on the line
+CASE_EXPLORE       = 13
+## Case code: pivot left in place
+CASE_PIVOT_LEFT    = 14
+## Case code: pivot right in place
+CASE_PIVOT_RIGHT   = 15
+## Case code: turn left to stay away from the wall
+CASE_WALL1         = 16
+## Case code: turn right to stay away from the wall
+CASE_WALL2         = 17
+## Case code: done and celebrate by pivoting
+CASE_DONE          = 18
+## Case code: yaw rate and linear speed come from the line steering PID instead of the speed table
+CASE_STEER         = 19
 
-                wL, wR = update_speed(case)
-                enc_R.update()
-                wR_meas = enc_R.get_rad_s()
-                pid_out_R = PID_R.update(wR,wR_meas)
-                mot_R.set_duty(pid_out_R)     
-                enc_L.update()
-                wL_meas = enc_L.get_rad_s()
-                pid_out_L = PID_L.update(wL,wL_meas)
-                mot_L.set_duty(pid_out_L)
-                self.state = self.S1_HUB
+## Readable name of each case code, for printouts
+CASE_NAMES = ("stop", "cross", "90 left", "90 right", "really hard left", "really hard right",
+              "hard left", "hard right", "solf left", "solf right", "straight fast", "straight",
+              "backup", "explore", "pivot left", "pivot right", "wall1", "wall2", "done", "steer")
 
+## Cases that the line steering PID takes over from in LINE_PID mode, the others still come from the speed table
+STEER_CASES = (CASE_RHARD_LEFT, CASE_RHARD_RIGHT, CASE_HARD_LEFT, CASE_HARD_RIGHT,
+               CASE_SOLF_LEFT, CASE_SOLF_RIGHT, CASE_STRAIGHT_FAST, CASE_STRAIGHT)
 
-            else:   
-                print("MOTOR: INVALID STATE") 
-                
-            yield self.state
-            
+## Cases whose speed comes from the learned course speed plan in COURSE_PLAY mode, the soft turns only slow down
+COURSE_CASES = (CASE_SOLF_LEFT, CASE_SOLF_RIGHT, CASE_STRAIGHT_FAST, CASE_STRAIGHT)
+
+## Line following mode: discrete cases from the sensor mask and the speed table
+LINE_TABLE = 0
+## Line following mode: continuous line position from the raw readings and a steering PID
+LINE_PID   = 1
+
+## Course learning mode: speeds come from the cases only
+COURSE_OFF     = 0
+## Course learning mode: record the course by traveled distance on this run and save it at the target
+COURSE_LEARN   = 1
+## Course learning mode: drive the speed plan of the course learned on an earlier run, if there is one
+COURSE_PLAY    = 2
+
+## Obstacle bypass mode: turn left, go past, turn right, go past, turn right back to the line, see S3_WALL1 to S3_WALL4
+BYPASS_BOX     = 0
+## Obstacle bypass mode: turn left then follow the wall at a set distance until the line is picked up, see S3_FOLLOW
+BYPASS_FOLLOW  = 1
+
+## Return home mode: turn to face the X then the Y axis and drive each leg back to 0, see check_return()
+RETURN_AXES    = 0
+## Return home mode: drive back along the breadcrumb path recorded on the way out
+RETURN_RETRACE = 1
+## Return home mode: one smooth pure pursuit path straight to the origin
+RETURN_PURSUIT = 2
+
+# The mask bits are (1 << CH_) of each channel, so LineConditioner.mask() can index CASE_TABLE too
+## Sensor mask bit: far left line sensor L2 sees the line
+BIT_L2 = 0x01
+## Sensor mask bit: close left line sensor L1 sees the line
+BIT_L1 = 0x02
+## Sensor mask bit: middle line sensor M sees the line
+BIT_M  = 0x04
+## Sensor mask bit: close right line sensor R1 sees the line
+BIT_R1 = 0x08
+## Sensor mask bit: far right line sensor R2 sees the line
+BIT_R2 = 0x10
+## Sensor mask bit: far middle TCRT5000 sensor H sees the line
+BIT_H  = 0x20
+
+## OSOYOO line sensor reading below which the sensor is on the black line
+LINE_THRESHOLD = 2000
+## TCRT5000 line sensor reading above which the sensor is on the black line
+H_THRESHOLD    = 500
+## Threshold of each line sensor indexed by the CH_ constants, replaced by the calibrated thresholds when there are some
+THRESHOLDS     = array('H', (LINE_THRESHOLD, LINE_THRESHOLD, LINE_THRESHOLD, LINE_THRESHOLD, LINE_THRESHOLD, H_THRESHOLD))
+
+def sensor_mask(L2, L1, M, R1, R2, H):
+    """!
+    Threshold the 6 line sensor readings against THRESHOLDS and pack them into a 6-bit mask, one BIT_ per sensor on the line
+    
+    @param L2 (float): far left line sensor reading 
+    @param L1 (float): close left line sensor reading 
+    @param M (float): close middle line sensor reading 
+    @param R1 (float): close right line sensor reading 
+    @param R2 (float): far right line sensor reading 
+    @param H (float): far middle line sensor reading 
+    
+    @return (int): sensor mask from 0 to 63
+    """
+    th = THRESHOLDS
+    mask = 0
+    if L2 < th[CH_L2]:
+        mask |= BIT_L2
+    if L1 < th[CH_L1]:
+        mask |= BIT_L1
+    if M < th[CH_M]:
+        mask |= BIT_M
+    if R1 < th[CH_R1]:
+        mask |= BIT_R1
+    if R2 < th[CH_R2]:
+        mask |= BIT_R2
+    if H > th[CH_H]:
+        mask |= BIT_H
+    return mask
+
+def mask_case(mask):
+    """!
+    Decide the case for one sensor mask, the priority order of the checks decides which case win.
+    This is only used to build CASE_TABLE, check_sensor() look the case up instead.
+    
+    @param mask (int): sensor mask from sensor_mask()
+    
+    @return (int): case code
+    """
+    L2 = mask & BIT_L2
+    L1 = mask & BIT_L1
+    M  = mask & BIT_M
+    R1 = mask & BIT_R1
+    R2 = mask & BIT_R2
+    H  = mask & BIT_H
+    
+    if L2 and L1 and M and R1 and R2:
+        return CASE_CROSS
+    elif L2 and L1 and M:
+        return CASE_90_LEFT
+    elif M and R1 and R2:
+        return CASE_90_RIGHT
+    elif L2 and L1:
+        return CASE_HARD_LEFT
+    elif R2 and R1:
+        return CASE_HARD_RIGHT
+    elif L2:
+        return CASE_RHARD_LEFT
+    elif R2:
+        return CASE_RHARD_RIGHT
+    elif L1:
+        return CASE_SOLF_LEFT
+    elif R1:
+        return CASE_SOLF_RIGHT
+    elif M and H:
+        return CASE_STRAIGHT_FAST
+    elif M or H:
+        return CASE_STRAIGHT
+    else:
+        return CASE_EXPLORE
+
+## Case code for each of the 64 sensor masks, built once when this file is imported
+CASE_TABLE = bytearray(mask_case(mask) for mask in range(64))
 
-            
 def check_sensor(L2, L1, M, R1, R2, H):
     
     """!
@@ -532,46 +1095,89 @@ def check_sensor(L2, L1, M, R1, R2, H):
     @param M (float): close middle line sensor reading 
     @param H (float): far middle line sensor reading 
 
-    @return (string): case that ROMI DC motor need to run .
+    @return (int): case code that ROMI DC motor need to run, CASE_NAMES has its name.
     
     """
     
-    if L2 < 2000 and L1 < 2000 and M < 2000 and R1 < 2000 and R2 < 2000:
-        return "cross"
-    elif L2 < 2000 and L1 < 2000 and M < 2000:
-        return "90 left"
-    elif M < 2000 and R1 < 2000 and R2 < 2000:
-        return "90 right"
-    elif L2 < 2000 and L1 < 2000:
-        return "hard left"
-    elif R2 < 2000 and R1 < 2000:
-        return "hard right"
-    elif L2 < 2000:
-        return "really hard left"
-    elif R2 < 2000:
-        return "really hard right"
-    elif L1 < 2000:
-        return "solf left"
-    elif R1 < 2000:
-        return "solf right"
+    return CASE_TABLE[sensor_mask(L2, L1, M, R1, R2, H)]
 
-    elif M < 2000 and H > 500:
-        return "straight fast"
-    
-    elif M < 2000 or H > 500:
-        return "straight"
+## Linear speed [m/s] for each case
+v_stop     = 0
+v_pivot    = 0
+v_wall1    = 0.125
+v_wall2    = 0.225
+v_90       = 0.125
+v_rhard    = 0.1
+v_hard     = 0.125
+v_straight = 0.25
+v_straightf= 0.3
+v_solf     = 0.2
+v_done     = 0
 
-    elif L2 > 2000 and L1 > 2000 and M > 2000 and R1 > 2000 and R2 > 2000 and H < 500:
-        return "explore"
-    elif L2 > 2000 and L1 > 2000 and M > 2000 and R1 > 2000 and R2 > 2000 and H < 500:
-        return "stop"
-    else:
-        return "stop"
+## Yaw rate [rad/s] for each case
+y_stop     = 0
+y_pivot    = 1
+y_wall     = 1.2
+y_straight = 0
+y_straightf= 0
+y_90       = 2.5
+y_rhard    = 2.25
+y_hard     = 2
+y_solf     = 1
+y_done     = 2
+
+## Linear speed [m/s] of the line steering PID when the line is centered
+v_steer_max = 0.3
+## Linear speed [m/s] of the line steering PID when the line is at the far edge
+v_steer_min = 0.1
+
+## Linear speed [m/s] of each case code, filled in by build_speed_table()
+CASE_V  = array('f', [0] * len(CASE_NAMES))
+## Yaw rate [rad/s] of each case code, filled in by build_speed_table()
+CASE_Y  = array('f', [0] * len(CASE_NAMES))
+## Left wheel angular speed [rad/s] of each case code, filled in by build_speed_table()
+CASE_WL = array('f', [0] * len(CASE_NAMES))
+## Right wheel angular speed [rad/s] of each case code, filled in by build_speed_table()
+CASE_WR = array('f', [0] * len(CASE_NAMES))
+
+def build_speed_table():
+    """!
+    Work out the linear speed, yaw rate and both wheel speeds of every case once, from the speed constants above.
+    It runs when this file is imported and should be run again after any of the speed constants is changed.
+    """
     
+    speeds = ((CASE_STOP,          v_stop,      y_stop),
+              (CASE_CROSS,         v_straight,  y_straight),
+              (CASE_90_LEFT,       v_90,        y_90),
+              (CASE_90_RIGHT,      v_90,       -y_90),
+              (CASE_RHARD_LEFT,    v_rhard,     y_rhard),
+              (CASE_RHARD_RIGHT,   v_rhard,    -y_rhard),
+              (CASE_HARD_LEFT,     v_hard,      y_hard),
+              (CASE_HARD_RIGHT,    v_hard,     -y_hard),
+              (CASE_SOLF_LEFT,     v_solf,      y_solf),
+              (CASE_SOLF_RIGHT,    v_solf,     -y_solf),
+              (CASE_STRAIGHT_FAST, v_straightf, y_straightf),
+              (CASE_STRAIGHT,      v_straight,  y_straight),
+              (CASE_BACKUP,       -v_straight,  y_straight),
+              (CASE_EXPLORE,       v_straight,  y_straight),
+              (CASE_PIVOT_LEFT,    v_pivot,     y_pivot),
+              (CASE_PIVOT_RIGHT,   v_pivot,    -y_pivot),
+              (CASE_WALL1,         v_wall1,     y_wall),
+              (CASE_WALL2,         v_wall2,    -y_wall),
+              (CASE_DONE,          v_done,      y_done),
+              (CASE_STEER,         v_stop,      y_stop))
+    for case, v, y in speeds:
+        wR, wL = DC_speed_cal(y, v)
+        CASE_V[case]  = v
+        CASE_Y[case]  = y
+        CASE_WL[case] = wL
+        CASE_WR[case] = wR
+
 def update_speed(case):
     
     """!
-    Read input case, then decide ROMI yaw rate and linear speed then run DC_speed_cal() function below to find angular speeds of both wheels
+    Read input case, then look up ROMI angular speeds of both wheels, which build_speed_table() 
+    work out once from the yaw rate and linear speed of each case using DC_speed_cal() function below
     For the scope of this project, ROMI will have only 19 case including:
         
          CASE                   DESCRIPTION
@@ -600,101 +1206,14 @@ def update_speed(case):
         
         done                done and celebrate by pivoting
 
-    @param case (string): input case that ROMI need to run.
+    @param case (int): input case code that ROMI need to run.
     
     @return wL (float): left wheel angular velocity (rad/s).
     @return wR (float): right wheel angular velocity (rad/s).
     
     """
     
-    v          = 0       
-    v_stop     = 0
-    v_pivot    = 0
-    v_wall1    = 0.125
-    v_wall2    = 0.225
-    v_90       = 0.125
-    v_rhard    = 0.1
-    v_hard     = 0.125
-    v_straight = 0.25
-    v_straightf= 0.3
-    v_solf     = 0.2
-    v_done     = 0
-    
-    y          = 0  
-    y_stop     = 0
-    y_pivot    = 1
-    y_wall     = 1.2
-    y_straight = 0
-    y_straightf= 0
-    y_90       = 2.5
-    y_rhard    = 2.25
-    y_hard     = 2
-    y_solf     = 1
-    y_done     = 2
-    
-    if case == "cross":
-        v = v_straight   
-        y = y_straight
-    elif case == "90 left":
-        v = v_90
-        y = y_90
-    elif case == "90 right":
-        v = v_90
-        y = -y_90
-    elif case == "really hard left":
-        v = v_rhard
-        y = y_rhard 
-    elif case == "really hard right":
-        v = v_rhard 
-        y = -y_rhard
-    elif case == "hard left":
-        v = v_hard
-        y = y_hard
-    elif case == "hard right":
-        v = v_hard
-        y = -y_hard
-    elif case == "solf left":
-        v = v_solf
-        y = y_solf
-    elif case == "solf right":
-        v = v_solf
-        y = -y_solf
-    elif case == "straight fast":
-        v = v_straightf
-        y = y_straightf
-    elif case == "straight":
-        v = v_straight
-        y = y_straight
-    elif case == "backup":
-        v = -v_straight
-        y = y_straight        
-    elif case == "explore":
-        v = v_straight
-        y = y_straight
-    elif case == "pivot left":
-        v = v_pivot
-        y = y_pivot
-    elif case == "pivot right":
-        v = v_pivot
-        y = -y_pivot
-    elif case == "wall1":
-        v = v_wall1
-        y = y_wall
-    elif case == "wall2":
-        v = v_wall2
-        y = -y_wall
-    elif case == "stop":
-        v = v_stop
-        y = y_stop
-    elif case == "done":
-        v = v_done
-        y = y_done
-    else:
-        v = v_stop
-        y = y_stop
-        
-    wR, wL = DC_speed_cal(y, v)
-    return wL, wR
+    return CASE_WL[case], CASE_WR[case]
 
 def DC_speed_cal(y, v):
     
@@ -739,5 +1258,6 @@ def check_return(X, Y, state):
     elif abs(X) > 0.02:
         return RETURNX, NOT_YET 
     else:
-        return RETURN_HUB, HOME         
-        
\ No newline at end of file
+        return RETURN_HUB, HOME
+
+build_speed_table()
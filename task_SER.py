@@ -8,6 +8,7 @@ This file contain a task that run 2 servos according to the FSM
 '''
 
 from pyb import Pin, Timer
+from fsm import FSM
 
 class ServoTask:
     """!
@@ -28,10 +29,12 @@ class ServoTask:
         S2_MIDDLE (int): State identifier for middle position.
         S3_RIGHT (int): State identifier for right position.
         S4_LEFT (int): State identifier for left position.
+        fsm (FSM): State machine with a handler for each state.
 
     Methods:
         __init__(self, SER_DIR, CLOSE): Initializes the ServoTask instance with direction and close signals.
         run(self): Runs the servo task, controlling the servo based on the current state.
+        init(self), hub(self), middle(self), right(self), left(self): Handler of each state.
     """
 
     def __init__(self, SER_DIR, CLOSE):
@@ -86,62 +89,109 @@ class ServoTask:
         
         ## State 4: ROMI look left
         self.S4_LEFT = 4
+        
+        ## State machine with a handler for each state
+        self.fsm = FSM('SER_TASK', 5)
+        self.fsm.state(self.S0_INIT, 'INIT', self.init)
+        self.fsm.state(self.S1_HUB, 'HUB', self.hub)
+        self.fsm.state(self.S2_MIDDLE, 'MIDDLE', self.middle)
+        self.fsm.state(self.S3_RIGHT, 'RIGHT', self.right)
+        self.fsm.state(self.S4_LEFT, 'LEFT', self.left)
+        self.fsm.start(self.S0_INIT)
 
     def run(self):
         """
         
         Runs the servo task in an infinite loop, transitioning between different states 
         to control servo positions based on external signals.
+        
+        The task is event driven: it is subscribed to SER_DIR and CLOSE and only runs when one 
+        of them changes, so each run goes through HUB and the position state in one pass and 
+        the servo PWM is only re-applied when there is something new to do.
 
             STATE    NAME      DESCRIPTIOM
               0      INIT      This state init 2 servos, one for controlling ultrasonic sensor and one for the blindfold
-              1      HUB       This state continuously read SER_DIR and CLOSE share to and send to appropriate state below
+              1      HUB       This state read SER_DIR and CLOSE share to and send to appropriate state below
               2      MIDDLE    Servo 1 = 0° || Servo 2 = -45° if CLOSE = 0 and Servo 2 = 90° of CLOSE = 1
               3      RIGHT     Servo 1 = -90°
               4      LEFT      Servo 1 = 90°
               
         """
         while True:
-            if self.state == self.S0_INIT:
-                servoTimer = Timer(3, freq=50)
-                servoPin = servoTimer.channel(3, pin=Pin.cpu.B0, mode=Timer.PWM, pulse_width_percent=0)
-                servoTimer2 = Timer(2, freq=50)
-                servoPin2 = servoTimer2.channel(4, pin=Pin.cpu.A3, mode=Timer.PWM, pulse_width_percent=0)
-                self.state = self.S1_HUB
-                
-            elif self.state == self.S1_HUB:
-                if self.CLOSE.get() == 0:    
-                    set_servo(-45, servoPin2)
-                else:
-                    set_servo(90, servoPin2)
-                    
-                if self.SER_DIR.get() == 0:
-                    self.state = self.S2_MIDDLE
-                elif self.SER_DIR.get() == 1:
-                    self.state = self.S3_RIGHT
-                elif self.SER_DIR.get() == -1:
-                    self.state = self.S4_LEFT
-                else: 
-                    self.state = self.S1_HUB
-                    
-            elif self.state == self.S2_MIDDLE:
-
-                set_servo(0, servoPin)
-                self.state = self.S1_HUB
-
-            elif self.state == self.S3_RIGHT:
-                set_servo(-90, servoPin)
-                self.state = self.S1_HUB
-                
-            elif self.state == self.S4_LEFT:
-                set_servo(90, servoPin)
-                self.state = self.S1_HUB
-
-            else:
-                print("IMU_TASK Invalid State!!!")
+            if self.fsm.current == self.S0_INIT:
+                self.fsm.step()
+            
+            # HUB picks the position state, which sets the servo and goes back to HUB, all in this run
+            self.fsm.step()
+            if self.fsm.current != self.S1_HUB:
+                self.fsm.step()
                        
+            self.state = self.fsm.current
             yield self.state
 
+    def init(self):
+        """!
+        State 0 handler: init both servos' PWM channels.
+
+        @return (int): the next state, S1_HUB.
+        """
+        servoTimer = Timer(3, freq=50)
+        
+        ## PWM channel of the servo that turn the ultrasonic sensor
+        self.servoPin = servoTimer.channel(3, pin=Pin.cpu.B0, mode=Timer.PWM, pulse_width_percent=0)
+        servoTimer2 = Timer(2, freq=50)
+        
+        ## PWM channel of the servo that close the blindfold
+        self.servoPin2 = servoTimer2.channel(4, pin=Pin.cpu.A3, mode=Timer.PWM, pulse_width_percent=0)
+        return self.S1_HUB
+
+    def hub(self):
+        """!
+        State 1 handler: set the blindfold servo from CLOSE and pick the position state from SER_DIR.
+
+        @return (int): the position state, or S1_HUB if SER_DIR is not -1, 0 or 1.
+        """
+        if self.CLOSE.get() == 0:    
+            set_servo(-45, self.servoPin2)
+        else:
+            set_servo(90, self.servoPin2)
+        
+        direction = self.SER_DIR.get()
+        if direction == 0:
+            return self.S2_MIDDLE
+        elif direction == 1:
+            return self.S3_RIGHT
+        elif direction == -1:
+            return self.S4_LEFT
+        return self.S1_HUB
+
+    def middle(self):
+        """!
+        State 2 handler: ultrasonic sensor servo to 0°.
+
+        @return (int): the next state, S1_HUB.
+        """
+        set_servo(0, self.servoPin)
+        return self.S1_HUB
+
+    def right(self):
+        """!
+        State 3 handler: ultrasonic sensor servo to -90°.
+
+        @return (int): the next state, S1_HUB.
+        """
+        set_servo(-90, self.servoPin)
+        return self.S1_HUB
+
+    def left(self):
+        """!
+        State 4 handler: ultrasonic sensor servo to 90°.
+
+        @return (int): the next state, S1_HUB.
+        """
+        set_servo(90, self.servoPin)
+        return self.S1_HUB
+
 def set_servo(angle, servoPin):
     """!
     Sets the servo motor to a specific angle due to PWM signal.
@@ -7,6 +7,7 @@
 '''
 
 from pyb import Pin, udelay, micros
+from fsm import FSM
 
 class ULSTask:
     """!
@@ -25,10 +26,13 @@ class ULSTask:
         state (int): The current state of the ultrasonic sensor task.
         S0_INIT (int): State value representing initialization state.
         S1_READ (int): State value representing read state.
+        fsm (FSM): State machine with a handler for each state.
 
     Methods:
         __init__(self, ULS_DIS): Initializes the ULSTask instance.
         run(self): Runs the ultrasonic sensor task in a loop, handling initialization and reading of distance data.
+        init(self): State 0 handler, init the trigger and echo pins.
+        read(self): State 1 handler, read the distance.
     """
 
     def __init__(self, ULS_DIS):
@@ -65,6 +69,12 @@ class ULSTask:
         
         ## State 1: continuously read distance in [cm]
         self.S1_READ = 1
+        
+        ## State machine with a handler for each state
+        self.fsm = FSM('ULS_TASK', 2)
+        self.fsm.state(self.S0_INIT, 'INIT', self.init)
+        self.fsm.state(self.S1_READ, 'READ', self.read)
+        self.fsm.start(self.S0_INIT)
 
     def run(self):
         """
@@ -78,19 +88,27 @@ class ULSTask:
               
         """
         while True:
-            if self.state == self.S0_INIT:
-                trig_pin = Pin(Pin.cpu.B5, mode=Pin.OUT_PP)
-                echo_pin = Pin(Pin.cpu.B4, mode=Pin.IN)
-                self.state = self.S1_READ
+            self.state = self.fsm.step()
+            yield self.state
 
-            elif self.state == self.S1_READ:
-                self.ULS_DIS.put(dist(trig_pin, echo_pin))
-                self.state = self.S1_READ
+    def init(self):
+        """!
+        State 0 handler: init the ultrasonic sensor's trigger and echo pins.
 
-            else:
-                print("ULS_TASK Invalid State!!!")
+        @return (int): the next state, S1_READ.
+        """
+        ## Trigger pin of the ultrasonic sensor
+        self.trig_pin = Pin(Pin.cpu.B5, mode=Pin.OUT_PP)
+        
+        ## Echo pin of the ultrasonic sensor
+        self.echo_pin = Pin(Pin.cpu.B4, mode=Pin.IN)
+        return self.S1_READ
 
-            yield self.state
+    def read(self):
+        """!
+        State 1 handler: read the distance [cm] and update the ULS_DIS share.
+        """
+        self.ULS_DIS.put(dist(self.trig_pin, self.echo_pin))
 
 def dist(trig_pin, echo_pin):
     """!
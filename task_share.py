@@ -24,7 +24,9 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import array
 import gc
+import struct
 import pyb
+import utime
 import micropython
 
 
@@ -40,6 +42,27 @@ type_code_strings = {'b' : "int8",   'B' : "uint8",
                      'q' : "int64",  'Q' : "uint64",
                      'f' : "float",  'd' : "double"}
 
+## Result code returned when a queue transfer has been completed.
+OK = 0
+
+## Result code returned when there is nothing in a queue to be read.
+EMPTY = 1
+
+## Result code returned when there is no room in a queue for more data.
+FULL = 2
+
+## Result code returned when a waiting transfer gave up after its timeout.
+TIMEOUT = 3
+
+
+## The layout of each item's access counters in a @c pack_stats() snapshot:
+#  puts, gets, lost data, dropped data and wasted reads, as little-endian
+#  32 bit integers.
+STATS_FORMAT = '<LLLLL'
+
+## The number of bytes taken by each item in a @c pack_stats() snapshot.
+STATS_SIZE = struct.calcsize (STATS_FORMAT)
+
 
 def show_all ():
     """!
@@ -51,6 +74,40 @@ def show_all ():
     return '\n'.join (gen)
 
 
+def pack_stats (buf = None):
+    """!
+    Pack the access counters of every queue and share into a binary snapshot.
+
+    Each item in @c share_list takes @c STATS_SIZE bytes laid out as given
+    by @c STATS_FORMAT, in the order of @c share_list, so the snapshot can be
+    streamed over a serial link and matched up with the names printed by
+    @c show_all(). Passing in the same buffer each time avoids allocation:
+    @code
+    stats_buf = bytearray (task_share.STATS_SIZE * len (task_share.share_list))
+    ser.write (task_share.pack_stats (stats_buf))
+    @endcode
+    @param buf A @c bytearray of at least @c STATS_SIZE bytes per item, or
+           @c None to have one allocated
+    @return The buffer holding the snapshot
+    """
+    if buf is None:
+        buf = bytearray (STATS_SIZE * len (share_list))
+    offset = 0
+    for item in share_list:
+        struct.pack_into (STATS_FORMAT, buf, offset, item._puts, item._gets,
+                          item._lost, item._dropped, item._wasted)
+        offset += STATS_SIZE
+    return buf
+
+
+def reset_stats ():
+    """!
+    Reset the access counters of every queue and share to zero.
+    """
+    for item in share_list:
+        item.reset_stats ()
+
+
 # ============================================================================
 
 class BaseShare:
@@ -71,10 +128,79 @@ class BaseShare:
         self._type_code = type_code
         self._thread_protect = thread_protect
 
+        # Tasks whose go() methods are called when new data is put in
+        self._subscribers = []
+
+        # Access counters used to find tasks which poll too often or lose data
+        self.reset_stats ()
+
         # Add this queue to the global share and queue list
         share_list.append (self)
 
 
+    def subscribe (self, task):
+        """!
+        Ask for a task to be released whenever new data is put in.
+
+        Each time a @c put() changes the value of a share or adds an item to
+        a queue, the @c go() method of every subscribed task is called. A
+        task which only needs to act on new data can therefore be created
+        with @c period=None, so that it only runs when there's work to do:
+        @code
+        servo_task = cotask.Task (servo_fun, name='Servo', period=None)
+        direction.subscribe (servo_task)
+        @endcode
+        @param task The @c cotask.Task to be released when data arrives
+        """
+        if task not in self._subscribers:
+            self._subscribers.append (task)
+
+
+    def unsubscribe (self, task):
+        """!
+        Stop releasing a task when new data is put in.
+        @param task A @c cotask.Task which was given to @c subscribe()
+        """
+        if task in self._subscribers:
+            self._subscribers.remove (task)
+
+
+    def reset_stats (self):
+        """!
+        Reset the access counters to zero.
+
+        Five counters are kept: the number of items written, the number of
+        reads, the number of items lost (values overwritten before anyone read
+        them), the number of items dropped (turned away by a full queue which
+        can't be overwritten) and the number of wasted reads (reads which found
+        nothing new).
+        """
+        self._puts = 0
+        self._gets = 0
+        self._lost = 0
+        self._dropped = 0
+        self._wasted = 0
+
+
+    def _stats_str (self):
+        """!
+        Format the access counters for a diagnostic printout.
+        @return A string showing the puts, gets, lost, dropped and wasted
+                counts
+        """
+        return ' Put {:d} Get {:d} Lost {:d} Dropped {:d} Wasted {:d}'.format (
+                self._puts, self._gets, self._lost, self._dropped, self._wasted)
+
+
+    @micropython.native
+    def _notify (self):
+        """!
+        Release every subscribed task; called when new data has been put in.
+        """
+        for task in self._subscribers:
+            task.go ()
+
+
 # ============================================================================
 
 class Queue (BaseShare):
@@ -143,14 +269,22 @@ class Queue (BaseShare):
             else 'Queue' + str (Queue.ser_num)
         Queue.ser_num += 1
 
+        # Tasks which are waiting for data or for room; they're released by
+        # calling their go() methods when the queue changes
+        self._get_waiter = None
+        self._put_waiter = None
+
         # Allocate memory in which the queue's data will be stored
         try:
             self._buffer = array.array (type_code, range (size))
+            self._view = memoryview (self._buffer)
         except MemoryError:
             self._buffer = None
+            self._view = None
             raise
         except ValueError:
             self._buffer = None
+            self._view = None
             raise
 
         # Initialize pointers to be used for reading and writing data
@@ -180,19 +314,24 @@ class Queue (BaseShare):
         |               my_queue.put (create_something_to_put ())
         |           yield 0
         @endcode
+        In a cooperatively scheduled task, waiting here stops the scheduler,
+        so the task which would make room can never run; use @c try_put() or
+        @c wait_put() instead.
         @param item The item to be placed into the queue
         @param in_ISR Set this to @c True if calling from within an ISR
         """
         # If we're in an ISR and the queue is full and we're not allowed to
         # overwrite data, we have to give up and exit
         if self.full ():
-            if in_ISR:
+            if in_ISR and not self._overwrite:
+                self._dropped += 1
                 return
 
             # Wait (if needed) until there's room in the buffer for the data
             if not self._overwrite:
                 while self.full ():
                     pass
+        self._puts += 1
 
         # Prevent data corruption by blocking interrupts during data transfer
         if self._thread_protect and not in_ISR:
@@ -204,8 +343,10 @@ class Queue (BaseShare):
         if self._wr_idx >= self._size:
             self._wr_idx = 0
         self._num_items += 1
-        if self._num_items >= self._size:        # Can't be fuller than full
-            self._num_items = self._size
+        if self._num_items > self._size:         # Can't be fuller than full,
+            self._num_items = self._size         # so the oldest item is lost
+            self._rd_idx = self._wr_idx
+            self._lost += 1
         if self._num_items > self._max_full:     # Record maximum fillage
             self._max_full = self._num_items
 
@@ -213,6 +354,11 @@ class Queue (BaseShare):
         if self._thread_protect and not in_ISR:
             pyb.enable_irq (_irq_state)
 
+        # Release a task which is waiting for data to arrive, and subscribers
+        if self._get_waiter is not None:
+            self._get_waiter.go ()
+        self._notify ()
+
 
     @micropython.native
     def get (self, in_ISR = False):
@@ -233,6 +379,9 @@ class Queue (BaseShare):
         |           # More loop stuff
         |           yield 0
         @endcode
+        In a cooperatively scheduled task, waiting here stops the scheduler,
+        so the task which would supply the data can never run; use
+        @c try_get() or @c wait_get() instead.
         @param in_ISR Set this to @c True if calling from within an ISR
         """
         # Wait until there's something in the queue to be returned
@@ -245,6 +394,7 @@ class Queue (BaseShare):
 
         # Get the item to be returned from the queue
         to_return = self._buffer[self._rd_idx]
+        self._gets += 1
 
         # Move the read pointer and adjust the number of items in the queue
         self._rd_idx += 1
@@ -258,9 +408,327 @@ class Queue (BaseShare):
         if self._thread_protect and not in_ISR:
             pyb.enable_irq (irq_state)
 
+        # Release a task which is waiting for room in the queue
+        if self._put_waiter is not None:
+            self._put_waiter.go ()
+
         return (to_return)
 
 
+    def try_put (self, item, in_ISR = False):
+        """!
+        Put an item into the queue if there is room, without waiting.
+
+        A queue created with @c overwrite set to @c True always accepts the
+        item, clobbering the oldest data if it's full.
+        @param item The item to be placed into the queue
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return @c OK if the item was queued or @c FULL if there was no room
+        """
+        if self.full () and not self._overwrite:
+            return FULL
+        self.put (item, in_ISR)
+        return OK
+
+
+    def try_get (self, in_ISR = False):
+        """!
+        Read an item from the queue if there is one, without waiting.
+        @code
+        |   code, item = my_queue.try_get ()
+        |   if code == task_share.OK:
+        |       do_something_with (item)
+        @endcode
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return A tuple holding @c OK and the item, or @c EMPTY and @c None
+                if the queue was empty
+        """
+        if self.empty ():
+            self._wasted += 1
+            return (EMPTY, None)
+        return (OK, self.get (in_ISR))
+
+
+    def wait_get (self, timeout = None, task = None, state = None):
+        """!
+        Wait for an item without blocking other tasks, then read it.
+
+        This is a generator to be delegated to from a task's own generator
+        with @c yield @c from. While the queue is empty it yields, giving the
+        CPU back to the scheduler, and it resumes reading when data appears.
+        If @c task is given, that task's @c go() method is called when data
+        is put into the queue, so a task created with @c period=None is only
+        run again when there is something for it to read:
+        @code
+        |   def consumer (self):
+        |       while True:
+        |           code, item = yield from my_queue.wait_get (timeout=50)
+        |           if code == task_share.OK:
+        |               do_something_with (item)
+        |           yield self.state
+        @endcode
+        Timeouts are checked only when the waiting task runs, so they are
+        meaningful only for tasks which also run on a period.
+        @param timeout The longest time to wait in milliseconds, or @c None
+               to wait for as long as it takes
+        @param task The @c cotask.Task running the caller, to be released
+               when data arrives, or @c None if the task only runs on time
+        @param state The value yielded to the scheduler while waiting, which
+               shows up as the task's state in transition traces
+        @return A tuple holding @c OK and the item, or @c TIMEOUT and
+                @c None if the timeout expired first
+        """
+        if timeout is not None:
+            start = utime.ticks_ms ()
+        while True:
+            code, item = self.try_get ()
+            if code == OK:
+                self._get_waiter = None
+                return (code, item)
+            if timeout is not None \
+                    and utime.ticks_diff (utime.ticks_ms (), start) >= timeout:
+                self._get_waiter = None
+                return (TIMEOUT, None)
+            if task is not None:
+                self._get_waiter = task
+            yield state
+
+
+    def wait_put (self, item, timeout = None, task = None, state = None):
+        """!
+        Wait for room without blocking other tasks, then put an item.
+
+        This is the counterpart of @c wait_get() for producers; it yields to
+        the scheduler while the queue is full. If @c task is given, it is
+        released by a call to its @c go() method when an item is read out.
+        @code
+        |   code = yield from my_queue.wait_put (reading, timeout=20)
+        @endcode
+        @param item The item to be placed into the queue
+        @param timeout The longest time to wait in milliseconds, or @c None
+               to wait for as long as it takes
+        @param task The @c cotask.Task running the caller, to be released
+               when room appears, or @c None if the task only runs on time
+        @param state The value yielded to the scheduler while waiting
+        @return @c OK if the item was queued or @c TIMEOUT if the timeout
+                expired first
+        """
+        if timeout is not None:
+            start = utime.ticks_ms ()
+        while True:
+            if self.try_put (item) == OK:
+                self._put_waiter = None
+                return OK
+            if timeout is not None \
+                    and utime.ticks_diff (utime.ticks_ms (), start) >= timeout:
+                self._put_waiter = None
+                return TIMEOUT
+            if task is not None:
+                self._put_waiter = task
+            yield state
+
+
+    @micropython.native
+    def put_many (self, buf, in_ISR = False):
+        """!
+        Put a run of items into the queue with block copies.
+
+        The items are copied into the ring buffer with at most two slice
+        assignments, one up to the end of the buffer and one from its start
+        if the run wraps around. Each call allocates a few small
+        @c memoryview objects for the slices, which a hard ISR can't do.
+        Unlike @c put(), this method never waits. If
+        the queue was created with @c overwrite set to @c True, the oldest
+        data is clobbered to make room; otherwise only as many items as fit
+        are written and the rest are left in @c buf for the caller to retry:
+        @code
+        |   samples = array.array ('H', range (16))
+        |   written = my_queue.put_many (samples)
+        @endcode
+        @param buf An @c array.array of the queue's type code, or a
+               @c memoryview of one, holding the items to be queued
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The number of items which were placed into the queue
+        """
+        src = memoryview (buf)
+        count = len (src)
+
+        # Prevent data corruption by blocking interrupts during data transfer
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        # Work out how many items go in; when overwriting, only the newest
+        # items which fit into the whole buffer are worth copying, and the
+        # items which clobber unread ones or each other count as lost;
+        # otherwise the items which don't fit count as dropped
+        if self._overwrite:
+            self._puts += count
+            if self._num_items + count > self._size:
+                self._lost += self._num_items + count - self._size
+            if count > self._size:
+                src = src[count - self._size:]
+                count = self._size
+        else:
+            if count > self._size - self._num_items:
+                self._dropped += count - (self._size - self._num_items)
+                count = self._size - self._num_items
+            self._puts += count
+
+        # Copy up to the end of the buffer, then wrap around to its start
+        first = self._size - self._wr_idx
+        if first > count:
+            first = count
+        self._view[self._wr_idx:self._wr_idx + first] = src[:first]
+        if count > first:
+            self._view[:count - first] = src[first:count]
+
+        self._wr_idx += count
+        if self._wr_idx >= self._size:
+            self._wr_idx -= self._size
+        self._num_items += count
+        if self._num_items >= self._size:        # Oldest data was clobbered
+            self._num_items = self._size
+            self._rd_idx = self._wr_idx
+        if self._num_items > self._max_full:     # Record maximum fillage
+            self._max_full = self._num_items
+
+        # Re-enable interrupts
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        # Release a task which is waiting for data to arrive, and subscribers
+        if count:
+            if self._get_waiter is not None:
+                self._get_waiter.go ()
+            self._notify ()
+
+        return count
+
+
+    @micropython.native
+    def get_into (self, buf, in_ISR = False):
+        """!
+        Read a run of items from the queue into a caller-supplied buffer.
+
+        As many items as are available, up to the length of @c buf, are
+        copied out with at most two slice assignments and removed from the
+        queue. This method never waits, so a consumer can drain a whole burst
+        each time it runs into the same buffer. The items aren't copied one
+        at a time and no new buffer is made, but each call does allocate a
+        few small @c memoryview objects for the slices, which a hard ISR
+        can't do:
+        @code
+        |   burst = array.array ('H', range (16))
+        |   while True:
+        |       num = my_queue.get_into (burst)
+        |       process (burst, num)
+        |       yield 0
+        @endcode
+        @param buf An @c array.array of the queue's type code, or a
+               @c memoryview of one, into which items are copied
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The number of items which were copied into @c buf
+        """
+        dst = memoryview (buf)
+
+        # Prevent data corruption by blocking interrupts during data transfer
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        count = len (dst)
+        if count > self._num_items:
+            count = self._num_items
+        if count:
+            self._gets += count
+        else:
+            self._wasted += 1
+
+        # Copy up to the end of the buffer, then wrap around to its start
+        first = self._size - self._rd_idx
+        if first > count:
+            first = count
+        dst[:first] = self._view[self._rd_idx:self._rd_idx + first]
+        if count > first:
+            dst[first:count] = self._view[:count - first]
+
+        self._rd_idx += count
+        if self._rd_idx >= self._size:
+            self._rd_idx -= self._size
+        self._num_items -= count
+
+        # Re-enable interrupts
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        # Release a task which is waiting for room in the queue
+        if count and self._put_waiter is not None:
+            self._put_waiter.go ()
+
+        return count
+
+
+    @micropython.native
+    def peek_view (self):
+        """!
+        Get a zero-copy view of the oldest contiguous run of queued items.
+
+        The returned @c memoryview looks directly into the ring buffer, from
+        the oldest item up to either the newest item or the end of the
+        buffer, whichever comes first. Nothing is removed from the queue;
+        once the items have been used, call @c skip() with the number
+        consumed. If the data wraps around, a second call after @c skip()
+        returns the rest:
+        @code
+        |   view = my_queue.peek_view ()
+        |   send_somewhere (view)
+        |   my_queue.skip (len (view))
+        @endcode
+        The items aren't copied, but the view itself is a small object
+        allocated by each call. It is only valid until the queue is next
+        written, so it should be used and released within one run of the
+        consuming task.
+        @return A @c memoryview of the oldest contiguous items in the queue
+        """
+        count = self._size - self._rd_idx
+        if count > self._num_items:
+            count = self._num_items
+        return self._view[self._rd_idx:self._rd_idx + count]
+
+
+    @micropython.native
+    def skip (self, count, in_ISR = False):
+        """!
+        Remove up to @c count of the oldest items from the queue unread.
+
+        This is normally used after @c peek_view() to release the items which
+        have been consumed through the view.
+        @param count The number of items to be removed
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The number of items which were actually removed
+        """
+        # Prevent data corruption by blocking interrupts during the update
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        if count > self._num_items:
+            count = self._num_items
+        self._gets += count
+        self._rd_idx += count
+        if self._rd_idx >= self._size:
+            self._rd_idx -= self._size
+        self._num_items -= count
+
+        # Re-enable interrupts
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        # Release a task which is waiting for room in the queue
+        if count and self._put_waiter is not None:
+            self._put_waiter.go ()
+
+        return count
+
+
     @micropython.native
     def any (self):
         """!
@@ -324,10 +792,11 @@ class Queue (BaseShare):
         This method puts diagnostic information about the queue into a string.
 
         It shows the queue's name and type as well as the maximum number of
-        items and queue size. 
+        items and queue size, followed by the access counters. 
         """
         return ('{:<12s} Queue<{:s}> Max Full {:d}/{:d}'.format (self._name,
-                type_code_strings[self._type_code], self._max_full, self._size))
+                type_code_strings[self._type_code], self._max_full, self._size)
+                + self._stats_str ())
 
 
 # ============================================================================
@@ -354,12 +823,26 @@ class Share (BaseShare):
     # In another task, read data from the share
     something = my_share.get ()
     @endcode
+
+    A share created with @c timestamp set to @c True also records when it
+    was last written and counts its writes, so readers can tell how old and
+    how new the data is:
+    @code
+    distance = task_share.Share ('f', name="Distance", timestamp=True)
+
+    # In the reading task, only use data which is recent, and only redo
+    # calculations when something has been written since the last look
+    if distance.is_fresh (100000) and distance.changed_since (last_seq):
+        last_seq = distance.seq ()
+        recalculate (distance.get ())
+    @endcode
     """
     ## A counter used to give serial numbers to shares for diagnostic use.
     ser_num = 0
 
 
-    def __init__ (self, type_code, thread_protect = True, name = None):
+    def __init__ (self, type_code, thread_protect = True, name = None,
+                  timestamp = False):
         """!
         Create a shared data item used to transfer data between tasks.
 
@@ -382,12 +865,23 @@ class Share (BaseShare):
         @param thread_protect True if mutual exclusion protection is used
         @param name A short name for the share, default @c ShareN where @c N
                is a serial number for the share
+        @param timestamp @c True to record the time, from @c utime.ticks_us(),
+               and a sequence number each time the share is written
         """
         # First call the parent class initializer
         super ().__init__ (type_code, thread_protect, name)
 
         self._buffer = array.array (type_code, [0])
 
+        # Set when new data is put in and cleared when it's read, so that
+        # lost updates and wasted reads can be counted
+        self._unread = False
+
+        # Time of the last write and number of writes, if they're kept
+        self._timestamp = timestamp
+        self._stamp = utime.ticks_us ()
+        self._seq = 0
+
         self._name = str (name) if name != None \
             else 'Share' + str (Share.ser_num)
         Share.ser_num += 1
@@ -401,7 +895,8 @@ class Share (BaseShare):
         This method puts data into the share; any old data is overwritten.
         This code disables interrupts during the writing so as to prevent
         data corrupting by an interrupt service routine which might access
-        the same data.
+        the same data. If the new data differs from the old, any subscribed
+        tasks are released.
         @param data The data to be put into this share
         @param in_ISR Set this to True if calling from within an ISR
         """
@@ -410,12 +905,24 @@ class Share (BaseShare):
         if self._thread_protect and not in_ISR:
             irq_state = pyb.disable_irq ()
 
+        old = self._buffer[0]
         self._buffer[0] = data
+        self._puts += 1
+        if self._unread:
+            self._lost += 1
+        self._unread = True
+        if self._timestamp:
+            self._stamp = utime.ticks_us ()
+            self._seq += 1
 
         # Re-enable interrupts
         if self._thread_protect and not in_ISR:
             pyb.enable_irq (irq_state)
 
+        # Only a change in value releases subscribed tasks
+        if self._buffer[0] != old:
+            self._notify ()
+
 
     @micropython.native
     def get (self, in_ISR = False):
@@ -432,6 +939,10 @@ class Share (BaseShare):
             irq_state = pyb.disable_irq ()
 
         to_return = self._buffer[0]
+        self._gets += 1
+        if not self._unread:
+            self._wasted += 1
+        self._unread = False
 
         # Re-enable interrupts
         if self._thread_protect and not in_ISR:
@@ -440,13 +951,739 @@ class Share (BaseShare):
         return (to_return)
 
 
+    @micropython.native
+    def age_us (self):
+        """!
+        Find how long ago the share was last written.
+
+        This only works for shares created with @c timestamp set to @c True.
+        @return The time in microseconds since the last call to @c put()
+        """
+        return utime.ticks_diff (utime.ticks_us (), self._stamp)
+
+
+    @micropython.native
+    def is_fresh (self, max_age):
+        """!
+        Check whether the share holds recent data.
+
+        A share which has never been written is not fresh. This only works
+        for shares created with @c timestamp set to @c True.
+        @param max_age The greatest acceptable age in microseconds
+        @return @c True if the data was written within @c max_age
+        """
+        return (self._seq != 0
+                and utime.ticks_diff (utime.ticks_us (), self._stamp) <= max_age)
+
+
+    @micropython.native
+    def seq (self):
+        """!
+        Get the number of times the share has been written.
+
+        This only counts for shares created with @c timestamp set to @c True.
+        @return The sequence number of the latest write
+        """
+        return self._seq
+
+
+    @micropython.native
+    def changed_since (self, seq):
+        """!
+        Check whether the share has been written since a given write.
+        @param seq A sequence number previously returned by @c seq()
+        @return @c True if there has been at least one write since then
+        """
+        return self._seq != seq
+
+
     def __repr__ (self):
         """!
         Puts diagnostic information about the share into a string.
 
-        Shares are pretty simple, so we just put the name and type. 
+        Shares are pretty simple, so we just put the name and type, followed
+        by the access counters. 
         """
         return ("{:<12s} Share<{:s}>".format (self._name,
-                type_code_strings[self._type_code]))
+                type_code_strings[self._type_code]) + self._stats_str ())
+
+
+# ============================================================================
+
+class RecordShare (BaseShare):
+    """!
+    A group of related values which are shared between tasks as one record.
+
+    The fields are laid out as for the Python @c struct module in a single
+    buffer which is allocated when the share is created. A writer publishes
+    every field in one call to @c put(), and readers always get a consistent
+    snapshot of all of them. Consistency comes from a sequence counter which
+    is odd while a write is under way: a reader which sees the counter change
+    while it was copying the data simply copies it again. Readers therefore
+    never need to disable interrupts, even if the writer is an interrupt
+    service routine.
+
+    An example of the creation and use of a record share is as follows:
+    @code
+    import task_share
+
+    # This share holds three floats for a robot's pose
+    pose = task_share.RecordShare ('fff', ('x', 'y', 'yaw'), name="Pose")
+
+    # Somewhere in one task, publish all of the fields at once
+    pose.put (x, y, yaw)
+
+    # In another task, read a snapshot into the attributes of any object
+    pose.get_into (self)
+    print (self.x, self.y, self.yaw)
+    @endcode
+    """
+    ## A counter used to give serial numbers to record shares for diagnostics.
+    ser_num = 0
+
+
+    def __init__ (self, fmt, fields, thread_protect = False, name = None):
+        """!
+        Create a record share with the given layout and field names.
+
+        @param fmt A @c struct format string giving the type of each field,
+               such as @c 'fffL' for three floats and an unsigned long
+        @param fields A tuple of names, one for each field in @c fmt, which
+               are used as attribute names by @c get_into()
+        @param thread_protect @c True if interrupts should be disabled while
+               the record is written, which is only needed if there may be
+               more than one writer
+        @param name A short name for the share, default @c RecordN where
+               @c N is a serial number for the share
+        """
+        # First call the parent class initializer
+        super ().__init__ (fmt, thread_protect, name)
+
+        self._fields = tuple (fields)
+        self._buffer = bytearray (struct.calcsize (fmt))
+        if len (struct.unpack_from (fmt, self._buffer, 0)) != len (self._fields):
+            raise ValueError ('Record format and field names do not match')
+
+        # Sequence counter; it's odd while a write is in progress
+        self._seq = 0
+
+        # Sequence number of the last snapshot read, to count wasted reads
+        self._read_seq = 0
+
+        self._name = str (name) if name != None \
+            else 'Record' + str (RecordShare.ser_num)
+        RecordShare.ser_num += 1
+
+
+    def put (self, *values, in_ISR = False):
+        """!
+        Write all the fields of the record in one operation.
+
+        Every write releases the subscribed tasks, as comparing whole records
+        would cost about as much as the subscribers reading them.
+
+        @param values The field values, in the order given by the format
+        @param in_ISR Set this to @c True if calling from within an ISR
+        """
+        # Check the values before the sequence goes odd, so a bad call can't
+        # leave readers waiting for a write which never ends
+        if len (values) != len (self._fields):
+            raise ValueError ('Record put needs one value per field')
+
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        # If packing fails anyway, such as for a value out of range, the
+        # sequence is still made even and interrupts turned back on
+        self._seq += 1
+        try:
+            struct.pack_into (self._type_code, self._buffer, 0, *values)
+            self._puts += 1
+            if self._read_seq != self._seq - 1:
+                self._lost += 1
+        finally:
+            self._seq += 1
+            if self._thread_protect and not in_ISR:
+                pyb.enable_irq (irq_state)
+
+        self._notify ()
+
+
+    def get_into (self, obj):
+        """!
+        Read a consistent snapshot of the record into an existing object.
+
+        Each field is stored in the attribute of @c obj which has the field's
+        name, so no new object is needed to hold the result. This method must
+        not be called from an interrupt service routine which might interrupt
+        the writer, as it would then wait forever for the write to finish.
+        @param obj The object whose attributes receive the field values
+        @return The sequence number of the snapshot which was read
+        """
+        while True:
+            seq = self._seq
+            if seq & 1:
+                continue
+            values = struct.unpack_from (self._type_code, self._buffer, 0)
+            if self._seq == seq:
+                break
+
+        self._gets += 1
+        if seq == self._read_seq:
+            self._wasted += 1
+        self._read_seq = seq
+
+        idx = 0
+        for field in self._fields:
+            setattr (obj, field, values[idx])
+            idx += 1
+        return seq
+
+
+    @micropython.native
+    def seq (self):
+        """!
+        Get the sequence number of the record, which changes with each write.
 
+        A reader can compare this with the number returned by @c get_into()
+        to find out cheaply whether there is anything new to read.
+        @return The current sequence number
+        """
+        return self._seq
+
+
+    def __repr__ (self):
+        """!
+        Puts diagnostic information about the record share into a string.
+
+        It shows the share's name, its layout and its field names.
+        """
+        return ("{:<12s} Record<{:s}> {:s}".format (self._name,
+                self._type_code, ','.join (self._fields)) + self._stats_str ())
+
+
+# ============================================================================
+
+class StructQueue (BaseShare):
+    """!
+    A queue of fixed-size records, each holding several fields.
+
+    Where a @c Queue holds one number per item, a @c StructQueue holds
+    records laid out as for the Python @c struct module, so all the fields
+    of a sample travel together and can't drift out of step as they would in
+    parallel queues. The records are stored in one @c bytearray ring buffer
+    which is allocated when the queue is created, and each record is packed
+    straight into its slot in the ring.
+
+    The queue is safe for one producer running in an interrupt service
+    routine. When a full queue is overwritten, @c put() packs the new record
+    into the slot of the oldest one, so it does so with interrupts disabled,
+    and the readers unpack or copy records with interrupts disabled as well;
+    a record can't be torn by a producer in an ISR writing over it while it
+    is being read. Calls to @c put() with up to eight positional fields don't
+    allocate memory themselves, but on most ports creating a @c float does,
+    so a producer in an ISR should only put integer fields.
+
+    An example of the creation and use of a record queue is as follows:
+    @code
+    import task_share
+
+    # Each record holds a time stamp, two wheel speeds and two duty cycles
+    speeds = task_share.StructQueue ('Lffff', 100,
+                                     ('t', 'wL', 'wR', 'duty_L', 'duty_R'),
+                                     overwrite=True, name="Wheel Log")
+
+    # Somewhere in one task, put a record into the queue
+    speeds.put (utime.ticks_ms (), wL, wR, duty_L, duty_R)
+
+    # In another task, read a record into the attributes of an object
+    if speeds.get_into (sample) == task_share.OK:
+        print (sample.t, sample.wL, sample.wR)
+    @endcode
+    """
+    ## A counter used to give serial numbers to record queues for diagnostics.
+    ser_num = 0
+
+    ## The greatest number of fields which a record may have.
+    MAX_FIELDS = 8
+
+
+    def __init__ (self, fmt, size, fields = None, thread_protect = True,
+                  overwrite = False, name = None):
+        """!
+        Initialize a record queue with the given layout and length.
+
+        @param fmt A @c struct format string giving the type of each field,
+               such as @c 'Lffff' for an unsigned long and four floats
+        @param size The maximum number of records which the queue can hold
+        @param fields A tuple of names, one for each field in @c fmt, which
+               are used as attribute names by @c get_into(); if @c None,
+               @c get_into() fills in a list instead
+        @param thread_protect @c True if interrupts should be disabled while
+               the consumer updates the queue, which is needed if the
+               producer runs in an interrupt service routine
+        @param overwrite If @c True, the oldest records are overwritten with
+               new ones if the queue becomes full
+        @param name A short name for the queue, default @c StructQueueN
+               where @c N is a serial number for the queue
+        """
+        # First call the parent class initializer
+        super ().__init__ (fmt, thread_protect, name)
+
+        self._rsize = struct.calcsize (fmt)
+        self._size = size
+        self._overwrite = overwrite
+        self._num_fields = len (struct.unpack_from (fmt, bytes (self._rsize)))
+        if self._num_fields > StructQueue.MAX_FIELDS:
+            raise ValueError ('Too many fields in record queue format')
+        if fields is not None and len (fields) != self._num_fields:
+            raise ValueError ('Record format and field names do not match')
+        self._fields = tuple (fields) if fields is not None else None
+
+        self._name = str (name) if name != None \
+            else 'StructQueue' + str (StructQueue.ser_num)
+        StructQueue.ser_num += 1
+
+        # Tasks which are waiting for data; released as for a Queue
+        self._get_waiter = None
+
+        # Allocate memory in which the records will be stored
+        self._buffer = bytearray (self._rsize * size)
+        self._view = memoryview (self._buffer)
+
+        # Initialize pointers to be used for reading and writing data
+        self.clear ()
+
+        # Since we may have allocated a bunch of memory, call the garbage
+        # collector to neaten up what memory is left for future use
+        gc.collect ()
+
+
+    def put (self, f0 = 0, f1 = 0, f2 = 0, f3 = 0, f4 = 0, f5 = 0, f6 = 0,
+             f7 = 0, in_ISR = False):
+        """!
+        Pack one record straight into the queue.
+
+        The fields are given as positional parameters in the order of the
+        format string. They're not gathered into a tuple, so this method can
+        be called from an interrupt service routine. It never waits; if the
+        queue is full and can't be overwritten, the record is dropped.
+        @param f0 The first field; @c f1 to @c f7 are the others, as needed
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return @c OK if the record was queued or @c FULL if it was dropped
+        """
+        protect = self._thread_protect and not in_ISR
+        if protect:
+            irq_state = pyb.disable_irq ()
+
+        full = self._num_items >= self._size
+        if full and not self._overwrite:
+            if protect:
+                pyb.enable_irq (irq_state)
+            self._dropped += 1
+            return FULL
+        self._puts += 1
+
+        # A free slot can't be in use by a reader, so it's packed with
+        # interrupts on; the slot of the oldest record being overwritten is
+        # packed with them still off
+        if protect and not full:
+            pyb.enable_irq (irq_state)
+
+        # Pack the fields into the slot at the write pointer
+        fmt = self._type_code
+        buf = self._buffer
+        off = self._wr_idx * self._rsize
+        num = self._num_fields
+        if num == 1:
+            struct.pack_into (fmt, buf, off, f0)
+        elif num == 2:
+            struct.pack_into (fmt, buf, off, f0, f1)
+        elif num == 3:
+            struct.pack_into (fmt, buf, off, f0, f1, f2)
+        elif num == 4:
+            struct.pack_into (fmt, buf, off, f0, f1, f2, f3)
+        elif num == 5:
+            struct.pack_into (fmt, buf, off, f0, f1, f2, f3, f4)
+        elif num == 6:
+            struct.pack_into (fmt, buf, off, f0, f1, f2, f3, f4, f5)
+        elif num == 7:
+            struct.pack_into (fmt, buf, off, f0, f1, f2, f3, f4, f5, f6)
+        else:
+            struct.pack_into (fmt, buf, off, f0, f1, f2, f3, f4, f5, f6, f7)
+
+        # Prevent data corruption by blocking interrupts while the counts and
+        # pointers are advanced; the record is only visible after this
+        if protect and not full:
+            irq_state = pyb.disable_irq ()
+
+        self._wr_idx += 1
+        if self._wr_idx >= self._size:
+            self._wr_idx = 0
+        self._num_items += 1
+        if self._num_items > self._size:         # The oldest record is lost
+            self._num_items = self._size
+            self._rd_idx = self._wr_idx
+            self._lost += 1
+        if self._num_items > self._max_full:     # Record maximum fillage
+            self._max_full = self._num_items
+
+        if protect:
+            pyb.enable_irq (irq_state)
+
+        # Release a task which is waiting for data to arrive, and subscribers
+        if self._get_waiter is not None:
+            self._get_waiter.go ()
+        self._notify ()
+        return OK
+
+
+    def get_into (self, obj, in_ISR = False):
+        """!
+        Read the oldest record from the queue into an existing object.
+
+        If field names were given when the queue was created, each field is
+        stored in the attribute of @c obj which has that name; otherwise
+        @c obj must be a list with a slot for each field. This method never
+        waits.
+        @param obj The object or list which receives the field values
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return @c OK if a record was read or @c EMPTY if there was none
+        """
+        # The record is unpacked with interrupts disabled, so a producer in
+        # an ISR overwriting a full queue can't change it half way through
+        protect = self._thread_protect and not in_ISR
+        if protect:
+            irq_state = pyb.disable_irq ()
+
+        if self._num_items <= 0:
+            if protect:
+                pyb.enable_irq (irq_state)
+            self._wasted += 1
+            return EMPTY
+
+        values = struct.unpack_from (self._type_code, self._buffer,
+                                     self._rd_idx * self._rsize)
+        self._advance (1)
+
+        if protect:
+            pyb.enable_irq (irq_state)
+
+        if self._fields is not None:
+            idx = 0
+            for field in self._fields:
+                setattr (obj, field, values[idx])
+                idx += 1
+        else:
+            for idx in range (self._num_fields):
+                obj[idx] = values[idx]
+        return OK
+
+
+    def drain_into (self, buf, in_ISR = False):
+        """!
+        Copy as many whole records as fit into a buffer, removing them.
+
+        The raw packed records are copied with at most two slice assignments,
+        so a consumer can move a whole burst to a file or serial port in one
+        go. The records can be unpacked later with @c struct.unpack_from()
+        using the queue's format and @c record_size().
+        @param buf A @c bytearray or @c memoryview which receives the records
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The number of records which were copied
+        """
+        dst = memoryview (buf)
+
+        # The records are copied with interrupts disabled, as in get_into()
+        protect = self._thread_protect and not in_ISR
+        if protect:
+            irq_state = pyb.disable_irq ()
+
+        count = len (dst) // self._rsize
+        if count > self._num_items:
+            count = self._num_items
+        if count == 0:
+            if protect:
+                pyb.enable_irq (irq_state)
+            self._wasted += 1
+            return 0
+
+        # Copy up to the end of the ring, then wrap around to its start
+        first = self._size - self._rd_idx
+        if first > count:
+            first = count
+        start = self._rd_idx * self._rsize
+        nbytes = first * self._rsize
+        dst[:nbytes] = self._view[start:start + nbytes]
+        if count > first:
+            dst[nbytes:count * self._rsize] = \
+                self._view[:(count - first) * self._rsize]
+        self._advance (count)
+
+        if protect:
+            pyb.enable_irq (irq_state)
+        return count
+
+
+    def _advance (self, count):
+        """!
+        Remove records which have been read from the queue. The caller must
+        have interrupts disabled if the queue is thread protected.
+        @param count The number of records to be removed
+        """
+        self._rd_idx += count
+        if self._rd_idx >= self._size:
+            self._rd_idx -= self._size
+        self._num_items -= count
+        self._gets += count
+
+
+    @micropython.native
+    def record_size (self):
+        """!
+        Get the number of bytes in each record.
+        @return The size of one packed record in bytes
+        """
+        return self._rsize
+
+
+    @micropython.native
+    def any (self):
+        """!
+        Check if there are any records in the queue.
+        @return @c True if records are in the queue, @c False if not
+        """
+        return (self._num_items > 0)
+
+
+    @micropython.native
+    def full (self):
+        """!
+        Check if the queue is full.
+        @return @c True if the queue is full
+        """
+        return (self._num_items >= self._size)
+
+
+    @micropython.native
+    def num_in (self):
+        """!
+        Check how many records are in the queue.
+        @return The number of records in the queue
+        """
+        return (self._num_items)
+
+
+    def clear (self):
+        """!
+        Remove all contents from the queue.
+        """
+        self._rd_idx = 0
+        self._wr_idx = 0
+        self._num_items = 0
+        self._max_full = 0
+
+
+    def __repr__ (self):
+        """!
+        This method puts diagnostic information about the queue into a string.
 
+        It shows the queue's name and record layout as well as the maximum
+        number of records and queue size, followed by the access counters.
+        """
+        return ('{:<12s} StructQueue<{:s}> Max Full {:d}/{:d}'.format (
+                self._name, self._type_code, self._max_full, self._size)
+                + self._stats_str ())
+
+
+# ============================================================================
+
+class FrameShare (BaseShare):
+    """!
+    A double-buffered array which passes whole frames of data between tasks.
+
+    Multi-sample sensor data, such as several readings from each of a row
+    of sensors, is too big to pass through a @c Share and would be copied an
+    element at a time through a @c Queue. A frame share holds two arrays of
+    the same size. The producer fills the back array in place and then calls
+    @c publish(), which just swaps the roles of the two arrays. Consumers
+    read the front array through a @c memoryview, so frames are never copied
+    and a consumer never sees a frame which is only partly written.
+
+    An example of the creation and use of a frame share is as follows:
+    @code
+    import task_share
+
+    # Each frame holds 6 channels of 4 unsigned 16 bit samples
+    scans = task_share.FrameShare ('H', 24, name="Line Scan")
+
+    # In the producing task or ISR, fill the back buffer and publish it
+    frame = scans.back ()
+    for idx in range (24):
+        frame[idx] = adc_reading (idx)
+    scans.publish ()
+
+    # In the consuming task, look at the newest complete frame
+    if scans.changed_since (last_seq):
+        frame, last_seq = scans.front ()
+        process (frame)
+    @endcode
+
+    The front view should be treated as read-only, as MicroPython can't
+    enforce that. It stays valid until the producer publishes again, which
+    is after the consumer's run in a cooperatively scheduled system; if the
+    producer is an ISR, a consumer can pass the sequence number returned by
+    @c front() to @c still_valid() after using a frame to check that the
+    frame wasn't overwritten while being used.
+    """
+    ## A counter used to give serial numbers to frame shares for diagnostics.
+    ser_num = 0
+
+
+    def __init__ (self, type_code, length, name = None):
+        """!
+        Create a frame share holding two arrays of the given type and length.
+
+        @param type_code The type of the array elements, as for @c Share
+        @param length The number of elements in each frame
+        @param name A short name for the share, default @c FrameN where @c N
+               is a serial number for the share
+        """
+        # First call the parent class initializer
+        super ().__init__ (type_code, False, name)
+
+        self._length = length
+        self._frames = (array.array (type_code, [0] * length),
+                        array.array (type_code, [0] * length))
+        self._views = (memoryview (self._frames[0]),
+                       memoryview (self._frames[1]))
+
+        # Index of the front frame, number of frames published, the time of
+        # the last publication, and the number of the last frame read
+        self._front = 0
+        self._seq = 0
+        self._stamp = utime.ticks_us ()
+        self._read_seq = 0
+
+        self._name = str (name) if name != None \
+            else 'Frame' + str (FrameShare.ser_num)
+        FrameShare.ser_num += 1
+
+        # Since we may have allocated a bunch of memory, call the garbage
+        # collector to neaten up what memory is left for future use
+        gc.collect ()
+
+
+    @micropython.native
+    def back (self):
+        """!
+        Get the back array, which the producer fills in before publishing.
+        @return The @c array.array which will become the next frame
+        """
+        return self._frames[1 - self._front]
+
+
+    @micropython.native
+    def publish (self, in_ISR = False):
+        """!
+        Make the back array the newest complete frame, in constant time.
+
+        The swap is a single store, so it's safe in an interrupt service
+        routine and needs no interrupt protection.
+        @param in_ISR Set this to @c True if calling from within an ISR
+        """
+        self._front = 1 - self._front
+        self._seq += 1
+        self._stamp = utime.ticks_us ()
+        self._puts += 1
+        if self._read_seq != self._seq - 1:
+            self._lost += 1
+        self._notify ()
+
+
+    @micropython.native
+    def front (self, in_ISR = False):
+        """!
+        Get a view of the newest complete frame, without copying it, and
+        its sequence number.
+
+        The front index and the sequence number are read together with
+        interrupts disabled, so a producer in an ISR can't publish between
+        the two reads and the number always belongs to the frame returned.
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return A tuple holding a @c memoryview of the front frame and its
+                sequence number
+        """
+        if not in_ISR:
+            irq_state = pyb.disable_irq ()
+        seq = self._seq
+        view = self._views[self._front]
+        if not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        self._gets += 1
+        if self._read_seq == seq:
+            self._wasted += 1
+        self._read_seq = seq
+        return (view, seq)
+
+
+    @micropython.native
+    def seq (self):
+        """!
+        Get the number of frames which have been published.
+        @return The sequence number of the front frame
+        """
+        return self._seq
+
+
+    @micropython.native
+    def changed_since (self, seq):
+        """!
+        Check whether a frame has been published since a given one.
+        @param seq A sequence number previously returned by @c seq()
+        @return @c True if there is a newer frame
+        """
+        return self._seq != seq
+
+
+    @micropython.native
+    def still_valid (self, seq):
+        """!
+        Check that the frame with a given number hasn't been reused yet.
+
+        After a frame is replaced its array becomes the back buffer, which
+        the producer may start writing over at any time.
+        @param seq The sequence number of the frame which was read
+        @return @c True if that frame is still the front frame
+        """
+        return self._seq == seq
+
+
+    @micropython.native
+    def age_us (self):
+        """!
+        Find how long ago the front frame was published.
+        @return The time in microseconds since the last @c publish()
+        """
+        return utime.ticks_diff (utime.ticks_us (), self._stamp)
+
+
+    def __len__ (self):
+        """!
+        Get the number of elements in each frame.
+        @return The frame length given when the share was created
+        """
+        return self._length
+
+
+    def __repr__ (self):
+        """!
+        Puts diagnostic information about the frame share into a string.
+
+        It shows the share's name, type and frame length, followed by the
+        access counters.
+        """
+        return ("{:<12s} Frame<{:s}>[{:d}]".format (self._name,
+                type_code_strings[self._type_code], self._length)
+                + self._stats_str ())
@@ -0,0 +1,103 @@
+"""!
+@file host_stubs.py
+This file installs stand-ins for the MicroPython modules pyb, utime and micropython so the ROMI
+modules can be imported and checked on a PC with CPython. Nothing here drives any hardware.
+"""
+
+import os
+import sys
+import time
+import types
+
+## Folder of the ROMI source files, one up from this one
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _AnyMeta(type):
+    def __getattr__(cls, name):
+        return _Any()
+
+
+class _Any(metaclass=_AnyMeta):
+    """!
+    Object that accepts any constructor arguments, attribute or call, for the pyb peripherals.
+    """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return _Any()
+
+    def __call__(self, *args, **kwargs):
+        return _Any()
+
+
+class ADC:
+    """!
+    Stand-in ADC that reads value, with the timed multi-channel read of the pyboard.
+    """
+    def __init__(self, pin):
+        self.pin = pin
+        self.value = 4095
+
+    def read(self):
+        return self.value
+
+    @staticmethod
+    def read_timed_multi(adcs, bufs, timer):
+        for adc, buf in zip(adcs, bufs):
+            for i in range(len(buf)):
+                buf[i] = adc.read()
+        return True
+
+
+def _ticks_us():
+    return int(time.perf_counter() * 1000000) & 0x3FFFFFFF
+
+
+def _ticks_ms():
+    return _ticks_us() // 1000
+
+
+def _ticks_diff(a, b):
+    d = (a - b) & 0x3FFFFFFF
+    return d - 0x40000000 if d >= 0x20000000 else d
+
+
+def _ticks_add(a, b):
+    return (a + b) & 0x3FFFFFFF
+
+
+def install():
+    """!
+    Put the stand-in modules in sys.modules, unless the real ones are there, and the ROMI folder on sys.path.
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    if 'pyb' not in sys.modules:
+        pyb = types.ModuleType('pyb')
+        for name in ('Pin', 'Timer', 'ExtInt', 'I2C', 'UART'):
+            setattr(pyb, name, type(name, (_Any,), {}))
+        pyb.ADC = ADC
+        pyb.disable_irq = lambda: 0
+        pyb.enable_irq = lambda state=0: None
+        pyb.udelay = lambda us: None
+        pyb.micros = _ticks_us
+        pyb.millis = _ticks_ms
+        sys.modules['pyb'] = pyb
+    if 'utime' not in sys.modules:
+        utime = types.ModuleType('utime')
+        utime.ticks_us = _ticks_us
+        utime.ticks_ms = _ticks_ms
+        utime.ticks_diff = _ticks_diff
+        utime.ticks_add = _ticks_add
+        utime.sleep_ms = lambda ms: time.sleep(ms / 1000)
+        utime.sleep_us = lambda us: time.sleep(us / 1000000)
+        sys.modules['utime'] = utime
+    if 'micropython' not in sys.modules:
+        micropython = types.ModuleType('micropython')
+        micropython.native = lambda f: f
+        micropython.viper = lambda f: f
+        micropython.const = lambda x: x
+        micropython.schedule = lambda f, arg: f(arg)
+        sys.modules['micropython'] = micropython
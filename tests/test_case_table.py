@@ -0,0 +1,320 @@
+"""!
+@file test_case_table.py
+This file checks the table driven line sensor decision path of task_MOT.py against the original chained
+comparisons, for all 64 sensor masks and every case, and times both on the host.
+
+Run it with pytest, or run it on its own to also print the timing:
+
+    python -m pytest -q tests/test_case_table.py
+    python tests/test_case_table.py
+"""
+
+import time
+import host_stubs
+host_stubs.install()
+
+import task_MOT
+from task_MOT import CASE_TABLE, CASE_NAMES, CASE_EXPLORE, CASE_WL, CASE_WR, check_sensor, update_speed, sensor_mask, \
+                     BIT_L2, BIT_L1, BIT_M, BIT_R1, BIT_R2, BIT_H, LINE_THRESHOLD, H_THRESHOLD
+
+# ---------------------------------------------------------------------------------------------------------------
+# The original check_sensor(), update_speed() and DC_speed_cal() of task_MOT.py, before the case table, kept
+# here unchanged as the reference.
+# ---------------------------------------------------------------------------------------------------------------
+
+def baseline_check_sensor(L2, L1, M, R1, R2, H):
+    
+    """!
+    Read the status from 6 line sensors determine what case for ROMI.
+
+    @param L2 (float): far left line sensor reading 
+    @param R2 (float): far right line sensor reading 
+    @param L1 (float): close left line sensor reading 
+    @param R1 (float): close right line sensor reading 
+    @param M (float): close middle line sensor reading 
+    @param H (float): far middle line sensor reading 
+
+    @return (string): case that ROMI DC motor need to run .
+    
+    """
+    
+    if L2 < 2000 and L1 < 2000 and M < 2000 and R1 < 2000 and R2 < 2000:
+        return "cross"
+    elif L2 < 2000 and L1 < 2000 and M < 2000:
+        return "90 left"
+    elif M < 2000 and R1 < 2000 and R2 < 2000:
+        return "90 right"
+    elif L2 < 2000 and L1 < 2000:
+        return "hard left"
+    elif R2 < 2000 and R1 < 2000:
+        return "hard right"
+    elif L2 < 2000:
+        return "really hard left"
+    elif R2 < 2000:
+        return "really hard right"
+    elif L1 < 2000:
+        return "solf left"
+    elif R1 < 2000:
+        return "solf right"
+
+    elif M < 2000 and H > 500:
+        return "straight fast"
+    
+    elif M < 2000 or H > 500:
+        return "straight"
+
+    elif L2 > 2000 and L1 > 2000 and M > 2000 and R1 > 2000 and R2 > 2000 and H < 500:
+        return "explore"
+    elif L2 > 2000 and L1 > 2000 and M > 2000 and R1 > 2000 and R2 > 2000 and H < 500:
+        return "stop"
+    else:
+        return "stop"
+    
+def baseline_update_speed(case):
+    
+    """!
+    Read input case, then decide ROMI yaw rate and linear speed then run DC_speed_cal() function below to find angular speeds of both wheels
+    For the scope of this project, ROMI will have only 19 case including:
+        
+         CASE                   DESCRIPTION
+         
+        cross               reading the cross pattern    
+        
+        90° turn            90° turn left or right
+        
+        really hard turn    really hard turn left or right
+        
+        hard turn           hard turn left or right
+        
+        soft turn           soft turn left or right
+        
+        straight            going foward
+        
+        backup              going backward
+        
+        explore             exploring mode
+        
+        pivot               pivot left or right
+        
+        wall                turn to stay away from the wall
+        
+        stop                stop
+        
+        done                done and celebrate by pivoting
+
+    @param case (string): input case that ROMI need to run.
+    
+    @return wL (float): left wheel angular velocity (rad/s).
+    @return wR (float): right wheel angular velocity (rad/s).
+    
+    """
+    
+    v          = 0       
+    v_stop     = 0
+    v_pivot    = 0
+    v_wall1    = 0.125
+    v_wall2    = 0.225
+    v_90       = 0.125
+    v_rhard    = 0.1
+    v_hard     = 0.125
+    v_straight = 0.25
+    v_straightf= 0.3
+    v_solf     = 0.2
+    v_done     = 0
+    
+    y          = 0  
+    y_stop     = 0
+    y_pivot    = 1
+    y_wall     = 1.2
+    y_straight = 0
+    y_straightf= 0
+    y_90       = 2.5
+    y_rhard    = 2.25
+    y_hard     = 2
+    y_solf     = 1
+    y_done     = 2
+    
+    if case == "cross":
+        v = v_straight   
+        y = y_straight
+    elif case == "90 left":
+        v = v_90
+        y = y_90
+    elif case == "90 right":
+        v = v_90
+        y = -y_90
+    elif case == "really hard left":
+        v = v_rhard
+        y = y_rhard 
+    elif case == "really hard right":
+        v = v_rhard 
+        y = -y_rhard
+    elif case == "hard left":
+        v = v_hard
+        y = y_hard
+    elif case == "hard right":
+        v = v_hard
+        y = -y_hard
+    elif case == "solf left":
+        v = v_solf
+        y = y_solf
+    elif case == "solf right":
+        v = v_solf
+        y = -y_solf
+    elif case == "straight fast":
+        v = v_straightf
+        y = y_straightf
+    elif case == "straight":
+        v = v_straight
+        y = y_straight
+    elif case == "backup":
+        v = -v_straight
+        y = y_straight        
+    elif case == "explore":
+        v = v_straight
+        y = y_straight
+    elif case == "pivot left":
+        v = v_pivot
+        y = y_pivot
+    elif case == "pivot right":
+        v = v_pivot
+        y = -y_pivot
+    elif case == "wall1":
+        v = v_wall1
+        y = y_wall
+    elif case == "wall2":
+        v = v_wall2
+        y = -y_wall
+    elif case == "stop":
+        v = v_stop
+        y = y_stop
+    elif case == "done":
+        v = v_done
+        y = y_done
+    else:
+        v = v_stop
+        y = y_stop
+        
+    wR, wL = baseline_DC_speed_cal(y, v)
+    return wL, wR
+
+def baseline_DC_speed_cal(y, v):
+    
+    """!
+    Take the require yaw rate and linear speed then calculate angular speeds for both left and right wheels
+
+    @param y (float): require yaw rate (rad/s)
+    @param v (float): require linear speed (m/s)
+    
+    @return wL (float): left wheel angular velocity (rad/s).
+    @return wR (float): right wheel angular velocity (rad/s).
+    
+    """
+    
+    rW = 0.035
+    rR = 0.075
+    wL = (v - rR*y)/rW
+    wR = (v + rR*y)/rW
+    return wR, wL
+
+
+# ---------------------------------------------------------------------------------------------------------------
+
+## OSOYOO reading on the line and off it, TCRT5000 reading on the line and off it
+ON, OFF, H_ON, H_OFF = 1000, 3500, 900, 100
+
+
+def readings(mask):
+    """!
+    Sensor readings (L2, L1, M, R1, R2, H) that threshold to a mask, well clear of the thresholds.
+    """
+    return (ON if mask & BIT_L2 else OFF,
+            ON if mask & BIT_L1 else OFF,
+            ON if mask & BIT_M else OFF,
+            ON if mask & BIT_R1 else OFF,
+            ON if mask & BIT_R2 else OFF,
+            H_ON if mask & BIT_H else H_OFF)
+
+
+def baseline_case(mask):
+    """!
+    Case name the original check_sensor() gives for a mask.
+    """
+    return baseline_check_sensor(*readings(mask))
+
+
+def test_sensor_mask_round_trip():
+    for mask in range(64):
+        assert sensor_mask(*readings(mask)) == mask
+
+
+def test_all_masks_match_baseline():
+    for mask in range(64):
+        assert CASE_NAMES[check_sensor(*readings(mask))] == baseline_case(mask), mask
+        assert CASE_NAMES[CASE_TABLE[mask]] == baseline_case(mask), mask
+
+
+def test_wheel_speeds_match_baseline():
+    for code, name in enumerate(CASE_NAMES):
+        if name == "steer":
+            # CASE_STEER has no string case, its speed comes from v_cmd and y_cmd
+            continue
+        wL, wR = update_speed(code)
+        bL, bR = baseline_update_speed(name)
+        assert abs(wL - bL) < 1e-4 and abs(wR - bR) < 1e-4, name
+        assert abs(CASE_WL[code] - bL) < 1e-4 and abs(CASE_WR[code] - bR) < 1e-4, name
+
+
+def test_every_mask_speed_matches_baseline():
+    for mask in range(64):
+        wL, wR = update_speed(CASE_TABLE[mask])
+        bL, bR = baseline_update_speed(baseline_case(mask))
+        assert abs(wL - bL) < 1e-4 and abs(wR - bR) < 1e-4, mask
+
+
+def test_reading_on_threshold_is_explore_not_stop():
+    # Known change: the original checks were strict on both sides, so a reading exactly on a threshold
+    # was neither on nor off the line and fell through to "stop". The mask counts it as off the line,
+    # so the same readings now give explore.
+    at = (LINE_THRESHOLD, LINE_THRESHOLD, LINE_THRESHOLD, LINE_THRESHOLD, LINE_THRESHOLD, H_THRESHOLD)
+    assert baseline_check_sensor(*at) == "stop"
+    assert check_sensor(*at) == CASE_EXPLORE
+    one = (OFF, OFF, LINE_THRESHOLD, OFF, OFF, H_OFF)
+    assert baseline_check_sensor(*one) == "stop"
+    assert check_sensor(*one) == CASE_EXPLORE
+
+
+def benchmark(rounds=2000):
+    """!
+    Time the original and the table driven decision and wheel speed lookup over all 64 masks.
+
+    @param rounds (int): Number of passes over the 64 masks.
+
+    @return (tuple): time [us] per decision of the original and of the table driven path.
+    """
+    frames = [readings(mask) for mask in range(64)]
+
+    start = time.perf_counter()
+    for i in range(rounds):
+        for L2, L1, M, R1, R2, H in frames:
+            baseline_update_speed(baseline_check_sensor(L2, L1, M, R1, R2, H))
+    old = (time.perf_counter() - start) * 1000000 / (rounds * 64)
+
+    start = time.perf_counter()
+    for i in range(rounds):
+        for L2, L1, M, R1, R2, H in frames:
+            update_speed(check_sensor(L2, L1, M, R1, R2, H))
+    new = (time.perf_counter() - start) * 1000000 / (rounds * 64)
+    return old, new
+
+
+def test_benchmark_runs():
+    old, new = benchmark(20)
+    assert old > 0 and new > 0
+
+
+if __name__ == '__main__':
+    old, new = benchmark()
+    print(f"Original check_sensor() + update_speed(): {old:.2f} us per tick")
+    print(f"Case table check_sensor() + update_speed(): {new:.2f} us per tick")
+    print(f"Speed up: {old / new:.1f}x")
@@ -0,0 +1,45 @@
+"""!
+@file test_line_calibration.py
+This file checks on the host that a failed calibration sweep does not corrupt a good calibration.
+
+    python -m pytest -q tests/test_line_calibration.py
+"""
+
+import host_stubs
+host_stubs.install()
+
+from line_sensor import LineCalibration, CAL_CHANNELS, NORM_FULL
+
+
+def sweep(cal, readings):
+    cal.begin()
+    for v in readings:
+        cal.sample([v] * CAL_CHANNELS)
+    return cal.finish()
+
+
+def test_failed_sweep_keeps_good_calibration_and_is_not_valid(tmp_path):
+    cal = LineCalibration(file=str(tmp_path / 'cal.bin'))
+    assert sweep(cal, (1000, 3000))
+    assert cal.valid
+    assert list(cal.thresholds) == [2000] * CAL_CHANNELS
+
+    assert not sweep(cal, (3400, 3500))
+    assert not cal.valid
+    assert list(cal.lo) == [1000] * CAL_CHANNELS
+    assert list(cal.hi) == [3000] * CAL_CHANNELS
+    assert list(cal.thresholds) == [2000] * CAL_CHANNELS
+
+    out = [0] * CAL_CHANNELS
+    cal.normalize([2000] * CAL_CHANNELS, out)
+    assert out == [NORM_FULL // 2] * CAL_CHANNELS
+
+
+def test_save_and_load_round_trip(tmp_path):
+    cal = LineCalibration(file=str(tmp_path / 'cal.bin'))
+    assert sweep(cal, (800, 3600))
+    cal.save()
+    other = LineCalibration(file=str(tmp_path / 'cal.bin'))
+    assert other.load()
+    assert other.valid
+    assert list(other.thresholds) == list(cal.thresholds)
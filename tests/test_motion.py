@@ -0,0 +1,195 @@
+"""!
+@file test_motion.py
+This file checks the motion controllers of motion.py on the host, driving a simple unicycle model of ROMI
+with fixed 1 ms time steps.
+
+    python -m pytest -q tests/test_motion.py
+"""
+
+from math import cos, sin, pi
+import host_stubs
+host_stubs.install()
+
+import task_share
+from motion import MotionProfiler, PurePursuit, HeadingController, ramp, wrap
+
+
+## Time step [us] of the simulated task
+DT_US = 1000
+
+
+def drive(x, y, heading, v, yaw_rate, dt=DT_US / 1000000):
+    """!
+    Move the unicycle model one time step.
+    """
+    return x + v*cos(heading)*dt, y + v*sin(heading)*dt, heading + yaw_rate*dt
+
+
+def run_pursuit(pursuit, x, y, heading, ticks=20000):
+    for i in range(ticks):
+        v, yaw_rate = pursuit.update(x, y, heading)
+        if pursuit.done:
+            return x, y, i
+        x, y, heading = drive(x, y, heading, v, yaw_rate)
+    return x, y, None
+
+
+def test_pursuit_reaches_the_final_waypoint():
+    WAYPOINTS = task_share.StructQueue('ff', 8)
+    pursuit = PurePursuit(WAYPOINTS)
+    for wx, wy in ((0.5, 0.0), (0.5, 0.5), (0.0, 0.5)):
+        WAYPOINTS.put(wx, wy)
+    pursuit.start()
+    x, y, ticks = run_pursuit(pursuit, 0.0, 0.0, 0.0)
+    assert ticks is not None
+    assert (x - 0.0)**2 + (y - 0.5)**2 <= pursuit.REACH**2
+    assert not pursuit.active
+    assert pursuit.update(x, y, 0.0) == (0, 0)
+
+
+def test_pursuit_turns_around_for_a_waypoint_behind():
+    WAYPOINTS = task_share.StructQueue('ff', 4)
+    pursuit = PurePursuit(WAYPOINTS)
+    WAYPOINTS.put(-0.3, 0.0)
+    pursuit.start()
+    v, yaw_rate = pursuit.update(0.0, 0.0, 0.0)
+    assert v == 0 and abs(yaw_rate) == pursuit.Y_MAX
+    x, y, ticks = run_pursuit(pursuit, 0.0, 0.0, 0.0)
+    assert ticks is not None
+    assert (x + 0.3)**2 + y**2 <= pursuit.REACH**2
+
+
+def test_pursuit_slows_down_near_the_last_waypoint():
+    WAYPOINTS = task_share.StructQueue('ff', 4)
+    pursuit = PurePursuit(WAYPOINTS)
+    WAYPOINTS.put(1.0, 0.0)
+    pursuit.start()
+    far, _ = pursuit.update(0.0, 0.0, 0.0)
+    near, _ = pursuit.update(1.0 - pursuit.SLOW_RADIUS / 2, 0.0, 0.0)
+    assert far == pursuit.V_CRUISE
+    assert abs(near - pursuit.V_CRUISE / 2) < 1e-9
+
+
+def test_pursuit_with_no_waypoints_is_done_at_once():
+    pursuit = PurePursuit(task_share.StructQueue('ff', 4))
+    pursuit.start()
+    assert pursuit.update(0.2, 0.1, 1.0) == (0, 0)
+    assert pursuit.done and not pursuit.active
+
+
+def test_wrap_stays_within_pi():
+    for angle in (0.0, pi - 1e-6, -pi + 1e-6, 3*pi/2, -3*pi/2, 7*pi + 0.1, -9*pi - 0.1):
+        w = wrap(angle)
+        assert -pi <= w <= pi
+        assert abs(cos(w) - cos(angle)) < 1e-9 and abs(sin(w) - sin(angle)) < 1e-9
+
+
+def run_heading(heading, target, ticks=5000):
+    """!
+    Turn the unicycle model on the spot with a HeadingController, the heading is wrapped as the IMU gives it.
+
+    @return (tuple): the controller, the final heading and the most the heading moved away from the target.
+    """
+    control = HeadingController()
+    control.set_target(target)
+    t = 0
+    worst = 0
+    for i in range(ticks):
+        y = control.update(heading, t)
+        assert abs(y) <= control.Y_MAX
+        _, _, heading = drive(0, 0, heading, 0, y)
+        heading = wrap(heading)
+        worst = max(worst, abs(wrap(target - heading)))
+        t += DT_US
+        if control.settled:
+            break
+    return control, heading, worst
+
+
+def test_heading_turns_the_short_way_across_pi():
+    control, heading, worst = run_heading(pi - 0.1, -pi + 0.1)
+    assert control.settled
+    assert abs(wrap(-pi + 0.1 - heading)) < control.TOLERANCE
+    assert worst <= 0.2 + 1e-9
+
+
+def test_heading_turns_the_short_way_back_across_pi():
+    control, heading, worst = run_heading(-pi + 0.05, pi - 0.15)
+    assert control.settled
+    assert abs(wrap(pi - 0.15 - heading)) < control.TOLERANCE
+    assert worst <= 0.2 + 1e-9
+
+
+def test_heading_first_update_sees_the_shortest_error():
+    control = HeadingController()
+    control.set_target(0.05)
+    control.update(2*pi - 0.05, 0)
+    assert abs(control.error - 0.1) < 1e-9
+
+
+def test_heading_quarter_turn_settles_and_limits_the_yaw_acceleration():
+    control = HeadingController()
+    control.set_target(pi/2)
+    heading = 0.0
+    t = 0
+    last = 0
+    for i in range(5000):
+        y = control.update(heading, t)
+        assert abs(y - last) <= control.ALPHA_MAX * DT_US / 1000000 + 1e-9
+        last = y
+        _, _, heading = drive(0, 0, heading, 0, y)
+        t += DT_US
+        if control.settled:
+            break
+    assert control.settled
+    assert abs(heading - pi/2) < control.TOLERANCE
+
+
+def run_ramp(x, target, a_max, j_max, dt=0.001, steps=10000):
+    """!
+    Ramp one value to its target, checking the limits on every step.
+
+    @return (int): number of steps taken to land on the target.
+    """
+    a = 0
+    for i in range(steps):
+        x_new, a_new = ramp(x, a, target, a_max, j_max, dt)
+        assert abs(a_new) <= a_max + 1e-9
+        if x_new != target and j_max:
+            assert abs(a_new - a) <= j_max*dt + 1e-9
+        # Never past the target
+        assert (target - x_new) * (target - x) >= 0
+        x, a = x_new, a_new
+        if x == target:
+            assert a == 0
+            return i + 1
+    raise AssertionError('ramp never reached the target')
+
+
+def test_ramp_jerk_limited_up_and_down():
+    up = run_ramp(0.0, 0.3, 1.0, 10.0)
+    down = run_ramp(0.3, -0.2, 1.0, 10.0)
+    # An S-curve is slower than the trapezoid but not by more than the jerk phases
+    assert up > 300 and up < 500
+    assert down > 500 and down < 700
+
+
+def test_ramp_trapezoid_without_jerk_limit():
+    steps = run_ramp(0.0, 0.3, 1.0, 0)
+    assert steps == 300 or steps == 301
+
+
+def test_ramp_at_target_stays():
+    assert ramp(0.25, 0, 0.25, 1.0, 10.0, 0.001) == (0.25, 0)
+
+
+def test_profiler_first_update_only_stamps_and_gaps_are_clipped():
+    profile = MotionProfiler()
+    profile.update(0.3, 2.0, 1000)
+    assert (profile.v, profile.y) == (0, 0)
+    profile.update(0.3, 2.0, 1000 + 1000000)
+    assert profile.dt == profile.DT_MAX
+    assert 0 < profile.v <= profile.A_MAX * profile.DT_MAX
+    assert 0 < profile.y <= profile.ALPHA_MAX * profile.DT_MAX
+    profile.reset(0.1, -1.0)
+    assert (profile.v, profile.y, profile.a, profile.alpha) == (0.1, -1.0, 0, 0)
@@ -0,0 +1,68 @@
+"""!
+@file test_path.py
+This file checks on the host that Breadcrumbs keeps a long curved run within its vertex arrays and that
+the way back from retrace() ends at the start.
+
+    python -m pytest -q tests/test_path.py
+"""
+
+from math import cos, sin, pi
+import host_stubs
+host_stubs.install()
+
+from path import Breadcrumbs
+
+
+def drive(crumbs, points):
+    for x, y in points:
+        crumbs.add(x, y)
+        assert crumbs.count <= len(crumbs.xs)
+
+
+def circle(radius, turns, step=0.005):
+    n = int(2*pi*radius*turns / step)
+    for i in range(n + 1):
+        a = i * step / radius
+        yield radius*sin(a), radius - radius*cos(a)
+
+
+def spiral(turns, step=0.005):
+    a = 0.0
+    r = 0.1
+    while a < 2*pi*turns:
+        yield r*cos(a) - 0.1, r*sin(a)
+        a += step / r
+        r = 0.1 + 0.05*a
+
+
+def check_retrace(crumbs):
+    n = crumbs.retrace()
+    assert n <= len(crumbs.rx)
+    assert abs(crumbs.rx[n - 1]) < 1e-6 and abs(crumbs.ry[n - 1]) < 1e-6
+
+
+def test_small_circle_many_turns_stays_bounded():
+    crumbs = Breadcrumbs()
+    drive(crumbs, circle(0.5, 12))
+    check_retrace(crumbs)
+
+
+def test_large_circle_stays_bounded():
+    crumbs = Breadcrumbs()
+    drive(crumbs, circle(1.0, 6))
+    check_retrace(crumbs)
+
+
+def test_spiral_stays_bounded_with_a_small_size():
+    crumbs = Breadcrumbs(size=8)
+    drive(crumbs, spiral(8))
+    check_retrace(crumbs)
+
+
+def test_straight_leg_costs_two_vertices():
+    crumbs = Breadcrumbs()
+    drive(crumbs, ((0.01*i, 0) for i in range(500)))
+    assert crumbs.count == 1
+    n = crumbs.retrace()
+    assert n == 2
+    assert crumbs.rx[0] > 4.9
@@ -0,0 +1,156 @@
+"""!
+@file test_task_share.py
+This file checks on the host that the queues of task_share.py keep their records whole and count what
+they drop, with the pyboard interrupt switch replaced by one that keeps track of whether interrupts are on.
+
+    python -m pytest -q tests/test_task_share.py
+"""
+
+import array
+import struct
+import pytest
+import host_stubs
+host_stubs.install()
+
+import pyb
+import task_share
+
+
+class IRQ:
+    """!
+    Stand-in for pyb.disable_irq() and pyb.enable_irq() that remembers whether interrupts are off.
+    """
+    def __init__(self):
+        self.off = False
+
+    def disable(self):
+        was = self.off
+        self.off = True
+        return was
+
+    def enable(self, state=False):
+        self.off = state
+
+
+def patch_irq(monkeypatch):
+    irq = IRQ()
+    monkeypatch.setattr(pyb, 'disable_irq', irq.disable)
+    monkeypatch.setattr(pyb, 'enable_irq', irq.enable)
+    return irq
+
+
+def test_struct_queue_overwrite_packs_with_interrupts_off(monkeypatch):
+    irq = patch_irq(monkeypatch)
+    packed = []
+
+    class Struct:
+        calcsize = staticmethod(struct.calcsize)
+        unpack_from = staticmethod(struct.unpack_from)
+
+        @staticmethod
+        def pack_into(*args):
+            packed.append(irq.off)
+            struct.pack_into(*args)
+
+    monkeypatch.setattr(task_share, 'struct', Struct)
+    queue = task_share.StructQueue('HH', 2, overwrite=True)
+    queue.put(1, 2)
+    queue.put(3, 4)
+    queue.put(5, 6)
+    assert packed == [False, False, True]
+    assert not irq.off
+
+    record = [0, 0]
+    assert queue.get_into(record) == task_share.OK
+    assert record == [3, 4]
+    assert queue.get_into(record) == task_share.OK
+    assert record == [5, 6]
+    assert queue.get_into(record) == task_share.EMPTY
+    assert not irq.off
+
+
+def test_struct_queue_reads_with_interrupts_off(monkeypatch):
+    irq = patch_irq(monkeypatch)
+    seen = []
+
+    class Struct:
+        calcsize = staticmethod(struct.calcsize)
+        pack_into = staticmethod(struct.pack_into)
+
+        @staticmethod
+        def unpack_from(*args):
+            seen.append(irq.off)
+            return struct.unpack_from(*args)
+
+    queue = task_share.StructQueue('HH', 4, overwrite=True)
+    queue.put(1, 2)
+    monkeypatch.setattr(task_share, 'struct', Struct)
+    record = [0, 0]
+    queue.get_into(record)
+    assert seen[-1] is True
+    assert not irq.off
+
+
+def test_put_many_counts_dropped_items():
+    queue = task_share.Queue('H', 4)
+    assert queue.put_many(array.array('H', range(6))) == 4
+    assert (queue._puts, queue._lost, queue._dropped) == (4, 0, 2)
+
+
+def test_put_many_overwrite_counts_lost_items():
+    queue = task_share.Queue('H', 4, overwrite=True)
+    queue.put_many(array.array('H', range(3)))
+    assert queue.put_many(array.array('H', range(3))) == 3
+    assert (queue._puts, queue._lost, queue._dropped) == (6, 2, 0)
+
+
+def test_stats_snapshot_has_dropped():
+    queue = task_share.StructQueue('H', 1)
+    queue.put(1)
+    assert queue.put(2) == task_share.FULL
+    buf = task_share.pack_stats()
+    index = task_share.share_list.index(queue)
+    assert struct.unpack_from(task_share.STATS_FORMAT, buf, index * task_share.STATS_SIZE) == (1, 0, 0, 1, 0)
+    assert 'Dropped 1' in str(queue)
+
+
+def test_frame_share_front_reads_view_and_seq_with_interrupts_off(monkeypatch):
+    irq = patch_irq(monkeypatch)
+    frames = task_share.FrameShare('H', 3)
+    reads = []
+
+    class Views(tuple):
+        def __getitem__(self, index):
+            reads.append(irq.off)
+            return tuple.__getitem__(self, index)
+
+    frames._views = Views(frames._views)
+    back = frames.back()
+    back[0] = 7
+    frames.publish()
+    view, seq = frames.front()
+    assert (view[0], seq) == (7, 1)
+    assert reads == [True]
+    assert not irq.off
+    assert frames.still_valid(seq)
+
+
+def test_record_share_bad_put_leaves_sequence_even_and_interrupts_on(monkeypatch):
+    irq = patch_irq(monkeypatch)
+    record = task_share.RecordShare('Hf', ('n', 'x'), thread_protect=True)
+    record.put(1, 2.0)
+    with pytest.raises(ValueError):
+        record.put(1)
+    with pytest.raises((struct.error, OverflowError, ValueError)):
+        record.put(70000, 1.0)
+    assert record._seq % 2 == 0
+    assert not irq.off
+
+    class Snapshot:
+        pass
+
+    snap = Snapshot()
+    record.get_into(snap)
+    record.put(3, 4.0)
+    record.get_into(snap)
+    assert (snap.n, snap.x) == (3, 4.0)